@@ -0,0 +1,78 @@
+# bandeiras.py - BANDEIRA DO CARTÃO PELO BIN (SEIS PRIMEIROS DÍGITOS)
+#
+# As faixas abaixo são resolvidas uma vez, na importação, numa tabela de
+# intervalos sem sobreposição. A consulta de um número é uma busca binária
+# (bisect); a de um array inteiro (relatórios) é um único np.searchsorted.
+# O backfill da migração 0005 traz a mesma tabela resolvida em SQL; ao mudar
+# FAIXAS, atualize-o junto (tests/test_bandeiras.py compara os dois).
+
+from bisect import bisect_right
+from typing import List, Tuple
+
+OUTRA = "Outra"
+
+# (bandeira, [(primeiro BIN, último BIN), ...]) em ordem de prioridade: quando
+# faixas se sobrepõem (Elo dentro de Visa/Discover, Hipercard dentro de
+# Diners), vale a que aparece primeiro.
+FAIXAS = [
+    ("Elo", [
+        (401178, 401179), (431274, 431274), (438935, 438935), (451416, 451416), (457393, 457393),
+        (457631, 457632), (504175, 504175), (506699, 506778), (509000, 509999), (627780, 627780),
+        (636297, 636297), (636368, 636368), (650031, 650033), (650035, 650051), (650405, 650439),
+        (650485, 650538), (650541, 650598), (650700, 650718), (650720, 650727), (650901, 650920),
+        (651652, 651679), (655000, 655019), (655021, 655058),
+    ]),
+    ("Hipercard", [(384100, 384100), (384140, 384140), (384160, 384160), (606282, 606282)]),
+    ("American Express", [(340000, 349999), (370000, 379999)]),
+    ("Diners", [(300000, 305999), (360000, 369999), (380000, 389999)]),
+    ("JCB", [(352800, 358999)]),
+    ("Discover", [(601100, 601199), (644000, 659999)]),
+    ("Mastercard", [(222100, 272099), (510000, 559999)]),
+    ("Visa", [(400000, 499999)]),
+]
+
+NOMES = [OUTRA] + [nome for nome, _ in FAIXAS]
+
+
+def _compilar() -> Tuple[List[int], List[int]]:
+    """Início de cada intervalo e o código (índice em NOMES) da bandeira nele."""
+    pontos = sorted({0} | {limite for _, faixas in FAIXAS for inicio, fim in faixas for limite in (inicio, fim + 1)})
+    inicios, codigos = [], []
+    for ponto in pontos:
+        codigo = next(
+            (indice for indice, (_, faixas) in enumerate(FAIXAS, start=1)
+             if any(inicio <= ponto <= fim for inicio, fim in faixas)),
+            0,
+        )
+        if not codigos or codigos[-1] != codigo:
+            inicios.append(ponto)
+            codigos.append(codigo)
+    return inicios, codigos
+
+
+_INICIOS, _CODIGOS = _compilar()
+
+
+def bandeira(numero) -> str:
+    """Bandeira de um número de cartão (str ou int; espaços e traços são ignorados)."""
+    digitos = "".join(c for c in str(numero) if c.isdigit())
+    if len(digitos) < 12:
+        return OUTRA
+    return NOMES[_CODIGOS[bisect_right(_INICIOS, int(digitos[:6])) - 1]]
+
+
+def codigos(numeros):
+    """
+    Código da bandeira (índice em NOMES) de cada número de um array int64 de
+    números completos, como guardados em pagamentos.numero_cartao.
+    """
+    import numpy as np
+
+    numeros = np.asarray(numeros, dtype=np.int64)
+    potencias = 10 ** np.arange(19, dtype=np.int64)
+    # Quantidade de dígitos, sem log10 (que erra perto das potências de 10).
+    digitos = np.searchsorted(potencias, numeros, side="right")
+    validos = digitos >= 12
+    bin6 = numeros // potencias[np.where(validos, digitos - 6, 0)]
+    indices = np.searchsorted(np.asarray(_INICIOS, dtype=np.int64), bin6, side="right") - 1
+    return np.where(validos, np.asarray(_CODIGOS, dtype=np.int64)[indices], 0)
@@ -0,0 +1,62 @@
+# bench_auth.py - CUSTO DE AUTENTICAÇÃO POR REQUISIÇÃO
+#
+# Microbenchmark do que get_current_user_id faz com o token: decodificação
+# completa em cada backend JWT e acerto no cache de tokens. Não precisa de
+# servidor nem de banco.
+#
+#   python benchmarks/bench_auth.py [--iteracoes 20000] [--saida auth.json]
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from comum import salvar  # noqa: E402
+from tokens import BACKENDS, CacheTokens  # noqa: E402
+
+CHAVE = "chave-de-benchmark-com-32-bytes-ou-mais"
+ALGORITMO = "HS256"
+
+
+def medir(funcao, iteracoes: int) -> float:
+    """Microssegundos por chamada."""
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        funcao()
+    return 1e6 * (time.perf_counter() - inicio) / iteracoes
+
+
+def principal(args):
+    dados = {"user_id": 42, "exp": datetime.utcnow() + timedelta(days=1)}
+    resultados = []
+    for nome, classe in BACKENDS.items():
+        try:
+            backend = classe(CHAVE, ALGORITMO)
+        except RuntimeError as err:
+            print(f"{nome}: ignorado ({err})")
+            continue
+
+        token = backend.codificar(dados)
+        cache = CacheTokens(backend)
+        cache.decodificar(token)
+
+        resultado = {
+            "cenario": f"auth_{nome}",
+            "decodificacao_us": round(medir(lambda: backend.decodificar(token), args.iteracoes), 2),
+            "cache_acerto_us": round(medir(lambda: cache.decodificar(token), args.iteracoes), 3),
+        }
+        print(resultado)
+        resultados.append(resultado)
+
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Custo de autenticação JWT por requisição")
+    parser.add_argument("--iteracoes", type=int, default=20000)
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    principal(parser.parse_args())
@@ -0,0 +1,64 @@
+# bench_carga.py - CARGA CONCORRENTE NAS ROTAS DE SESSÃO
+#
+# Mede requisições/s e latência p50/p95/p99 com muitos clientes simultâneos.
+# Para comparar antes/depois, rode contra o servidor em cada versão:
+#
+#   python benchmarks/bench_carga.py --url http://localhost:8000 \
+#       --email teste@exemplo.com --senha 123456 --saida antes.json
+#   (troque de versão e reinicie o servidor)
+#   python benchmarks/bench_carga.py ... --saida depois.json
+#   python benchmarks/bench_carga.py --comparar antes.json depois.json
+
+import argparse
+import asyncio
+
+import httpx
+
+from comum import comparar, executar_carga, login, resumir, salvar
+
+ROTAS = {
+    "status": ("GET", "/sessoes/status"),
+    "preview": ("GET", "/sessoes/checkout/preview"),
+    "cartoes": ("GET", "/cartoes"),
+    "historico": ("GET", "/pagamentos/me/"),
+}
+
+
+async def principal(args):
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30) as cliente:
+        token = await login(cliente, args.email, args.senha)
+        cabecalhos = {"Authorization": f"Bearer {token}"}
+
+        resultados = []
+        for nome in args.rotas:
+            metodo, caminho = ROTAS[nome]
+
+            async def requisicao(_indice, metodo=metodo, caminho=caminho):
+                return await cliente.request(metodo, caminho, headers=cabecalhos)
+
+            latencias, erros, duracao = await executar_carga(requisicao, args.concorrencia, args.duracao)
+            resultado = resumir(nome, latencias, erros, duracao, concorrencia=args.concorrencia)
+            print(resultado)
+            resultados.append(resultado)
+
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga concorrente nas rotas de sessão")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email")
+    parser.add_argument("--senha")
+    parser.add_argument("--concorrencia", type=int, default=200)
+    parser.add_argument("--duracao", type=float, default=20.0)
+    parser.add_argument("--rotas", nargs="+", choices=sorted(ROTAS), default=["status", "preview"])
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DEPOIS"))
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+    else:
+        asyncio.run(principal(args))
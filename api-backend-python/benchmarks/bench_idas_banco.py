@@ -0,0 +1,58 @@
+# bench_idas_banco.py - IDAS AO BANCO POR ROTA
+#
+# Percorre o fluxo do app (login, check-in, status, preview, checkout,
+# cartões, histórico) e mostra quantos comandos SQL cada rota executou.
+# O servidor precisa estar rodando com DB_CONTAR_IDAS=1:
+#
+#   DB_CONTAR_IDAS=1 uvicorn main:app
+#   python benchmarks/bench_idas_banco.py --email teste@exemplo.com --senha 123456
+
+import argparse
+import asyncio
+
+import httpx
+
+from comum import salvar
+
+FLUXO = [
+    ("login", "POST", "/usuarios/login"),
+    ("status_sem_sessao", "GET", "/sessoes/status"),
+    ("checkin", "POST", "/sessoes/checkin"),
+    ("status_com_sessao", "GET", "/sessoes/status"),
+    ("preview", "GET", "/sessoes/checkout/preview"),
+    ("checkout", "POST", "/sessoes/checkout"),
+    ("cartoes", "GET", "/cartoes"),
+    ("historico", "GET", "/pagamentos/me/"),
+]
+
+
+async def principal(args):
+    resultados = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as cliente:
+        cabecalhos = {}
+        for nome, metodo, caminho in FLUXO:
+            if nome == "login":
+                resposta = await cliente.post(caminho, data={"username": args.email, "password": args.senha})
+                resposta.raise_for_status()
+                cabecalhos = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+            else:
+                resposta = await cliente.request(metodo, caminho, headers=cabecalhos)
+
+            idas = resposta.headers.get("x-db-round-trips")
+            if idas is None:
+                raise SystemExit("O servidor não devolveu X-DB-Round-Trips; inicie-o com DB_CONTAR_IDAS=1.")
+            resultado = {"cenario": nome, "status": resposta.status_code, "idas_ao_banco": int(idas)}
+            print(f"{nome:<20}{resposta.status_code:>6}{idas:>6}")
+            resultados.append(resultado)
+
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Idas ao banco por rota")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--senha", required=True)
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    asyncio.run(principal(parser.parse_args()))
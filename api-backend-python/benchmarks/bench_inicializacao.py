@@ -0,0 +1,126 @@
+# bench_inicializacao.py - TEMPO DE INICIALIZAÇÃO (PARTIDA A FRIO)
+#
+# Mede, em processos novos a cada repetição:
+#
+#   import_main   `python -c "import main"`: custo dos imports e do código
+#                 de módulo (com preload_app, pago uma vez pelo mestre)
+#   imports_tardios  o numpy e o python-jose, importados no primeiro uso,
+#                 depois de main: o que cada worker paga por conta própria
+#   uvicorn       do lançamento de `uvicorn main:app` até a primeira
+#                 resposta 200
+#   gunicorn      o mesmo com `gunicorn -c gunicorn_conf.py` (--workers)
+#
+# A primeira resposta vem de /saude/pronto quando há banco configurado (DB_*;
+# inclui o aquecimento do pool) e de /saude/vivo sem banco; --caminho troca.
+#
+#   python benchmarks/bench_inicializacao.py [--repeticoes 5] [--saida inicializacao.json]
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from comum import percentil, salvar  # noqa: E402
+
+PASTA_API = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+MODOS = ("import_main", "imports_tardios", "uvicorn", "gunicorn")
+
+# Mede, num processo que já importou main, o que só é importado no primeiro uso.
+_IMPORTS_TARDIOS = """
+import time
+import main
+inicio = time.perf_counter()
+import numpy
+from jose import jwt
+print(time.perf_counter() - inicio)
+"""
+
+
+def ambiente(**extras) -> dict:
+    return {**os.environ, "SECRET_KEY": os.environ.get("SECRET_KEY", "segredo-de-benchmark"), **extras}
+
+
+def medir_import() -> float:
+    inicio = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import main"], cwd=PASTA_API, env=ambiente(), check=True)
+    return time.perf_counter() - inicio
+
+
+def medir_imports_tardios() -> float:
+    saida = subprocess.run([sys.executable, "-c", _IMPORTS_TARDIOS], cwd=PASTA_API, env=ambiente(), check=True,
+                           capture_output=True, text=True).stdout
+    return float(saida.split()[-1])
+
+
+def medir_servidor(comando: list, url: str, workers: int, limite: float = 60.0) -> float:
+    """Segundos do lançamento do processo até a primeira resposta 200 em `url`."""
+    inicio = time.perf_counter()
+    # O gunicorn_conf.py lê o número de workers de WEB_CONCURRENCY.
+    processo = subprocess.Popen(comando, cwd=PASTA_API, env=ambiente(WEB_CONCURRENCY=str(workers)),
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(timeout=1) as cliente:
+            while time.perf_counter() - inicio < limite:
+                try:
+                    if cliente.get(url).status_code == 200:
+                        return time.perf_counter() - inicio
+                except httpx.HTTPError:
+                    pass
+                if processo.poll() is not None:
+                    raise SystemExit(f"O servidor terminou durante a inicialização: {' '.join(comando)}")
+                time.sleep(0.005)
+        raise SystemExit(f"Sem resposta 200 em {url} após {limite:.0f} s.")
+    finally:
+        processo.terminate()
+        processo.wait()
+
+
+def comando(modo: str, args) -> list:
+    if modo == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.porta),
+                "--log-level", "warning"]
+    return [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", "--bind", f"127.0.0.1:{args.porta}",
+            "--log-level", "warning"]
+
+
+def principal(args):
+    caminho = args.caminho or ("/saude/pronto" if os.environ.get("DB_HOST") else "/saude/vivo")
+    url = f"http://127.0.0.1:{args.porta}{caminho}"
+    resultados = []
+    for modo in args.modos:
+        amostras = []
+        for _ in range(args.repeticoes):
+            if modo == "import_main":
+                amostras.append(medir_import())
+            elif modo == "imports_tardios":
+                amostras.append(medir_imports_tardios())
+            else:
+                amostras.append(medir_servidor(comando(modo, args), url, args.workers))
+        resultados.append({
+            "cenario": modo,
+            "repeticoes": args.repeticoes,
+            "caminho": caminho if modo in ("uvicorn", "gunicorn") else None,
+            "min_ms": round(1000 * min(amostras), 1),
+            "p50_ms": round(1000 * percentil(amostras, 50), 1),
+            "max_ms": round(1000 * max(amostras), 1),
+        })
+        print(resultados[-1])
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tempo do lançamento do servidor até a primeira resposta")
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=list(MODOS))
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--porta", type=int, default=8798)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Workers do gunicorn (mais de um requer os Redis de gunicorn_conf.py)")
+    parser.add_argument("--caminho", help="Rota consultada (padrão: /saude/pronto com banco, /saude/vivo sem)")
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    principal(parser.parse_args())
@@ -0,0 +1,60 @@
+# bench_login.py - TEMPESTADE DE LOGINS (TROCA DE TURNO)
+#
+# Dispara logins concorrentes e, ao mesmo tempo, consultas leves a
+# /sessoes/status, para mostrar que o bcrypt não trava as demais rotas e
+# que o excesso de logins é recusado com 429 em vez de acumular latência.
+#
+#   python benchmarks/bench_login.py --email teste@exemplo.com --senha 123456 \
+#       --concorrencia 100 --duracao 20 --saida login.json
+
+import argparse
+import asyncio
+
+import httpx
+
+from comum import executar_carga, login, resumir, salvar
+
+
+async def principal(args):
+    limites = httpx.Limits(max_connections=args.concorrencia + args.consultas)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=60) as cliente:
+        token = await login(cliente, args.email, args.senha)
+        cabecalhos = {"Authorization": f"Bearer {token}"}
+        recusados = 0
+
+        async def requisicao_login(_indice):
+            nonlocal recusados
+            resposta = await cliente.post("/usuarios/login", data={"username": args.email, "password": args.senha})
+            if resposta.status_code == 429:
+                recusados += 1
+            return resposta
+
+        async def requisicao_status(_indice):
+            return await cliente.get("/sessoes/status", headers=cabecalhos)
+
+        (lat_login, erros_login, dur_login), (lat_status, erros_status, dur_status) = await asyncio.gather(
+            executar_carga(requisicao_login, args.concorrencia, args.duracao, status_ok=(200,)),
+            executar_carga(requisicao_status, args.consultas, args.duracao),
+        )
+
+    resultados = [
+        resumir("tempestade_login", lat_login, erros_login, dur_login,
+                concorrencia=args.concorrencia, recusados_429=recusados),
+        resumir("status_durante_logins", lat_status, erros_status, dur_status, concorrencia=args.consultas),
+    ]
+    for resultado in resultados:
+        print(resultado)
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tempestade de logins concorrentes")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--senha", required=True)
+    parser.add_argument("--concorrencia", type=int, default=100, help="Clientes fazendo login em paralelo")
+    parser.add_argument("--consultas", type=int, default=20, help="Clientes consultando /sessoes/status em paralelo")
+    parser.add_argument("--duracao", type=float, default=20.0)
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    asyncio.run(principal(parser.parse_args()))
@@ -0,0 +1,99 @@
+# bench_lote.py - INGESTÃO EM LOTE X CHAMADAS INDIVIDUAIS
+#
+# Aplica o mesmo conjunto de eventos (um check-in e um checkout por usuário)
+# primeiro com chamadas individuais a /sessoes/checkin e /sessoes/checkout
+# e depois via /sessoes/lote, e compara eventos por segundo. Cria os
+# usuários de teste na primeira execução. O servidor precisa de GATE_TOKEN:
+#
+#   GATE_TOKEN=segredo uvicorn main:app
+#   python benchmarks/bench_lote.py --token-cancela segredo --usuarios 100 --saida lote.json
+
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from comum import salvar
+
+SENHA = "senha-de-benchmark"
+
+
+async def preparar_usuarios(cliente, quantidade):
+    """(user_id, cabeçalhos) de cada usuário de teste, sem sessão ativa."""
+    usuarios = []
+    for indice in range(quantidade):
+        email = f"bench-lote-{indice}@exemplo.com"
+        await cliente.post("/usuarios/cadastrar", json={"nome": f"Bench {indice}", "email": email, "senha": SENHA})
+        resposta = await cliente.post("/usuarios/login", data={"username": email, "password": SENHA})
+        resposta.raise_for_status()
+        dados = resposta.json()
+        cabecalhos = {"Authorization": f"Bearer {dados['access_token']}"}
+        await cliente.post("/sessoes/checkout", headers=cabecalhos)
+        usuarios.append((dados["user_id"], cabecalhos))
+    return usuarios
+
+
+async def individual(cliente, usuarios, concorrencia):
+    vagas = asyncio.Semaphore(concorrencia)
+    erros = 0
+
+    async def entrada_e_saida(cabecalhos):
+        nonlocal erros
+        async with vagas:
+            for caminho in ("/sessoes/checkin", "/sessoes/checkout"):
+                resposta = await cliente.post(caminho, headers=cabecalhos)
+                erros += resposta.status_code >= 300
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*[entrada_e_saida(cabecalhos) for _, cabecalhos in usuarios])
+    return time.perf_counter() - inicio, erros
+
+
+async def em_lote(cliente, usuarios, tamanho, token_cancela):
+    agora = datetime.now()
+    eventos = [{"tipo": "checkin", "usuario_id": user_id, "horario": (agora - timedelta(hours=1)).isoformat()} for user_id, _ in usuarios]
+    eventos += [{"tipo": "checkout", "usuario_id": user_id, "horario": agora.isoformat()} for user_id, _ in usuarios]
+    erros = 0
+
+    inicio = time.perf_counter()
+    for posicao in range(0, len(eventos), tamanho):
+        resposta = await cliente.post(
+            "/sessoes/lote", json={"eventos": eventos[posicao:posicao + tamanho]}, headers={"X-Gate-Token": token_cancela}
+        )
+        resposta.raise_for_status()
+        erros += sum(resultado["status_code"] >= 300 for resultado in resposta.json()["resultados"])
+    return time.perf_counter() - inicio, erros
+
+
+async def principal(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=60) as cliente:
+        usuarios = await preparar_usuarios(cliente, args.usuarios)
+        eventos = 2 * len(usuarios)
+
+        duracao_individual, erros_individual = await individual(cliente, usuarios, args.concorrencia)
+        duracao_lote, erros_lote = await em_lote(cliente, usuarios, args.tamanho, args.token_cancela)
+
+    resultados = [
+        {"cenario": "individual", "eventos": eventos, "concorrencia": args.concorrencia, "erros": erros_individual,
+         "duracao_s": round(duracao_individual, 3), "eventos_por_s": round(eventos / duracao_individual, 1)},
+        {"cenario": "lote", "eventos": eventos, "tamanho_lote": args.tamanho, "erros": erros_lote,
+         "duracao_s": round(duracao_lote, 3), "eventos_por_s": round(eventos / duracao_lote, 1)},
+    ]
+    for resultado in resultados:
+        print(resultado)
+    print(f"ganho do lote: {duracao_individual / duracao_lote:.1f}x")
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingestão em lote x chamadas individuais")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token-cancela", required=True, help="Valor de GATE_TOKEN do servidor")
+    parser.add_argument("--usuarios", type=int, default=100)
+    parser.add_argument("--concorrencia", type=int, default=20, help="Chamadas individuais em paralelo")
+    parser.add_argument("--tamanho", type=int, default=500, help="Eventos por requisição de lote")
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    asyncio.run(principal(parser.parse_args()))
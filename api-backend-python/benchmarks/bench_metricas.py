@@ -0,0 +1,111 @@
+# bench_metricas.py - CUSTO DA INSTRUMENTAÇÃO (METRICAS=1)
+#
+# Mede o acréscimo por requisição do middleware de métricas e dos ganchos de
+# etapa e de cursor: uma aplicação FastAPI mínima, chamada direto pela
+# interface ASGI (sem rede), com uma rota que passa pela etapa "jwt" e
+# executa três comandos num cursor com o mesmo gancho dos cursores reais
+# (sem banco). Compara as mesmas requisições com as métricas desligadas e
+# ligadas. Também mede o custo isolado de uma observação em histograma.
+#
+#   python benchmarks/bench_metricas.py [--requisicoes 20000] [--saida metricas.json]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import timeit
+
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import metricas  # noqa: E402
+from comum import salvar  # noqa: E402
+from db import _ContagemIdas  # noqa: E402
+
+
+class _CursorSemBanco:
+    rowcount = 1
+
+    async def execute(self, query, args=None):
+        return 1
+
+
+class CursorInstrumentado(_ContagemIdas, _CursorSemBanco):
+    pass
+
+
+def criar_app(instrumentada: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/sessoes/{sessao_id}")
+    async def rota(sessao_id: int):
+        with metricas.etapa("jwt"):
+            pass
+        cursor = CursorInstrumentado()
+        for _ in range(3):
+            await cursor.execute("SELECT id, horario_entrada FROM sessoes WHERE usuario_id = %s", (sessao_id,))
+        return {"sessao_id": sessao_id}
+
+    if instrumentada:
+        app.add_middleware(metricas.MiddlewareMetricas)
+    return app
+
+
+async def chamar(app, quantidade: int) -> float:
+    """Segundos por requisição, chamando a aplicação ASGI diretamente."""
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(mensagem):
+        pass
+
+    def scope():
+        return {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/sessoes/7", "raw_path": b"/sessoes/7", "query_string": b"", "root_path": "",
+            "headers": [], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80),
+        }
+
+    for _ in range(200):  # aquecimento (montagem da pilha de middlewares)
+        await app(scope(), receive, send)
+    inicio = time.perf_counter()
+    for _ in range(quantidade):
+        await app(scope(), receive, send)
+    return (time.perf_counter() - inicio) / quantidade
+
+
+async def principal(args):
+    resultados = []
+    por_cenario = {}
+    for nome, ligadas in (("desligadas", False), ("ligadas", True)):
+        metricas.configurar(ligadas)
+        app = criar_app(ligadas)
+        # Melhor de três rodadas, para reduzir o ruído.
+        por_cenario[nome] = min([await chamar(app, args.requisicoes) for _ in range(3)])
+        resultados.append({"cenario": nome, "requisicoes": args.requisicoes, "por_requisicao_us": round(1e6 * por_cenario[nome], 2)})
+
+    acrescimo = por_cenario["ligadas"] - por_cenario["desligadas"]
+    resultados.append({
+        "cenario": "acrescimo",
+        "por_requisicao_us": round(1e6 * acrescimo, 2),
+        "percentual": round(100 * acrescimo / por_cenario["desligadas"], 1),
+    })
+
+    metricas.configurar(True)
+    familia = metricas.registro.consultas
+    observacao = timeit.timeit(lambda: familia.observar(("/sessoes/checkout", "SELECT"), 0.0031), number=200_000) / 200_000
+    resultados.append({"cenario": "observacao_histograma", "por_observacao_ns": round(1e9 * observacao, 1)})
+
+    for resultado in resultados:
+        print(resultado)
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Custo da instrumentação por requisição")
+    parser.add_argument("--requisicoes", type=int, default=20000)
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    asyncio.run(principal(parser.parse_args()))
@@ -0,0 +1,82 @@
+# bench_relatorios.py - VAZÃO E MEMÓRIA DOS AGREGADOS DE RELATÓRIO
+#
+# Alimenta o AcumuladorRelatorio com blocos sintéticos de pagamentos e
+# sessões (como chegam do cursor do banco: listas de tuplas) e mede linhas
+# por segundo e o pico de memória alocada, que deve depender do tamanho do
+# bloco e não do total de linhas. Não precisa de servidor nem de banco.
+#
+#   python benchmarks/bench_relatorios.py [--linhas 2000000] [--lote 20000] [--saida relatorios.json]
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from comum import salvar  # noqa: E402
+from relatorios import AcumuladorRelatorio, para_array  # noqa: E402
+
+DIAS = 31
+CARTOES = [4111111111111111, 5555555555554444, 378282246310005, 6362970000457013, 6062825624254001]
+
+
+def blocos(linhas: int, lote: int, pagamentos: bool):
+    aleatorio = random.Random(42)
+    for inicio in range(0, linhas, lote):
+        bloco = []
+        for _ in range(min(lote, linhas - inicio)):
+            saida = aleatorio.randrange(DIAS * 86400)
+            if pagamentos:
+                bloco.append((saida, aleatorio.randrange(500, 5000), aleatorio.choice(CARTOES)))
+            else:
+                bloco.append((saida - aleatorio.randrange(60, 6 * 3600), saida))
+        yield bloco
+
+
+def medir(nome: str, linhas: int, lote: int, pagamentos: bool) -> dict:
+    acumulador = AcumuladorRelatorio(date(2024, 1, 1), DIAS, capacidade=200)
+    adicionar = acumulador.adicionar_pagamentos if pagamentos else acumulador.adicionar_sessoes
+    # A geração das tuplas (papel do driver do banco) fica fora da medição.
+    conversao = agregacao = 0.0
+    tracemalloc.start()
+    for bloco in blocos(linhas, lote, pagamentos):
+        inicio = time.perf_counter()
+        array = para_array(bloco)
+        meio = time.perf_counter()
+        adicionar(array)
+        conversao += meio - inicio
+        agregacao += time.perf_counter() - meio
+        del bloco, array
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    acumulador.resultado()
+    return {
+        "cenario": nome,
+        "linhas": linhas,
+        "lote": lote,
+        "conversao_linhas_por_s": round(linhas / conversao),
+        "agregacao_linhas_por_s": round(linhas / agregacao),
+        "pico_memoria_mb": round(pico / 2**20, 1),
+    }
+
+
+def principal(args):
+    resultados = []
+    for nome, pagamentos in (("pagamentos", True), ("sessoes", False)):
+        resultado = medir(nome, args.linhas, args.lote, pagamentos)
+        print(resultado)
+        resultados.append(resultado)
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vazão e memória dos agregados de relatório")
+    parser.add_argument("--linhas", type=int, default=2_000_000)
+    parser.add_argument("--lote", type=int, default=20000)
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    principal(parser.parse_args())
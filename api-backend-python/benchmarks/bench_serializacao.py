@@ -0,0 +1,107 @@
+# bench_serializacao.py - CUSTO DE SERIALIZAR UM HISTÓRICO LONGO
+#
+# Compara, para um histórico de pagamentos com N linhas (como vêm do banco:
+# dicts com datetime e Decimal), os caminhos de serialização da API:
+#
+#   pydantic       response_model=List[Pagamento]: valida cada linha e
+#                  serializa no núcleo do Pydantic (caminho do FastAPI)
+#   jsonable       rota sem response_model com JSONResponse: jsonable_encoder
+#                  + json.dumps (o padrão do FastAPI antes de RespostaJSON)
+#   resposta_json  RespostaJSON(linhas): as linhas direto para o orjson
+#
+# e o custo e o tamanho da compressão (gzip e, se instalado, brotli) do
+# corpo resultante. Não precisa de servidor nem de banco.
+#
+#   python benchmarks/bench_serializacao.py [--linhas 10000] [--saida serializacao.json]
+
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("SECRET_KEY", "segredo-de-benchmark")
+
+import respostas  # noqa: E402
+from comum import salvar  # noqa: E402
+from main import Pagamento  # noqa: E402
+
+
+def historico(linhas: int) -> List[dict]:
+    inicio = datetime(2024, 1, 1, 8, 0)
+    return [
+        {
+            "id": indice,
+            "usuario_id": 7,
+            "horario_entrada": inicio + timedelta(hours=indice),
+            "horario_saida": inicio + timedelta(hours=indice, minutes=95),
+            "valor_pago": Decimal("12.50"),
+            "numero_cartao": 4111111111111111,
+        }
+        for indice in range(linhas)
+    ]
+
+
+def melhor_de(funcao, repeticoes: int) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor
+
+
+def principal(args):
+    linhas = historico(args.linhas)
+    adaptador = TypeAdapter(List[Pagamento])
+
+    caminhos = {
+        "pydantic": lambda: adaptador.dump_json(adaptador.validate_python(linhas)),
+        "jsonable": lambda: json.dumps(jsonable_encoder(linhas), ensure_ascii=False, separators=(",", ":")).encode(),
+        "resposta_json": lambda: respostas.serializar(linhas),
+    }
+    resultados = []
+    for nome, funcao in caminhos.items():
+        duracao = melhor_de(funcao, args.repeticoes)
+        resultados.append({
+            "cenario": nome,
+            "linhas": args.linhas,
+            "ms": round(1000 * duracao, 2),
+            "us_por_linha": round(1e6 * duracao / args.linhas, 3),
+            "bytes": len(funcao()),
+        })
+
+    corpo = respostas.serializar(linhas)
+    compressoes = {"gzip": lambda: zlib.compress(corpo, respostas.NIVEL_GZIP)}
+    if respostas.brotli is not None:
+        compressoes["brotli"] = lambda: respostas.brotli.compress(corpo, quality=respostas.QUALIDADE_BROTLI)
+    for nome, funcao in compressoes.items():
+        duracao = melhor_de(funcao, args.repeticoes)
+        resultados.append({
+            "cenario": f"compressao_{nome}",
+            "linhas": args.linhas,
+            "ms": round(1000 * duracao, 2),
+            "bytes": len(funcao()),
+            "razao": round(len(corpo) / len(funcao()), 1),
+        })
+
+    for resultado in resultados:
+        print(resultado)
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Custo de serializar um histórico longo")
+    parser.add_argument("--linhas", type=int, default=10000)
+    parser.add_argument("--repeticoes", type=int, default=5, help="Vale a melhor das repetições")
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    principal(parser.parse_args())
@@ -0,0 +1,316 @@
+# bench_suite.py - SUÍTE DE CARGA REPRODUTÍVEL DA API INTEIRA
+#
+# Sobe um MariaDB descartável (docker), aplica as migrações, semeia volume
+# realista (semear.py), inicia a API com uvicorn e roda cenários do dia a
+# dia do estacionamento:
+#
+#   login        enxurrada de logins (bcrypt) de todos os usuários do teste
+#   entrada      pico da manhã: cada usuário faz check-in uma vez
+#   status       polling de /sessoes/status com as sessões ativas
+#   historico    navegação do extrato: primeira página e as duas seguintes
+#   saida        fim do expediente: cada usuário faz checkout uma vez
+#
+# Para cada cenário: vazão, p50/p95/p99 e idas ao banco por requisição
+# (X-DB-Round-Trips). O JSON salvo traz o commit e os parâmetros; dois
+# arquivos podem ser comparados, com código de saída 1 se houver regressão:
+#
+#   python benchmarks/bench_suite.py --saida antes.json
+#   (troque de commit)
+#   python benchmarks/bench_suite.py --saida depois.json
+#   python benchmarks/bench_suite.py --comparar antes.json depois.json --tolerancia 10
+#
+# Com --docker-imagem "" o banco é o das variáveis DB_* (DB_SSL_CA= para um
+# MySQL local sem TLS); os dados de teste são apagados e recriados nele.
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import semear  # noqa: E402
+from comum import comparar, percentil, regressoes, resumir, salvar  # noqa: E402
+
+PASTA_API = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CONTEINER = "estacionamento-bench"
+CENARIOS = ("login", "entrada", "status", "historico", "saida")
+
+
+# --- Banco ---
+
+def subir_mariadb(imagem: str, porta: int):
+    subprocess.run(["docker", "rm", "-f", CONTEINER], capture_output=True)
+    subprocess.run(
+        ["docker", "run", "-d", "--rm", "--name", CONTEINER, "-p", f"127.0.0.1:{porta}:3306",
+         "-e", "MARIADB_ROOT_PASSWORD=bench", "-e", "MARIADB_DATABASE=estacionamento", imagem],
+        check=True, capture_output=True,
+    )
+    os.environ.update(DB_HOST="127.0.0.1", DB_PORT=str(porta), DB_USER="root", DB_PASSWORD="bench",
+                      DB_NAME="estacionamento", DB_SSL_CA="")
+
+
+def conectar_quando_pronto(limite: float = 120.0):
+    from migrar import conectar
+
+    prazo = time.monotonic() + limite
+    while True:
+        try:
+            return conectar()
+        except Exception:
+            if time.monotonic() > prazo:
+                raise
+            time.sleep(1)
+
+
+def preparar_banco(args) -> dict:
+    import migrar
+
+    conexao = conectar_quando_pronto()
+    try:
+        migrar.aplicar(conexao)
+        if args.ressemear or not semear.ja_semeado(conexao, args.usuarios):
+            semear.limpar(conexao)
+            volumes = semear.semear(conexao, args.usuarios, args.cartoes_por_usuario, args.sessoes_por_usuario)
+        else:
+            volumes = {"usuarios": args.usuarios, "reaproveitado": True}
+        # Estado inicial conhecido: nenhuma sessão ativa de rodadas anteriores.
+        with conexao.cursor() as cursor:
+            cursor.execute("UPDATE sessoes SET status = 'CANCELADA' WHERE status = 'ATIVA'")
+    finally:
+        conexao.close()
+    return volumes
+
+
+# --- API ---
+
+def subir_api(args) -> subprocess.Popen:
+    ambiente = {
+        **os.environ,
+        "SECRET_KEY": os.environ.get("SECRET_KEY", "segredo-de-benchmark"),
+        "DB_CONTAR_IDAS": "1",
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "DB_POOL_SIZE": str(args.pool),
+    }
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.porta_api),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=PASTA_API, env=ambiente,
+    )
+    prazo = time.monotonic() + 60
+    while time.monotonic() < prazo:
+        try:
+            if httpx.get(f"http://127.0.0.1:{args.porta_api}/saude/pronto", timeout=1).status_code == 200:
+                return processo
+        except httpx.HTTPError:
+            pass
+        if processo.poll() is not None:
+            raise SystemExit("A API terminou durante a inicialização.")
+        time.sleep(0.5)
+    processo.terminate()
+    raise SystemExit("A API não respondeu em 60 s.")
+
+
+# --- Cenários ---
+
+class Medicao:
+    def __init__(self):
+        self.latencias = []
+        self.idas = []
+        self.erros = 0
+
+    def registrar(self, resposta: httpx.Response, inicio: float, status_ok):
+        if resposta.status_code not in status_ok:
+            self.erros += 1
+            return
+        self.latencias.append(time.perf_counter() - inicio)
+        idas = resposta.headers.get("x-db-round-trips")
+        if idas is not None:
+            self.idas.append(int(idas))
+
+    def resumo(self, nome: str, duracao: float, concorrencia: int) -> dict:
+        extras = {"concorrencia": concorrencia}
+        if self.idas:
+            extras["idas_db_media"] = round(sum(self.idas) / len(self.idas), 2)
+            extras["idas_db_p95"] = percentil(self.idas, 95)
+        return resumir(nome, self.latencias, self.erros, duracao, **extras)
+
+
+async def em_paralelo(tarefas, concorrencia: int):
+    vagas = asyncio.Semaphore(concorrencia)
+
+    async def com_vaga(tarefa):
+        async with vagas:
+            await tarefa()
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(com_vaga(tarefa) for tarefa in tarefas))
+    return time.perf_counter() - inicio
+
+
+async def por_tempo(passo, concorrencia: int, duracao: float):
+    fim = time.perf_counter() + duracao
+
+    async def laco(indice: int):
+        while time.perf_counter() < fim:
+            await passo(indice)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(laco(indice) for indice in range(concorrencia)))
+    return time.perf_counter() - inicio
+
+
+async def cenario_login(cliente, usuarios, args, tokens):
+    medicao = Medicao()
+
+    def tarefa(indice):
+        async def executar():
+            inicio = time.perf_counter()
+            resposta = await cliente.post("/usuarios/login", data={"username": semear.email(indice), "password": semear.SENHA})
+            medicao.registrar(resposta, inicio, (200,))
+            if resposta.status_code == 200:
+                tokens[indice] = {"Authorization": f"Bearer {resposta.json()['access_token']}"}
+        return executar
+
+    duracao = await em_paralelo([tarefa(indice) for indice in usuarios], args.concorrencia)
+    return medicao.resumo("login", duracao, args.concorrencia)
+
+
+async def cenario_uma_vez(nome, caminho, cliente, tokens, args, status_ok):
+    medicao = Medicao()
+
+    def tarefa(cabecalhos):
+        async def executar():
+            inicio = time.perf_counter()
+            medicao.registrar(await cliente.post(caminho, headers=cabecalhos), inicio, status_ok)
+        return executar
+
+    duracao = await em_paralelo([tarefa(cabecalhos) for cabecalhos in tokens.values()], args.concorrencia)
+    return medicao.resumo(nome, duracao, args.concorrencia)
+
+
+async def cenario_status(cliente, tokens, args):
+    medicao = Medicao()
+    cabecalhos = list(tokens.values())
+    aleatorio = random.Random(1)
+
+    async def passo(_indice):
+        inicio = time.perf_counter()
+        medicao.registrar(await cliente.get("/sessoes/status", headers=aleatorio.choice(cabecalhos)), inicio, (200, 404))
+
+    duracao = await por_tempo(passo, args.concorrencia, args.duracao)
+    return medicao.resumo("status", duracao, args.concorrencia)
+
+
+async def cenario_historico(cliente, tokens, args):
+    medicao = Medicao()
+    cabecalhos = list(tokens.values())
+    aleatorio = random.Random(2)
+
+    async def passo(_indice):
+        escolhidos = aleatorio.choice(cabecalhos)
+        parametros = {"limite": 20}
+        for _ in range(3):
+            inicio = time.perf_counter()
+            resposta = await cliente.get("/pagamentos/me/", params=parametros, headers=escolhidos)
+            medicao.registrar(resposta, inicio, (200,))
+            proximo = resposta.headers.get("x-proximo-cursor")
+            if not proximo:
+                break
+            parametros = {"limite": 20, "cursor": proximo}
+
+    duracao = await por_tempo(passo, args.concorrencia, args.duracao)
+    return medicao.resumo("historico", duracao, args.concorrencia)
+
+
+async def rodar_cenarios(args) -> list:
+    aleatorio = random.Random(3)
+    usuarios = aleatorio.sample(range(args.usuarios), min(args.usuarios_ativos, args.usuarios))
+    tokens: dict = {}
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    resultados = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.porta_api}", limits=limites, timeout=60) as cliente:
+        # O login vem sempre primeiro: os demais cenários usam os tokens.
+        for nome in ("login",) + tuple(c for c in args.cenarios if c != "login"):
+            if nome == "login":
+                resultado = await cenario_login(cliente, usuarios, args, tokens)
+            elif nome == "entrada":
+                resultado = await cenario_uma_vez("entrada", "/sessoes/checkin", cliente, tokens, args, (201,))
+            elif nome == "status":
+                resultado = await cenario_status(cliente, tokens, args)
+            elif nome == "historico":
+                resultado = await cenario_historico(cliente, tokens, args)
+            else:
+                resultado = await cenario_uma_vez("saida", "/sessoes/checkout", cliente, tokens, args, (200,))
+            if nome in args.cenarios:
+                print(resultado)
+                resultados.append(resultado)
+    return resultados
+
+
+def commit_atual() -> str:
+    resultado = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PASTA_API, capture_output=True, text=True)
+    return resultado.stdout.strip() or "?"
+
+
+def principal(args) -> int:
+    if args.comparar:
+        comparar(*args.comparar)
+        problemas = regressoes(*args.comparar, tolerancia=args.tolerancia)
+        for problema in problemas:
+            print("REGRESSÃO", problema)
+        return 1 if problemas else 0
+
+    if args.docker_imagem:
+        subir_mariadb(args.docker_imagem, args.porta_db)
+    api = None
+    try:
+        volumes = preparar_banco(args)
+        print("dados:", volumes)
+        api = subir_api(args)
+        resultados = asyncio.run(rodar_cenarios(args))
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait()
+        if args.docker_imagem and not args.manter_banco:
+            subprocess.run(["docker", "rm", "-f", CONTEINER], capture_output=True)
+
+    if args.saida:
+        salvar({
+            "commit": commit_atual(),
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "parametros": {chave: valor for chave, valor in vars(args).items() if chave not in ("saida", "comparar")},
+            "dados": volumes,
+            "resultados": resultados,
+        }, args.saida)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suíte de carga reprodutível da API")
+    parser.add_argument("--docker-imagem", default="mariadb:11", help="Imagem do banco descartável; vazio usa DB_*")
+    parser.add_argument("--porta-db", type=int, default=33306)
+    parser.add_argument("--manter-banco", action="store_true", help="Não remove o contêiner no fim (reaproveita os dados)")
+    parser.add_argument("--ressemear", action="store_true", help="Recria os dados mesmo que já existam")
+    parser.add_argument("--usuarios", type=int, default=10000, help="Usuários semeados")
+    parser.add_argument("--cartoes-por-usuario", type=int, default=2)
+    parser.add_argument("--sessoes-por-usuario", type=int, default=50)
+    parser.add_argument("--usuarios-ativos", type=int, default=1000, help="Usuários que participam dos cenários")
+    parser.add_argument("--porta-api", type=int, default=8799)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--pool", type=int, default=10, help="DB_POOL_SIZE da API")
+    parser.add_argument("--bcrypt-rounds", type=int, default=12)
+    parser.add_argument("--concorrencia", type=int, default=100)
+    parser.add_argument("--duracao", type=float, default=15.0, help="Segundos dos cenários por tempo (status, historico)")
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DEPOIS"))
+    parser.add_argument("--tolerancia", type=float, default=10.0, help="Piora aceita na comparação, em %%")
+    sys.exit(principal(parser.parse_args()))
@@ -0,0 +1,95 @@
+# bench_tarifas.py - CUSTO DO CÁLCULO DE TARIFA POR SESSÃO
+#
+# Microbenchmark do motor de tarifas: compilação, cálculo de uma sessão
+# (o que preview e checkout fazem) e recálculo em lote com numpy. Não
+# precisa de servidor nem de banco.
+#
+#   python benchmarks/bench_tarifas.py [--sessoes 100000] [--saida tarifas.json]
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from comum import salvar  # noqa: E402
+from tarifas import DEFINICAO_PADRAO, Tarifa  # noqa: E402
+
+# Tarifa com tudo ligado: carência, primeira hora, frações de 15 min,
+# noturno, fim de semana e teto diário.
+DEFINICAO_COMPLETA = {
+    "carencia_minutos": 10,
+    "primeira_hora_minutos": 60,
+    "primeira_hora": "8.00",
+    "fracao_minutos": 15,
+    "valor_fracao": "2.00",
+    "teto_diario": "40.00",
+    "tabelas": [
+        {"dias": [5, 6], "valor_fracao": "1.00"},
+        {"dias": [0, 1, 2, 3, 4], "inicio": "22:00", "fim": "06:00", "valor_fracao": "1.50"},
+    ],
+}
+
+
+def gerar_sessoes(quantidade: int):
+    """Permanências de alguns minutos a três dias, espalhadas por um mês."""
+    aleatorio = random.Random(42)
+    inicio = datetime(2024, 1, 1)
+    entradas, saidas = [], []
+    for _ in range(quantidade):
+        entrada = inicio + timedelta(seconds=aleatorio.randint(0, 30 * 86400))
+        entradas.append(entrada)
+        saidas.append(entrada + timedelta(seconds=int(aleatorio.expovariate(1 / 7200)) % (3 * 86400)))
+    return entradas, saidas
+
+
+def principal(args):
+    entradas, saidas = gerar_sessoes(args.sessoes)
+
+    # No recálculo em lote as datas já vêm como datetime64; converter listas
+    # de datetime é medido à parte porque custa mais que o cálculo em si.
+    inicio = time.perf_counter()
+    entradas64 = np.array(entradas, dtype="datetime64[us]")
+    saidas64 = np.array(saidas, dtype="datetime64[us]")
+    conversao_us = 1e6 * (time.perf_counter() - inicio) / args.sessoes
+
+    resultados = []
+    for nome, definicao in (("padrao", DEFINICAO_PADRAO), ("completa", DEFINICAO_COMPLETA)):
+        inicio = time.perf_counter()
+        tarifa = Tarifa(definicao)
+        compilacao_ms = 1000 * (time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        for entrada, saida in zip(entradas, saidas):
+            tarifa.calcular(entrada, saida)
+        por_sessao_us = 1e6 * (time.perf_counter() - inicio) / args.sessoes
+
+        inicio = time.perf_counter()
+        tarifa.calcular_lote(entradas64, saidas64)
+        lote_us = 1e6 * (time.perf_counter() - inicio) / args.sessoes
+
+        resultado = {
+            "cenario": nome,
+            "sessoes": args.sessoes,
+            "compilacao_ms": round(compilacao_ms, 2),
+            "por_sessao_us": round(por_sessao_us, 3),
+            "lote_por_sessao_us": round(lote_us, 3),
+            "conversao_datetime64_por_sessao_us": round(conversao_us, 3),
+        }
+        print(resultado)
+        resultados.append(resultado)
+
+    if args.saida:
+        salvar(resultados, args.saida)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Custo do cálculo de tarifa por sessão")
+    parser.add_argument("--sessoes", type=int, default=100_000)
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    principal(parser.parse_args())
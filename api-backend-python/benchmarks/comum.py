@@ -0,0 +1,121 @@
+# comum.py - UTILITÁRIOS COMPARTILHADOS PELOS BENCHMARKS
+
+import asyncio
+import json
+import math
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+
+def percentil(amostras: List[float], p: float) -> float:
+    """Percentil pelo método do posto mais próximo (amostras em segundos)."""
+    if not amostras:
+        return 0.0
+    ordenadas = sorted(amostras)
+    indice = max(0, min(len(ordenadas) - 1, math.ceil(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[indice]
+
+
+def resumir(nome: str, latencias: List[float], erros: int, duracao: float, **extras) -> dict:
+    """Monta o resultado de um cenário: vazão e latências em milissegundos."""
+    total = len(latencias) + erros
+    return {
+        "cenario": nome,
+        "requisicoes": total,
+        "erros": erros,
+        "duracao_s": round(duracao, 3),
+        "req_por_s": round(total / duracao, 1) if duracao else 0.0,
+        "p50_ms": round(1000 * percentil(latencias, 50), 2),
+        "p95_ms": round(1000 * percentil(latencias, 95), 2),
+        "p99_ms": round(1000 * percentil(latencias, 99), 2),
+        **extras,
+    }
+
+
+async def login(cliente: httpx.AsyncClient, email: str, senha: str) -> str:
+    resposta = await cliente.post("/usuarios/login", data={"username": email, "password": senha})
+    resposta.raise_for_status()
+    return resposta.json()["access_token"]
+
+
+async def executar_carga(
+    requisicao: Callable[[int], Awaitable[httpx.Response]],
+    concorrencia: int,
+    duracao: float,
+    status_ok=(200, 201, 204, 404, 409),
+):
+    """
+    Dispara `requisicao(indice_do_cliente)` em `concorrencia` laços paralelos
+    durante `duracao` segundos. Devolve (latências, erros, duração real).
+    """
+    latencias: List[float] = []
+    erros = 0
+    fim = time.perf_counter() + duracao
+
+    async def laco(indice: int):
+        nonlocal erros
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            try:
+                resposta = await requisicao(indice)
+            except httpx.HTTPError:
+                erros += 1
+                continue
+            if resposta.status_code in status_ok:
+                latencias.append(time.perf_counter() - inicio)
+            else:
+                erros += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(laco(i) for i in range(concorrencia)))
+    return latencias, erros, time.perf_counter() - inicio
+
+
+def salvar(resultados, caminho: str):
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(resultados, arquivo, indent=2, ensure_ascii=False)
+
+
+def carregar(caminho: str) -> Dict[str, dict]:
+    """Resultados por cenário; aceita a lista simples ou {"resultados": [...]}."""
+    with open(caminho, encoding="utf-8") as arquivo:
+        dados = json.load(arquivo)
+    if isinstance(dados, dict):
+        dados = dados["resultados"]
+    return {r["cenario"]: r for r in dados}
+
+
+def comparar(caminho_antes: str, caminho_depois: str):
+    """Imprime a variação de vazão e p99 entre duas execuções salvas."""
+    antes = carregar(caminho_antes)
+    depois = carregar(caminho_depois)
+
+    print(f"{'cenário':<28}{'req/s antes':>12}{'req/s depois':>14}{'p99 antes':>12}{'p99 depois':>12}")
+    for nome, r in depois.items():
+        a = antes.get(nome)
+        if a is None:
+            continue
+        print(f"{nome:<28}{a['req_por_s']:>12}{r['req_por_s']:>14}{a['p99_ms']:>12}{r['p99_ms']:>12}")
+
+
+def regressoes(caminho_antes: str, caminho_depois: str, tolerancia: float = 10.0) -> List[str]:
+    """
+    Cenários em que a vazão caiu ou o p99 subiu mais que `tolerancia` por
+    cento, ou que passaram a ter erros.
+    """
+    antes = carregar(caminho_antes)
+    depois = carregar(caminho_depois)
+    problemas = []
+    for nome, r in depois.items():
+        a = antes.get(nome)
+        if a is None or "req_por_s" not in a:
+            continue
+        if r["req_por_s"] < a["req_por_s"] * (1 - tolerancia / 100):
+            problemas.append(f"{nome}: vazão {a['req_por_s']} -> {r['req_por_s']} req/s")
+        if r["p99_ms"] > a["p99_ms"] * (1 + tolerancia / 100):
+            problemas.append(f"{nome}: p99 {a['p99_ms']} -> {r['p99_ms']} ms")
+        if r.get("erros", 0) > a.get("erros", 0):
+            problemas.append(f"{nome}: erros {a.get('erros', 0)} -> {r['erros']}")
+    return problemas
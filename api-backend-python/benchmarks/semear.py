@@ -0,0 +1,127 @@
+# semear.py - VOLUME REALISTA DE DADOS PARA OS BENCHMARKS
+#
+# Preenche um banco de teste (já migrado) com usuários, cartões, sessões
+# finalizadas e pagamentos espalhados pelos últimos dias, com uma semente
+# fixa: duas execuções com os mesmos parâmetros geram os mesmos dados.
+# Todos os usuários têm a senha SENHA. Usado por bench_suite.py, ou sozinho:
+#
+#   DB_SSL_CA= python benchmarks/semear.py --usuarios 10000 --sessoes-por-usuario 50
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+SENHA = "senha-de-benchmark"
+CARTOES = ["4111111111111111", "5555555555554444", "378282246310005", "6362970000457013", "6062825624254001"]
+LOTE = 5000
+
+
+def email(indice: int) -> str:
+    return f"bench-{indice}@exemplo.com"
+
+
+def ja_semeado(conexao, usuarios: int) -> bool:
+    """O último usuário desta configuração já existe?"""
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT id FROM usuarios WHERE email = %s", (email(usuarios - 1),))
+        return cursor.fetchone() is not None
+
+
+def limpar(conexao):
+    with conexao.cursor() as cursor:
+        for tabela in ("pagamentos", "sessoes", "cartoes", "usuarios", "ocupacao_faixas"):
+            cursor.execute(f"DELETE FROM {tabela}")
+
+
+def _inserir(conexao, sql: str, linhas):
+    with conexao.cursor() as cursor:
+        for inicio in range(0, len(linhas), LOTE):
+            # executemany do pymysql junta as linhas em INSERTs de várias linhas.
+            cursor.executemany(sql, linhas[inicio:inicio + LOTE])
+
+
+def semear(conexao, usuarios: int, cartoes_por_usuario: int = 2, sessoes_por_usuario: int = 50,
+           dias: int = 90, semente: int = 42) -> dict:
+    """Insere os dados e devolve quantas linhas foram criadas em cada tabela."""
+    # Importados aqui: BCRYPT_ROUNDS e TARIFA_ARQUIVO já vêm do ambiente do chamador.
+    import ocupacao
+    from cartoes import resumo
+    from senhas import gerar_hash
+    from tarifas import Tarifa
+
+    aleatorio = random.Random(semente)
+    tarifa = Tarifa.do_ambiente()
+    senha_hash = gerar_hash(SENHA)
+    agora = datetime.now().replace(microsecond=0)
+    inicio = time.perf_counter()
+
+    _inserir(conexao, "INSERT INTO usuarios (nome, email, senha) VALUES (%s, %s, %s)",
+             [(f"Bench {indice}", email(indice), senha_hash) for indice in range(usuarios)])
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT id FROM usuarios WHERE email LIKE 'bench-%' ORDER BY id")
+        ids = [linha["id"] for linha in cursor.fetchall()]
+
+    cartoes = []
+    for usuario_id in ids:
+        for indice in range(cartoes_por_usuario):
+            numero = aleatorio.choice(CARTOES)
+            cartoes.append((usuario_id, numero, "BENCH", "12/30", "123", indice == 0, *resumo(numero)))
+    _inserir(conexao, "INSERT INTO cartoes (usuario_id, numero, nome, validade, cvv, is_default, ultimos_4, bandeira) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", cartoes)
+
+    # Sessões e pagamentos em lotes por faixa de usuários, para não montar
+    # milhões de tuplas de uma vez.
+    sessoes = pagamentos = 0
+    for primeiro in range(0, len(ids), 1000):
+        lote_sessoes, lote_pagamentos = [], []
+        for usuario_id in ids[primeiro:primeiro + 1000]:
+            for _ in range(sessoes_por_usuario):
+                entrada = agora - timedelta(seconds=aleatorio.randint(3600, dias * 86400))
+                # Pico de entradas pela manhã: metade das sessões começa entre 7h e 10h.
+                if aleatorio.random() < 0.5:
+                    manha = entrada.replace(hour=aleatorio.randint(7, 9))
+                    entrada = manha if manha < agora - timedelta(hours=1) else entrada
+                saida = min(entrada + timedelta(seconds=int(aleatorio.expovariate(1 / 7200)) + 60), agora)
+                valor = tarifa.calcular(entrada, saida)
+                lote_sessoes.append((usuario_id, entrada, saida, valor, "FINALIZADA"))
+                lote_pagamentos.append((usuario_id, entrada, saida, valor, int(aleatorio.choice(CARTOES))))
+        _inserir(conexao, "INSERT INTO sessoes (usuario_id, horario_entrada, horario_saida, valor_pago, status) VALUES (%s, %s, %s, %s, %s)", lote_sessoes)
+        _inserir(conexao, "INSERT INTO pagamentos (usuario_id, horario_entrada, horario_saida, valor_pago, numero_cartao) VALUES (%s, %s, %s, %s, %s)", lote_pagamentos)
+        sessoes += len(lote_sessoes)
+        pagamentos += len(lote_pagamentos)
+
+    ocupacao.reconstruir(conexao)
+    return {
+        "usuarios": len(ids),
+        "cartoes": len(cartoes),
+        "sessoes": sessoes,
+        "pagamentos": pagamentos,
+        "duracao_s": round(time.perf_counter() - inicio, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Preenche o banco de teste com volume realista")
+    parser.add_argument("--usuarios", type=int, default=10000)
+    parser.add_argument("--cartoes-por-usuario", type=int, default=2)
+    parser.add_argument("--sessoes-por-usuario", type=int, default=50)
+    parser.add_argument("--dias", type=int, default=90)
+    parser.add_argument("--limpar", action="store_true", help="Apaga os dados existentes antes")
+    args = parser.parse_args()
+
+    from migrar import conectar
+
+    conexao = conectar()
+    try:
+        if args.limpar:
+            limpar(conexao)
+        if ja_semeado(conexao, args.usuarios):
+            print("Banco já semeado com esta quantidade de usuários.")
+        else:
+            print(semear(conexao, args.usuarios, args.cartoes_por_usuario, args.sessoes_por_usuario, args.dias))
+    finally:
+        conexao.close()
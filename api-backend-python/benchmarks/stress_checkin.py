@@ -0,0 +1,78 @@
+# stress_checkin.py - CHECK-INS E CHECKOUTS SIMULTÂNEOS DE UM MESMO USUÁRIO
+#
+# Simula o app repetindo requisições numa rede instável: dispara vários
+# check-ins (e depois checkouts) em paralelo para o mesmo usuário e confere
+# que exatamente um é aceito. Repete com uma Idempotency-Key compartilhada,
+# quando todos devem receber a mesma resposta. Sai com código 1 se alguma
+# rodada violar as regras.
+#
+#   python benchmarks/stress_checkin.py --email teste@exemplo.com --senha 123456 \
+#       --paralelas 20 --rodadas 10
+
+import argparse
+import asyncio
+import sys
+import uuid
+from collections import Counter
+
+import httpx
+
+from comum import login, salvar
+
+
+async def disparar(cliente, caminho, cabecalhos, quantidade):
+    respostas = await asyncio.gather(*[cliente.post(caminho, headers=cabecalhos) for _ in range(quantidade)])
+    return respostas, Counter(resposta.status_code for resposta in respostas)
+
+
+async def principal(args) -> int:
+    falhas = []
+    resultados = []
+    limites = httpx.Limits(max_connections=args.paralelas)
+    async with httpx.AsyncClient(base_url=args.url, limits=limites, timeout=30) as cliente:
+        token = await login(cliente, args.email, args.senha)
+        cabecalhos = {"Authorization": f"Bearer {token}"}
+        # Começa sem sessão ativa.
+        await cliente.post("/sessoes/checkout", headers=cabecalhos)
+
+        for rodada in range(args.rodadas):
+            _, checkins = await disparar(cliente, "/sessoes/checkin", cabecalhos, args.paralelas)
+            _, checkouts = await disparar(cliente, "/sessoes/checkout", cabecalhos, args.paralelas)
+            if checkins[201] != 1 or checkins[201] + checkins[409] != args.paralelas:
+                falhas.append(f"rodada {rodada}: check-ins {dict(checkins)}")
+            if checkouts[200] != 1 or checkouts[200] + checkouts[404] != args.paralelas:
+                falhas.append(f"rodada {rodada}: checkouts {dict(checkouts)}")
+
+            # Mesma chave em todas: uma execução, as demais repetem a resposta.
+            com_chave = {**cabecalhos, "Idempotency-Key": str(uuid.uuid4())}
+            respostas, repetidas = await disparar(cliente, "/sessoes/checkin", com_chave, args.paralelas)
+            sessoes = {resposta.json().get("sessao_id") for resposta in respostas}
+            if repetidas[201] != args.paralelas or len(sessoes) != 1:
+                falhas.append(f"rodada {rodada}: check-ins com a mesma chave {dict(repetidas)}, sessões {sessoes}")
+            await cliente.post("/sessoes/checkout", headers=cabecalhos)
+
+            resultado = {
+                "rodada": rodada,
+                "checkins": dict(checkins),
+                "checkouts": dict(checkouts),
+                "checkins_mesma_chave": dict(repetidas),
+            }
+            print(resultado)
+            resultados.append(resultado)
+
+    if args.saida:
+        salvar(resultados, args.saida)
+    for falha in falhas:
+        print("FALHA", falha)
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check-ins e checkouts simultâneos de um mesmo usuário")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--senha", required=True)
+    parser.add_argument("--paralelas", type=int, default=20, help="Requisições simultâneas por rodada")
+    parser.add_argument("--rodadas", type=int, default=10)
+    parser.add_argument("--saida", help="Arquivo JSON onde salvar os resultados")
+    sys.exit(asyncio.run(principal(parser.parse_args())))
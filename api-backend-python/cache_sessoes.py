@@ -0,0 +1,255 @@
+# cache_sessoes.py - CACHE DA SESSÃO ATIVA DE CADA USUÁRIO
+
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+# Marca de "chave não está no cache" (diferente de "usuário sem sessão").
+AUSENTE = object()
+
+
+class BackendMemoria:
+    """
+    Armazenamento local ao processo, limitado em tamanho, com TTL e LRU.
+
+    Guarda também a sequência da última gravação de cada chave: um
+    preenchimento só entra se nenhuma gravação aconteceu depois da versão
+    tirada antes da leitura do banco.
+    """
+
+    def __init__(self, capacidade: int = 10000):
+        self.capacidade = capacidade
+        self._itens = OrderedDict()  # chave -> (expira_em, valor)
+        self._sequencia = 0  # contador de gravações
+        self._gravado_em = {}  # chave -> sequência da última gravação
+
+    async def obter(self, chave):
+        item = self._itens.get(chave)
+        if item is None:
+            return AUSENTE
+        expira_em, valor = item
+        if expira_em <= time.monotonic():
+            del self._itens[chave]
+            return AUSENTE
+        self._itens.move_to_end(chave)
+        return valor
+
+    async def definir(self, chave, valor, ttl: float):
+        self._itens[chave] = (time.monotonic() + ttl, valor)
+        self._itens.move_to_end(chave)
+        while len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+
+    async def versao(self) -> int:
+        return self._sequencia
+
+    async def preencher(self, chave, valor, ttl: float, versao: int):
+        if self._gravado_em.get(chave, 0) > versao:
+            return
+        await self.definir(chave, valor, ttl)
+
+    async def gravar(self, chave, valor, ttl: float):
+        self._marcar(chave)
+        await self.definir(chave, valor, ttl)
+
+    async def remover(self, chave):
+        self._marcar(chave)
+        self._itens.pop(chave, None)
+
+    def _marcar(self, chave):
+        if len(self._gravado_em) >= 100000:
+            # Esquecer gravações antigas só reabre a janela de corrida, que o TTL limita.
+            self._gravado_em.clear()
+        self._sequencia += 1
+        self._gravado_em[chave] = self._sequencia
+
+    def __len__(self):
+        return len(self._itens)
+
+
+# Gravação (write-through ou remoção): incrementa o contador global e marca
+# a chave com o novo valor dele. KEYS: valor, marca, contador. ARGV: JSON
+# ('' remove), TTL do valor, TTL da marca.
+_SCRIPT_GRAVAR = """
+local versao = redis.call('INCR', KEYS[3])
+redis.call('SET', KEYS[2], versao, 'EX', ARGV[3])
+if ARGV[1] == '' then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+return versao
+"""
+
+# Preenchimento a partir de uma leitura do banco: só grava se a chave não
+# foi marcada depois da versão lida antes da consulta. KEYS: valor, marca.
+# ARGV: JSON, TTL, versão.
+_SCRIPT_PREENCHER = """
+local marca = tonumber(redis.call('GET', KEYS[2]) or '0')
+if marca > tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+class BackendRedis:
+    """
+    Armazenamento compartilhado entre processos.
+
+    Recebe qualquer cliente com a interface assíncrona do redis-py
+    (`get`, `eval`), o que permite trocar o Redis por um substituto local
+    nos testes. O limite de tamanho fica a cargo da política `maxmemory`
+    do próprio Redis.
+
+    A proteção contra preenchimentos atrasados fica no Redis: a versão é
+    um contador compartilhado e cada gravação marca a chave com ele, de
+    modo que a leitura antiga de um worker não sobrescreve o check-in ou
+    checkout gravado por outro.
+    """
+
+    # Maior que qualquer leitura do banco: depois disso a marca pode sumir.
+    TTL_MARCA = 3600
+
+    def __init__(self, cliente, prefixo: str = "sessao_ativa:"):
+        self._cliente = cliente
+        self._prefixo = prefixo
+        self._contador = f"{prefixo}versao"
+
+    async def obter(self, chave):
+        bruto = await self._cliente.get(f"{self._prefixo}{chave}")
+        if bruto is None:
+            return AUSENTE
+        valor = json.loads(bruto)
+        if valor is not None:
+            valor["horario_entrada"] = datetime.fromisoformat(valor["horario_entrada"])
+        return valor
+
+    async def versao(self) -> int:
+        return int(await self._cliente.get(self._contador) or 0)
+
+    async def preencher(self, chave, valor, ttl: float, versao: int):
+        await self._cliente.eval(
+            _SCRIPT_PREENCHER, 2, f"{self._prefixo}{chave}", f"{self._prefixo}marca:{chave}",
+            self._json(valor), max(1, int(ttl)), versao,
+        )
+
+    async def gravar(self, chave, valor, ttl: float):
+        await self._executar_gravacao(chave, self._json(valor), ttl)
+
+    async def remover(self, chave):
+        await self._executar_gravacao(chave, "", 1)
+
+    async def _executar_gravacao(self, chave, bruto: str, ttl: float):
+        await self._cliente.eval(
+            _SCRIPT_GRAVAR, 3, f"{self._prefixo}{chave}", f"{self._prefixo}marca:{chave}", self._contador,
+            bruto, max(1, int(ttl)), self.TTL_MARCA,
+        )
+
+    @staticmethod
+    def _json(valor) -> str:
+        if valor is not None:
+            valor = {"id": valor["id"], "horario_entrada": valor["horario_entrada"].isoformat()}
+        return json.dumps(valor)
+
+    async def fechar(self):
+        await self._cliente.aclose()
+
+    def __len__(self):
+        return 0
+
+
+class CacheSessoesAtivas:
+    """
+    Sessão ativa por usuário: {"id", "horario_entrada"} ou None quando o
+    usuário não tem sessão (resultado negativo, também guardado).
+
+    Check-in e checkout gravam o novo estado aqui logo após o commit
+    (write-through). Leituras que vão ao banco só preenchem o cache se
+    nenhuma gravação aconteceu para o usuário enquanto a consulta corria;
+    a verificação é do backend, para valer também entre workers.
+    """
+
+    def __init__(self, backend, ttl: float = 30.0, ttl_negativo: float = 10.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.ttl_negativo = ttl_negativo
+
+        self.acertos = 0
+        self.acertos_negativos = 0
+        self.faltas = 0
+
+    async def obter(self, usuario_id: int) -> Tuple[bool, Optional[dict]]:
+        valor = await self.backend.obter(usuario_id)
+        if valor is AUSENTE:
+            self.faltas += 1
+            return False, None
+        if valor is None:
+            self.acertos_negativos += 1
+        else:
+            self.acertos += 1
+        return True, valor
+
+    async def versao(self) -> int:
+        """Marco a ser tirado antes de consultar o banco (ver `preencher`)."""
+        return await self.backend.versao()
+
+    async def preencher(self, usuario_id: int, sessao: Optional[dict], versao: int):
+        """Guarda o resultado de uma leitura do banco iniciada na `versao` dada."""
+        sessao = self._resumo(sessao)
+        await self.backend.preencher(usuario_id, sessao, self._ttl(sessao), versao)
+
+    async def gravar(self, usuario_id: int, sessao: Optional[dict]):
+        """Write-through: chamado após o commit de check-in/checkout."""
+        sessao = self._resumo(sessao)
+        await self.backend.gravar(usuario_id, sessao, self._ttl(sessao))
+
+    async def invalidar(self, usuario_id: int):
+        await self.backend.remover(usuario_id)
+
+    async def fechar(self):
+        if hasattr(self.backend, "fechar"):
+            await self.backend.fechar()
+
+    @staticmethod
+    def _resumo(sessao: Optional[dict]) -> Optional[dict]:
+        return {"id": sessao["id"], "horario_entrada": sessao["horario_entrada"]} if sessao is not None else None
+
+    def _ttl(self, sessao: Optional[dict]) -> float:
+        return self.ttl if sessao is not None else self.ttl_negativo
+
+    def estatisticas(self) -> dict:
+        consultas = self.acertos + self.acertos_negativos + self.faltas
+        return {
+            "itens": len(self.backend),
+            "acertos": self.acertos,
+            "acertos_negativos": self.acertos_negativos,
+            "faltas": self.faltas,
+            "taxa_acerto": round((self.acertos + self.acertos_negativos) / consultas, 4) if consultas else 0.0,
+        }
+
+
+def criar_cache_do_ambiente() -> CacheSessoesAtivas:
+    """
+    Em memória por padrão. Com CACHE_SESSOES_REDIS_URL definido, usa um
+    Redis compartilhado (necessário para ficar coerente entre workers).
+    """
+    url_redis = os.environ.get("CACHE_SESSOES_REDIS_URL")
+    if url_redis:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("CACHE_SESSOES_REDIS_URL definido, mas o pacote 'redis' não está instalado.")
+        backend = BackendRedis(redis.from_url(url_redis))
+    else:
+        backend = BackendMemoria(int(os.environ.get("CACHE_SESSOES_CAPACIDADE", "10000")))
+
+    return CacheSessoesAtivas(
+        backend,
+        ttl=float(os.environ.get("CACHE_SESSOES_TTL", "30")),
+        ttl_negativo=float(os.environ.get("CACHE_SESSOES_TTL_NEGATIVO", "10")),
+    )
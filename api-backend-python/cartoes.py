@@ -0,0 +1,103 @@
+# cartoes.py - RESUMO DO CARTÃO E CACHE DA LISTAGEM POR USUÁRIO
+#
+# O cadastro grava, junto com o cartão, os últimos quatro dígitos e a
+# bandeira (pelo BIN, ver bandeiras.py); a listagem lê só essas colunas e
+# devolve o número já mascarado. A lista de cada usuário fica em cache até
+# um cadastro, exclusão ou troca de cartão padrão.
+
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+from bandeiras import bandeira
+
+
+def resumo(numero: str) -> Tuple[str, str]:
+    """(últimos quatro dígitos, bandeira) de um número de cartão."""
+    digitos = "".join(c for c in numero if c.isdigit())
+    return digitos[-4:], bandeira(digitos)
+
+
+def mascarar(ultimos4: str) -> str:
+    return f"**** **** **** {ultimos4}"
+
+
+class CacheCartoes:
+    """
+    Cartões já mascarados de cada usuário (LRU, por `ttl` segundos) e o id
+    do cartão padrão entre eles.
+
+    Cada alteração invalida o usuário logo após o commit. Uma listagem que
+    foi ao banco só preenche o cache se nenhuma invalidação aconteceu para o
+    usuário enquanto a consulta corria (mesmo esquema de cache_sessoes.py).
+    O TTL limita a defasagem em relação ao que outros workers gravam.
+    """
+
+    def __init__(self, capacidade: int = 10000, ttl: float = 60.0):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._itens: "OrderedDict[int, Tuple[float, List[dict], Optional[int]]]" = OrderedDict()
+        self._sequencia = 0
+        self._invalidado_em = {}  # usuario_id -> sequência da última invalidação
+
+        self.acertos = 0
+        self.faltas = 0
+        self.invalidacoes = 0
+
+    @classmethod
+    def do_ambiente(cls) -> "CacheCartoes":
+        return cls(
+            capacidade=int(os.environ.get("CARTOES_CACHE_CAPACIDADE", "10000")),
+            ttl=float(os.environ.get("CARTOES_CACHE_TTL", "60")),
+        )
+
+    def _item(self, usuario_id: int):
+        item = self._itens.get(usuario_id)
+        if item is not None and item[0] > time.monotonic():
+            self._itens.move_to_end(usuario_id)
+            self.acertos += 1
+            return item
+        self._itens.pop(usuario_id, None)
+        self.faltas += 1
+        return None
+
+    def obter(self, usuario_id: int) -> Optional[List[dict]]:
+        item = self._item(usuario_id)
+        return item[1] if item is not None else None
+
+    def padrao(self, usuario_id: int) -> Tuple[bool, Optional[int]]:
+        """(encontrado no cache, id do cartão padrão ou None)."""
+        item = self._item(usuario_id)
+        return (True, item[2]) if item is not None else (False, None)
+
+    def versao(self) -> int:
+        """Marco a ser tirado antes de consultar o banco (ver `guardar`)."""
+        return self._sequencia
+
+    def guardar(self, usuario_id: int, cartoes: List[dict], versao: int):
+        if self._invalidado_em.get(usuario_id, 0) > versao:
+            return
+        padrao = next((cartao["id"] for cartao in cartoes if cartao["is_default"]), None)
+        self._itens[usuario_id] = (time.monotonic() + self.ttl, cartoes, padrao)
+        self._itens.move_to_end(usuario_id)
+        while len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+
+    def invalidar(self, usuario_id: int):
+        if len(self._invalidado_em) >= 100000:
+            self._invalidado_em.clear()
+        self._sequencia += 1
+        self._invalidado_em[usuario_id] = self._sequencia
+        if self._itens.pop(usuario_id, None) is not None:
+            self.invalidacoes += 1
+
+    def estatisticas(self) -> dict:
+        consultas = self.acertos + self.faltas
+        return {
+            "itens": len(self._itens),
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "invalidacoes": self.invalidacoes,
+            "taxa_acerto": round(self.acertos / consultas, 4) if consultas else 0.0,
+        }
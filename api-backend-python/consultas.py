@@ -0,0 +1,289 @@
+# consultas.py - CONSULTAS SQL USADAS PELAS ROTAS
+#
+# Toda consulta com filtro (WHERE) usada por main.py fica aqui, para que
+# `python migrar.py verificar-consultas` consiga rodar EXPLAIN em cada uma
+# e falhar se alguma fizer varredura completa de tabela.
+
+SESSAO_ATIVA_DO_USUARIO = "SELECT id, horario_entrada FROM sessoes WHERE usuario_id = %s AND status = 'ATIVA'"
+
+# Checkout: trava a linha da sessão até o commit; um checkout concorrente
+# espera e, depois, já não encontra a sessão ativa.
+SESSAO_ATIVA_DO_USUARIO_PARA_FINALIZAR = SESSAO_ATIVA_DO_USUARIO + " FOR UPDATE"
+
+# Check-in em um único comando: só insere se o usuário não tiver sessão ativa
+# (rowcount 0 = conflito). O índice único uq_sessoes_usuario_ativa cobre
+# o que ainda escapar entre duas transações.
+ABRIR_SESSAO_SE_NAO_HOUVER_ATIVA = """
+INSERT INTO sessoes (usuario_id, horario_entrada, status)
+SELECT %s, %s, 'ATIVA' FROM DUAL
+WHERE NOT EXISTS (SELECT 1 FROM sessoes WHERE usuario_id = %s AND status = 'ATIVA')
+"""
+
+CONTEXTO_USUARIO_POR_EMAIL = """
+SELECT u.id, u.nome, u.email, u.senha,
+       (SELECT COUNT(*) FROM cartoes c WHERE c.usuario_id = u.id) AS card_count,
+       (SELECT c.id FROM cartoes c WHERE c.usuario_padrao = u.id) AS cartao_padrao_id,
+       s.id AS sessao_id, s.horario_entrada AS sessao_horario_entrada
+FROM usuarios u
+LEFT JOIN sessoes s ON s.usuario_id = u.id AND s.status = 'ATIVA'
+WHERE u.email = %s
+LIMIT 1
+"""
+
+ATUALIZAR_SENHA = "UPDATE usuarios SET senha = %s WHERE id = %s"
+
+# Sem a coluna numero: o cadastro já gravou os últimos dígitos e a bandeira.
+CARTOES_DO_USUARIO = "SELECT id, ultimos_4, bandeira, nome, validade, is_default FROM cartoes WHERE usuario_id = %s"
+
+CARTAO_DO_USUARIO = "SELECT id FROM cartoes WHERE id = %s AND usuario_id = %s"
+
+# usuario_padrao só tem valor no cartão padrão (índice único): uma linha no máximo.
+CARTAO_PADRAO_DO_USUARIO = "SELECT id FROM cartoes WHERE usuario_padrao = %s"
+
+DESMARCAR_CARTAO_PADRAO = "UPDATE cartoes SET is_default = FALSE WHERE usuario_padrao = %s"
+
+MARCAR_CARTAO_PADRAO = "UPDATE cartoes SET is_default = TRUE WHERE id = %s AND usuario_id = %s"
+
+EXCLUIR_CARTAO = "DELETE FROM cartoes WHERE id = %s"
+
+COLUNAS_PAGAMENTO = "id, usuario_id, horario_entrada, horario_saida, valor_pago, numero_cartao"
+COLUNAS_SESSAO = "id, usuario_id, horario_entrada, horario_saida, valor_pago, status"
+
+# As leituras de histórico juntam a tabela quente e a de arquivo (manutencao.py
+# move as linhas antigas em lotes; cada lote é uma transação, então uma linha
+# nunca aparece nas duas). Os parâmetros de cada tabela vêm repetidos.
+
+# Paginação por chave (horario_saida, id), do mais recente para o mais antigo:
+# cada página continua de onde a anterior parou, sem OFFSET. Cada tabela
+# entrega no máximo uma página pelo índice; a junção escolhe as mais recentes.
+# Parâmetros: (usuario, limite) * 2, limite.
+PAGAMENTOS_DO_USUARIO = f"""
+SELECT {COLUNAS_PAGAMENTO} FROM (
+    SELECT {COLUNAS_PAGAMENTO} FROM pagamentos
+    WHERE usuario_id = %s
+    ORDER BY horario_saida DESC, id DESC
+    LIMIT %s
+) AS recentes
+UNION ALL
+SELECT {COLUNAS_PAGAMENTO} FROM (
+    SELECT {COLUNAS_PAGAMENTO} FROM pagamentos_arquivo
+    WHERE usuario_id = %s
+    ORDER BY horario_saida DESC, id DESC
+    LIMIT %s
+) AS arquivados
+ORDER BY horario_saida DESC, id DESC
+LIMIT %s
+"""
+
+# Parâmetros: (usuario, saída, saída, id, limite) * 2, limite.
+PAGAMENTOS_DO_USUARIO_APOS = f"""
+SELECT {COLUNAS_PAGAMENTO} FROM (
+    SELECT {COLUNAS_PAGAMENTO} FROM pagamentos
+    WHERE usuario_id = %s AND (horario_saida < %s OR (horario_saida = %s AND id < %s))
+    ORDER BY horario_saida DESC, id DESC
+    LIMIT %s
+) AS recentes
+UNION ALL
+SELECT {COLUNAS_PAGAMENTO} FROM (
+    SELECT {COLUNAS_PAGAMENTO} FROM pagamentos_arquivo
+    WHERE usuario_id = %s AND (horario_saida < %s OR (horario_saida = %s AND id < %s))
+    ORDER BY horario_saida DESC, id DESC
+    LIMIT %s
+) AS arquivados
+ORDER BY horario_saida DESC, id DESC
+LIMIT %s
+"""
+
+EXPORTAR_PAGAMENTOS_DO_USUARIO = f"""
+SELECT {COLUNAS_PAGAMENTO} FROM pagamentos WHERE usuario_id = %s
+UNION ALL
+SELECT {COLUNAS_PAGAMENTO} FROM pagamentos_arquivo WHERE usuario_id = %s
+ORDER BY horario_saida DESC, id DESC
+"""
+
+# O id recebido do cliente pode ser de um pagamento do journal, gravado com
+# o sinal trocado (ver historico.id_publico). Parâmetros: (id, -id, usuario) * 2.
+PAGAMENTO_DO_USUARIO = f"""
+SELECT {COLUNAS_PAGAMENTO} FROM pagamentos WHERE id IN (%s, %s) AND usuario_id = %s
+UNION ALL
+SELECT {COLUNAS_PAGAMENTO} FROM pagamentos_arquivo WHERE id IN (%s, %s) AND usuario_id = %s
+"""
+
+FINALIZAR_SESSAO = "UPDATE sessoes SET horario_saida = %s, valor_pago = %s, status = 'FINALIZADA' WHERE id = %s AND status = 'ATIVA'"
+
+# --- Ingestão em lote (/sessoes/lote): comandos montados para N linhas ---
+
+def _marcadores(quantidade: int) -> str:
+    return ", ".join(["%s"] * quantidade)
+
+
+def sessoes_ativas_dos_usuarios(quantidade: int) -> str:
+    """Uma linha por usuário existente; id/horario_entrada nulos se não houver sessão ativa."""
+    return (
+        "SELECT u.id AS usuario_id, s.id, s.horario_entrada FROM usuarios u "
+        "LEFT JOIN sessoes s ON s.usuario_id = u.id AND s.status = 'ATIVA' "
+        f"WHERE u.id IN ({_marcadores(quantidade)}) FOR UPDATE"
+    )
+
+
+def finalizar_sessoes(quantidade: int) -> str:
+    """Parâmetros: (id, saída) * n, (id, valor) * n, ids."""
+    casos = " ".join(["WHEN %s THEN %s"] * quantidade)
+    return (
+        f"UPDATE sessoes SET horario_saida = CASE id {casos} END, valor_pago = CASE id {casos} END, "
+        f"status = 'FINALIZADA' WHERE id IN ({_marcadores(quantidade)}) AND status = 'ATIVA'"
+    )
+
+
+def inserir_sessoes(quantidade: int) -> str:
+    linhas = ", ".join(["(%s, %s, %s, %s, %s)"] * quantidade)
+    return f"INSERT INTO sessoes (usuario_id, horario_entrada, horario_saida, valor_pago, status) VALUES {linhas}"
+
+
+def sessoes_por_entrada(quantidade: int) -> str:
+    """Parâmetros: (usuario, entrada) * n, pelo índice idx_sessoes_usuario_status."""
+    pares = ", ".join(["(%s, %s)"] * quantidade)
+    return (
+        "SELECT id, usuario_id, horario_entrada, horario_saida, status FROM sessoes "
+        f"WHERE (usuario_id, horario_entrada) IN ({pares}) ORDER BY id"
+    )
+
+
+def inserir_pagamentos(quantidade: int) -> str:
+    """Descarga do journal: os ids (negativos) já vêm gerados pelo journal."""
+    linhas = ", ".join(["(%s, %s, %s, %s, %s, %s)"] * quantidade)
+    return f"INSERT INTO pagamentos ({COLUNAS_PAGAMENTO}) VALUES {linhas}"
+
+
+# Os ids negativos do journal só cabem num BIGINT com sinal (migração 0007).
+TIPO_ID_PAGAMENTOS = """
+SELECT COLUMN_TYPE AS tipo FROM information_schema.COLUMNS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'pagamentos' AND COLUMN_NAME = 'id'
+"""
+
+
+def pagamentos_existentes(quantidade: int) -> str:
+    return f"SELECT id FROM pagamentos WHERE id IN ({_marcadores(quantidade)})"
+
+
+# Ocupação atual: só as sessões ativas têm valor na coluna gerada, então a
+# contagem lê apenas essas entradas do índice uq_sessoes_usuario_ativa.
+CONTAR_SESSOES_ATIVAS = "SELECT COUNT(*) AS ativas FROM sessoes WHERE usuario_ativo IS NOT NULL"
+
+OCUPACAO_FAIXAS = "SELECT faixa, entradas, segundos_ocupados FROM ocupacao_faixas"
+
+# Reconstrução dos histogramas (ocupacao.py reconstruir): uma passada em
+# todas as sessões, fora das rotas. Sessões abandonadas contam a entrada,
+# mas não o tempo (a saída é a hora em que a manutenção as fechou).
+_SESSOES_PARA_OCUPACAO = """
+SELECT horario_entrada, CASE WHEN status = 'ABANDONADA' THEN NULL ELSE horario_saida END
+FROM {tabela} WHERE status <> 'CANCELADA'
+"""
+SESSOES_PARA_OCUPACAO = (
+    _SESSOES_PARA_OCUPACAO.format(tabela="sessoes") + "UNION ALL" + _SESSOES_PARA_OCUPACAO.format(tabela="sessoes_arquivo")
+)
+
+
+# Relatórios (relatorios.py): colunas numéricas para irem direto a arrays.
+# Os horários viram segundos desde a meia-noite do início do período.
+# Parâmetros de cada tabela repetidos (quente e arquivo).
+_PAGAMENTOS_PARA_RELATORIO = """
+SELECT TIMESTAMPDIFF(SECOND, %s, horario_saida), CAST(ROUND(valor_pago * 100) AS SIGNED), numero_cartao
+FROM {tabela}
+WHERE horario_saida >= %s AND horario_saida < %s
+"""
+PAGAMENTOS_PARA_RELATORIO = (
+    _PAGAMENTOS_PARA_RELATORIO.format(tabela="pagamentos") + "UNION ALL" + _PAGAMENTOS_PARA_RELATORIO.format(tabela="pagamentos_arquivo")
+)
+
+_SESSOES_PARA_RELATORIO = """
+SELECT TIMESTAMPDIFF(SECOND, %s, horario_entrada), TIMESTAMPDIFF(SECOND, %s, horario_saida)
+FROM {tabela}
+WHERE horario_saida >= %s AND horario_saida < %s AND status = 'FINALIZADA'
+"""
+SESSOES_PARA_RELATORIO = (
+    _SESSOES_PARA_RELATORIO.format(tabela="sessoes") + "UNION ALL" + _SESSOES_PARA_RELATORIO.format(tabela="sessoes_arquivo")
+)
+
+
+# --- Manutenção (manutencao.py) ---
+
+# Ativas há mais tempo que o limite, pelo índice único da coluna gerada.
+SESSOES_ABANDONADAS = """
+SELECT id, usuario_id, horario_entrada FROM sessoes
+WHERE usuario_ativo IS NOT NULL AND horario_entrada < %s
+LIMIT %s
+FOR UPDATE
+"""
+
+# Encerradas (finalizadas, abandonadas ou canceladas) antes do corte, pelo
+# índice idx_sessoes_saida; as ativas não têm saída.
+SESSOES_PARA_ARQUIVAR = "SELECT id FROM sessoes WHERE horario_saida < %s AND status <> 'ATIVA' ORDER BY horario_saida LIMIT %s"
+
+PAGAMENTOS_PARA_ARQUIVAR = "SELECT id FROM pagamentos WHERE horario_saida < %s ORDER BY horario_saida LIMIT %s"
+
+
+def fechar_sessoes_abandonadas(quantidade: int) -> str:
+    """Parâmetros: horário do fechamento, (id, valor devido) * n, ids."""
+    casos = " ".join(["WHEN %s THEN %s"] * quantidade)
+    return (
+        f"UPDATE sessoes SET status = 'ABANDONADA', horario_saida = %s, valor_pago = CASE id {casos} END "
+        f"WHERE id IN ({_marcadores(quantidade)}) AND status = 'ATIVA'"
+    )
+
+
+def arquivar(tabela: str, colunas: str, quantidade: int) -> str:
+    """Copia as linhas para {tabela}_arquivo (repetidas de uma tentativa anterior são ignoradas)."""
+    return f"INSERT IGNORE INTO {tabela}_arquivo ({colunas}) SELECT {colunas} FROM {tabela} WHERE id IN ({_marcadores(quantidade)})"
+
+
+def excluir(tabela: str, quantidade: int) -> str:
+    return f"DELETE FROM {tabela} WHERE id IN ({_marcadores(quantidade)})"
+
+
+def somar_ocupacao(quantidade: int) -> str:
+    """Parâmetros: (faixa, entradas, segundos) * n, somados aos valores existentes."""
+    linhas = ", ".join(["(%s, %s, %s)"] * quantidade)
+    return (
+        f"INSERT INTO ocupacao_faixas (faixa, entradas, segundos_ocupados) VALUES {linhas} "
+        "ON DUPLICATE KEY UPDATE entradas = entradas + VALUES(entradas), "
+        "segundos_ocupados = segundos_ocupados + VALUES(segundos_ocupados)"
+    )
+
+
+def substituir_ocupacao(quantidade: int) -> str:
+    linhas = ", ".join(["(%s, %s, %s)"] * quantidade)
+    return f"REPLACE INTO ocupacao_faixas (faixa, entradas, segundos_ocupados) VALUES {linhas}"
+
+
+# nome -> (sql, parâmetros de exemplo para o EXPLAIN)
+CONSULTAS_DAS_ROTAS = {
+    "sessao_ativa_do_usuario": (SESSAO_ATIVA_DO_USUARIO, (1,)),
+    "sessao_ativa_do_usuario_para_finalizar": (SESSAO_ATIVA_DO_USUARIO_PARA_FINALIZAR, (1,)),
+    "abrir_sessao_se_nao_houver_ativa": (ABRIR_SESSAO_SE_NAO_HOUVER_ATIVA, (1, "2024-01-01 00:00:00", 1)),
+    "contexto_usuario_por_email": (CONTEXTO_USUARIO_POR_EMAIL, ("explain@exemplo.com",)),
+    "atualizar_senha": (ATUALIZAR_SENHA, ("hash", 1)),
+    "cartoes_do_usuario": (CARTOES_DO_USUARIO, (1,)),
+    "cartao_do_usuario": (CARTAO_DO_USUARIO, (1, 1)),
+    "cartao_padrao_do_usuario": (CARTAO_PADRAO_DO_USUARIO, (1,)),
+    "desmarcar_cartao_padrao": (DESMARCAR_CARTAO_PADRAO, (1,)),
+    "marcar_cartao_padrao": (MARCAR_CARTAO_PADRAO, (1, 1)),
+    "excluir_cartao": (EXCLUIR_CARTAO, (1,)),
+    "pagamentos_do_usuario": (PAGAMENTOS_DO_USUARIO, (1, 50, 1, 50, 50)),
+    "pagamentos_do_usuario_apos": (
+        PAGAMENTOS_DO_USUARIO_APOS,
+        (1, "2024-01-01 00:00:00", "2024-01-01 00:00:00", 1, 50) * 2 + (50,),
+    ),
+    "exportar_pagamentos_do_usuario": (EXPORTAR_PAGAMENTOS_DO_USUARIO, (1, 1)),
+    "pagamento_do_usuario": (PAGAMENTO_DO_USUARIO, (1, -1, 1) * 2),
+    "finalizar_sessao": (FINALIZAR_SESSAO, ("2024-01-01 00:00:00", 0, 1)),
+    "sessoes_ativas_dos_usuarios": (sessoes_ativas_dos_usuarios(2), (1, 2)),
+    "finalizar_sessoes": (finalizar_sessoes(2), (1, "2024-01-01 00:00:00", 2, "2024-01-01 00:00:00", 1, 0, 2, 0, 1, 2)),
+    "sessoes_por_entrada": (sessoes_por_entrada(2), (1, "2024-01-01 00:00:00", 2, "2024-01-01 00:00:00")),
+    "contar_sessoes_ativas": (CONTAR_SESSOES_ATIVAS, ()),
+    "pagamentos_para_relatorio": (PAGAMENTOS_PARA_RELATORIO, ("2024-01-01", "2024-01-01", "2024-01-02") * 2),
+    "sessoes_para_relatorio": (SESSOES_PARA_RELATORIO, ("2024-01-01", "2024-01-01", "2024-01-01", "2024-01-02") * 2),
+    "sessoes_abandonadas": (SESSOES_ABANDONADAS, ("2024-01-01 00:00:00", 500)),
+    "sessoes_para_arquivar": (SESSOES_PARA_ARQUIVAR, ("2024-01-01 00:00:00", 500)),
+    "pagamentos_para_arquivar": (PAGAMENTOS_PARA_ARQUIVAR, ("2024-01-01 00:00:00", 500)),
+}
@@ -0,0 +1,314 @@
+# db.py - POOL DE CONEXÕES ASSÍNCRONAS COM O BANCO (TiDB)
+
+import asyncio
+import os
+import ssl
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import aiomysql
+
+import metricas
+
+# Caminho padrão do certificado da TiDB no Render.
+SSL_CA_PADRAO = "/etc/secrets/tidb_ca.pem"
+
+
+# Contador de comandos enviados ao banco na requisição atual (ver MiddlewareIdasAoBanco).
+_idas_ao_banco: ContextVar[Optional[list]] = ContextVar("idas_ao_banco", default=None)
+
+
+class _ContagemIdas:
+    async def execute(self, query, args=None):
+        contador = _idas_ao_banco.get()
+        if contador is not None:
+            contador[0] += 1
+        if not metricas.medir_consultas:
+            return await super().execute(query, args)
+        inicio = time.perf_counter()
+        linhas = None
+        try:
+            resultado = await super().execute(query, args)
+            # Cursores de fluxo não sabem quantas linhas virão.
+            linhas = None if isinstance(self, aiomysql.SSCursor) else self.rowcount
+            return resultado
+        finally:
+            metricas.registrar_consulta(query, time.perf_counter() - inicio, linhas)
+
+
+class CursorContado(_ContagemIdas, aiomysql.DictCursor):
+    """DictCursor que contabiliza cada comando SQL enviado ao servidor."""
+
+
+class CursorStreamContado(_ContagemIdas, aiomysql.SSDictCursor):
+    """
+    Cursor do lado do servidor: as linhas chegam à medida que são lidas, sem
+    carregar o resultado inteiro na memória. Enquanto não for esgotado, a
+    conexão não aceita outros comandos.
+    """
+
+
+class CursorStreamTuplasContado(_ContagemIdas, aiomysql.SSCursor):
+    """Como CursorStreamContado, mas com linhas em tuplas (viram arrays numpy direto)."""
+
+
+class MiddlewareIdasAoBanco:
+    """
+    Middleware ASGI que devolve no header X-DB-Round-Trips quantos comandos
+    SQL a requisição executou (COMMIT/ROLLBACK não entram na conta).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        contador = [0]
+        _idas_ao_banco.set(contador)
+
+        async def send_com_contagem(mensagem):
+            if mensagem["type"] == "http.response.start":
+                mensagem.setdefault("headers", []).append((b"x-db-round-trips", str(contador[0]).encode()))
+            await send(mensagem)
+
+        await self.app(scope, receive, send_com_contagem)
+
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo limite de aquisição."""
+
+
+class ConfiguracaoBancoAusenteError(Exception):
+    """Alguma variável de ambiente do banco não foi definida."""
+
+
+def parametros_do_ambiente() -> dict:
+    """Lê as credenciais do banco uma única vez, na inicialização."""
+    host = os.environ.get("DB_HOST")
+    user = os.environ.get("DB_USER")
+    password = os.environ.get("DB_PASSWORD")
+    database = os.environ.get("DB_NAME")
+    port = os.environ.get("DB_PORT")
+
+    if not all([host, user, password, database, port]):
+        raise ConfiguracaoBancoAusenteError("Variáveis de ambiente do banco de dados não configuradas.")
+
+    parametros = {
+        "host": host,
+        "user": user,
+        "password": password,
+        "db": database,
+        "port": int(port),
+    }
+    # DB_SSL_CA vazio desliga o TLS (útil para um MySQL local).
+    ssl_ca = os.environ.get("DB_SSL_CA", SSL_CA_PADRAO)
+    if ssl_ca:
+        contexto = ssl.create_default_context(cafile=ssl_ca)
+        # Mesmo comportamento do ssl_verify_cert do mysql.connector:
+        # valida a cadeia do certificado, não o nome do host.
+        contexto.check_hostname = False
+        contexto.verify_mode = ssl.CERT_REQUIRED
+        parametros["ssl"] = contexto
+    return parametros
+
+
+class PoolConexoes:
+    """
+    Pool de conexões assíncronas reutilizáveis com o banco.
+
+    As conexões são abertas sob demanda até `tamanho` e devolvidas ao
+    pool ao final de cada requisição, evitando um handshake TLS novo por
+    chamada. Na retirada, conexões ociosas há mais de `ping_apos`
+    segundos são testadas com um ping e reabertas se estiverem mortas;
+    conexões mais velhas que `reciclar_apos` segundos são sempre
+    reabertas.
+    """
+
+    def __init__(
+        self,
+        parametros: dict,
+        tamanho: int = 10,
+        timeout_aquisicao: float = 5.0,
+        ping_apos: float = 30.0,
+        reciclar_apos: float = 1800.0,
+    ):
+        self._parametros = parametros
+        self.tamanho = tamanho
+        self.timeout_aquisicao = timeout_aquisicao
+        self.ping_apos = ping_apos
+        self.reciclar_apos = reciclar_apos
+
+        self._vagas = asyncio.Semaphore(tamanho)
+        self._ociosas = deque()  # (conexão, devolvida_em)
+        self._criada_em = {}  # id(conexão) -> instante de abertura
+        self._em_uso = 0
+        self._fechado = False
+
+        # Estatísticas
+        self._aquisicoes = 0
+        self._timeouts = 0
+        self._reconexoes = 0
+        self._espera_total = 0.0
+        self._espera_max = 0.0
+
+    @classmethod
+    def do_ambiente(cls) -> "PoolConexoes":
+        return cls(
+            parametros_do_ambiente(),
+            tamanho=int(os.environ.get("DB_POOL_SIZE", "10")),
+            timeout_aquisicao=float(os.environ.get("DB_POOL_TIMEOUT", "5")),
+            ping_apos=float(os.environ.get("DB_POOL_PING_APOS", "30")),
+            reciclar_apos=float(os.environ.get("DB_POOL_RECICLAR_APOS", "1800")),
+        )
+
+    # --- Abertura e fechamento de conexões físicas ---
+
+    async def _conectar(self):
+        conexao = await aiomysql.connect(
+            autocommit=False,
+            cursorclass=CursorContado,
+            **self._parametros,
+        )
+        self._criada_em[id(conexao)] = time.monotonic()
+        return conexao
+
+    def _fechar_conexao(self, conexao):
+        self._criada_em.pop(id(conexao), None)
+        conexao.close()
+
+    async def preencher(self, quantidade: int):
+        """Abre `quantidade` conexões antecipadamente (aquecimento)."""
+        faltam = min(quantidade, self.tamanho) - len(self._ociosas) - self._em_uso
+        for _ in range(max(faltam, 0)):
+            if self._fechado:
+                return
+            self._ociosas.append((await self._conectar(), time.monotonic()))
+
+    # --- Retirada e devolução ---
+
+    async def adquirir(self):
+        if self._fechado:
+            raise PoolEsgotadoError("O pool de conexões foi encerrado.")
+
+        inicio = time.monotonic()
+        try:
+            await asyncio.wait_for(self._vagas.acquire(), self.timeout_aquisicao)
+        except asyncio.TimeoutError:
+            self._timeouts += 1
+            raise PoolEsgotadoError("Tempo esgotado aguardando uma conexão livre.")
+
+        espera = time.monotonic() - inicio
+        self._aquisicoes += 1
+        self._espera_total += espera
+        self._espera_max = max(self._espera_max, espera)
+        self._em_uso += 1
+
+        try:
+            if self._ociosas:
+                # LIFO: reaproveita a conexão usada mais recentemente
+                conexao = await self._validar(*self._ociosas.pop())
+            else:
+                conexao = await self._conectar()
+        except BaseException:
+            # Qualquer falha, inclusive cancelamento (cliente desconectou,
+            # wait_for) ou OSError/TimeoutError ao conectar: a vaga volta.
+            self._em_uso -= 1
+            self._vagas.release()
+            raise
+        metricas.registrar_etapa("conexao_db", time.monotonic() - inicio)
+        return conexao
+
+    async def _validar(self, conexao, devolvida_em: float):
+        agora = time.monotonic()
+        if agora - self._criada_em.get(id(conexao), agora) > self.reciclar_apos:
+            self._fechar_conexao(conexao)
+            return await self._conectar()
+        if agora - devolvida_em > self.ping_apos:
+            try:
+                await conexao.ping(reconnect=False)
+            except aiomysql.MySQLError:
+                # Conexão derrubada pelo servidor enquanto estava ociosa
+                self._fechar_conexao(conexao)
+                self._reconexoes += 1
+                return await self._conectar()
+            except BaseException:
+                # Ping interrompido: o estado da conexão é desconhecido.
+                self._fechar_conexao(conexao)
+                raise
+        return conexao
+
+    async def devolver(self, conexao):
+        if conexao.closed:
+            self.descartar(conexao)
+            return
+        try:
+            if conexao.get_transaction_status():
+                await conexao.rollback()
+        except (aiomysql.MySQLError, OSError, asyncio.TimeoutError):
+            self.descartar(conexao)
+            return
+        except BaseException:
+            # Rollback cancelado no meio: descarta e deixa o cancelamento seguir.
+            self.descartar(conexao)
+            raise
+
+        if self._fechado:
+            self.descartar(conexao)
+            return
+        self._ociosas.append((conexao, time.monotonic()))
+        self._em_uso -= 1
+        self._vagas.release()
+
+    def descartar(self, conexao):
+        """Fecha uma conexão em uso sem devolvê-la ao pool."""
+        self._fechar_conexao(conexao)
+        self._em_uso -= 1
+        self._vagas.release()
+
+    @asynccontextmanager
+    async def conexao(self):
+        conexao = await self.adquirir()
+        try:
+            yield conexao
+        finally:
+            await self.devolver(conexao)
+
+    async def fechar(self):
+        self._fechado = True
+        while self._ociosas:
+            conexao, _ = self._ociosas.pop()
+            self._criada_em.pop(id(conexao), None)
+            try:
+                await conexao.ensure_closed()
+            except (aiomysql.MySQLError, OSError):
+                conexao.close()
+
+    # --- Estatísticas ---
+
+    def estatisticas(self) -> dict:
+        ociosas = len(self._ociosas)
+        return {
+            "tamanho": self.tamanho,
+            "abertas": self._em_uso + ociosas,
+            "em_uso": self._em_uso,
+            "ociosas": ociosas,
+            "aquisicoes": self._aquisicoes,
+            "timeouts": self._timeouts,
+            "reconexoes": self._reconexoes,
+            "espera_media_ms": round(1000 * self._espera_total / self._aquisicoes, 3) if self._aquisicoes else 0.0,
+            "espera_max_ms": round(1000 * self._espera_max, 3),
+        }
+
+
+def criar_pool_do_ambiente() -> Optional[PoolConexoes]:
+    """Cria o pool a partir das variáveis de ambiente, ou None se faltarem."""
+    try:
+        return PoolConexoes.do_ambiente()
+    except ConfiguracaoBancoAusenteError:
+        return None
@@ -0,0 +1,90 @@
+# gunicorn_conf.py - SERVIDOR DE PRODUÇÃO (GUNICORN + WORKERS UVICORN)
+#
+#   gunicorn -c gunicorn_conf.py
+#
+# O gunicorn gerencia os processos (reinicia worker que morre, troca os
+# workers sem derrubar conexões com SIGHUP) e cada worker roda o event loop
+# do uvicorn. Cada worker tem o próprio pool de conexões (DB_POOL_SIZE) e
+# caches em memória: o banco recebe até workers × DB_POOL_SIZE conexões.
+#
+# Com um worker só (o padrão), nada muda em relação ao uvicorn direto. Mais
+# de um worker exige o estado compartilhado em Redis (COMPARTILHADOS): sem
+# ele, uma sessão lida noutro worker fica defasada e uma Idempotency-Key
+# repetida executaria duas vezes. A configuração recusa subir assim.
+#
+# Um worker só aceita conexões depois do lifespan de main.py (pool aquecido,
+# ocupação carregada); /saude/pronto responde 200 a partir daí.
+
+import os
+
+# Workers do uvicorn: o pacote uvicorn-worker, quando instalado, substitui
+# o uvicorn.workers (obsoleto nas versões novas do uvicorn).
+try:
+    import uvicorn_worker  # noqa: F401
+
+    worker_class = "uvicorn_worker.UvicornWorker"
+except ImportError:
+    worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def _cpus() -> int:
+    """CPUs disponíveis para o processo (respeita o cpuset do contêiner)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+wsgi_app = "main:app"
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+# Cache de sessões ativas e respostas de idempotência.
+COMPARTILHADOS = ("CACHE_SESSOES_REDIS_URL", "IDEMPOTENCIA_REDIS_URL")
+_compartilhado = all(os.environ.get(variavel) for variavel in COMPARTILHADOS)
+
+# Workers assíncronos: um por CPU já ocupa a máquina (o bcrypt roda em
+# processos próprios, ver senhas.py), desde que o estado seja compartilhado.
+# WEB_CONCURRENCY fixa outro número.
+workers = int(os.environ.get("WEB_CONCURRENCY", str(_cpus() if _compartilhado else 1)))
+if workers > 1:
+    faltando = [variavel for variavel in COMPARTILHADOS if not os.environ.get(variavel)]
+    if faltando:
+        raise RuntimeError(
+            f"{workers} workers com cache e idempotência em memória por processo: defina "
+            f"{', '.join(faltando)} ou use WEB_CONCURRENCY=1."
+        )
+    # O cache de cartões não tem versão em Redis: só é invalidado no worker
+    # que fez a alteração. CARTOES_CACHE_CAPACIDADE explícito aceita a
+    # defasagem de até CARTOES_CACHE_TTL nos demais.
+    os.environ.setdefault("CARTOES_CACHE_CAPACIDADE", "0")
+
+
+def on_starting(server):
+    """--workers na linha de comando escaparia das verificações acima."""
+    if server.cfg.workers != workers:
+        raise RuntimeError(
+            f"--workers {server.cfg.workers} difere do configurado ({workers}); defina WEB_CONCURRENCY em vez de --workers."
+        )
+
+# Sem SENHAS_PROCESSOS, cada worker abriria metade das CPUs em processos de
+# bcrypt; divididos entre os workers, o total fica em metade das CPUs.
+os.environ.setdefault("SENHAS_PROCESSOS", str(max(1, _cpus() // 2 // workers)))
+
+# O app é importado uma vez no processo mestre e os workers nascem por
+# fork com o que main.py importa no carregamento (FastAPI, Pydantic,
+# aiomysql). O numpy e o python-jose só são importados no primeiro uso,
+# dentro de cada worker, e não são divididos: cada worker paga esse custo
+# (bench_inicializacao.py --modos imports_tardios mede). Nada abre conexão
+# ou thread no import (tudo fica no lifespan, que roda em cada worker).
+preload_app = True
+
+# Worker sem sinal de vida por mais que isso é reiniciado (vale também para
+# o lifespan, que espera o banco até DB_POOL_TIMEOUT no aquecimento).
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Maior que o tempo ocioso do balanceador, para que ele não reutilize uma
+# conexão que o worker acabou de fechar.
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "75"))
+
+accesslog = os.environ.get("GUNICORN_ACCESSLOG") or None
+loglevel = os.environ.get("GUNICORN_LOGLEVEL", "info")
@@ -0,0 +1,116 @@
+# historico.py - PAGINAÇÃO E EXPORTAÇÃO DO HISTÓRICO DE PAGAMENTOS
+
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable, List, Optional, Tuple
+
+# Tamanho de página de /pagamentos/me/ quando o cliente não informa `limite`, e o máximo aceito.
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 200
+
+# Linhas lidas do cursor do servidor por vez durante a exportação.
+LOTE_EXPORTACAO = 500
+
+# Mesma ordem das colunas de consultas.COLUNAS_PAGAMENTO.
+COLUNAS = ["id", "usuario_id", "horario_entrada", "horario_saida", "valor_pago", "numero_cartao"]
+
+
+class CursorInvalidoError(ValueError):
+    """O cursor de paginação recebido não foi gerado por esta API."""
+
+
+def horario_local(horario: datetime) -> datetime:
+    """
+    Horário local do servidor, sem fuso, como o banco grava. Um horário com
+    fuso não pode ser comparado nem ordenado junto com os que vêm do banco.
+    """
+    if horario.tzinfo is None:
+        return horario
+    return horario.astimezone().replace(tzinfo=None)
+
+
+def id_publico(pagamento_id: int) -> int:
+    """
+    Id mostrado ao cliente. Os ids gerados pelo journal são negativos no
+    banco (fora da faixa do AUTO_INCREMENT); o cliente recebe o valor
+    absoluto, que começa em 2^22 vezes os milissegundos desde a época do
+    journal e nunca encontra um id do AUTO_INCREMENT.
+    """
+    return abs(pagamento_id)
+
+
+def ids_internos(pagamento_id: int) -> Tuple[int, int]:
+    """Ids do banco que podem corresponder a um id recebido do cliente."""
+    return abs(pagamento_id), -abs(pagamento_id)
+
+
+def com_ids_publicos(linhas: Iterable[dict]) -> List[dict]:
+    return [{**linha, "id": id_publico(linha["id"])} if linha["id"] < 0 else linha for linha in linhas]
+
+
+def codificar_cursor(horario_saida: datetime, pagamento_id: int) -> str:
+    """Cursor opaco apontando para depois do último item da página."""
+    bruto = f"{horario_saida.isoformat()}|{pagamento_id}".encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        horario_saida, pagamento_id = bruto.split("|")
+        return horario_local(datetime.fromisoformat(horario_saida)), int(pagamento_id)
+    except ValueError:
+        raise CursorInvalidoError("Cursor de paginação inválido.")
+
+
+def mesclar_pendentes(linhas: List[dict], pendentes: List[dict], apos: Optional[Tuple[datetime, int]], quantidade: int) -> List[dict]:
+    """
+    Junta à página vinda do banco os pagamentos ainda no journal (ver
+    journal.py), na mesma ordem e a partir do mesmo cursor. Um pagamento
+    gravado no banco durante a consulta aparece nos dois e só entra uma vez.
+    """
+    ids = {linha["id"] for linha in linhas}
+    extras = [
+        pagamento for pagamento in pendentes
+        if pagamento["id"] not in ids and (apos is None or (pagamento["horario_saida"], pagamento["id"]) < apos)
+    ]
+    if not extras:
+        return linhas
+    juntos = sorted(linhas + extras, key=lambda p: (p["horario_saida"], p["id"]), reverse=True)
+    return juntos[:quantidade]
+
+
+def _valor_json(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        # Como string, para não perder centavos em leitores que usam float.
+        return str(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def ndjson(linhas: Iterable[dict]) -> str:
+    """Um objeto JSON por linha."""
+    return "".join(json.dumps(linha, default=_valor_json, ensure_ascii=False) + "\n" for linha in linhas)
+
+
+def _csv(linhas: Iterable[list]) -> str:
+    saida = io.StringIO()
+    csv.writer(saida, lineterminator="\n").writerows(linhas)
+    return saida.getvalue()
+
+
+def _valor_csv(valor):
+    return valor.isoformat(sep=" ") if isinstance(valor, datetime) else valor
+
+
+def cabecalho_csv() -> str:
+    return _csv([COLUNAS])
+
+
+def csv_pagamentos(linhas: Iterable[dict]) -> str:
+    return _csv([_valor_csv(linha[coluna]) for coluna in COLUNAS] for linha in linhas)
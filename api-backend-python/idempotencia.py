@@ -0,0 +1,198 @@
+# idempotencia.py - RESPOSTAS RECENTES POR CHAVE DE IDEMPOTÊNCIA
+#
+# Quando a rede do celular falha depois que o servidor já processou o
+# check-in/checkout, o app repete a requisição com o mesmo header
+# Idempotency-Key e recebe a resposta original, sem nova ida ao banco.
+#
+# Em memória por padrão; com IDEMPOTENCIA_REDIS_URL, num Redis compartilhado
+# entre os workers (necessário com mais de um worker, ver gunicorn_conf.py).
+
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, NamedTuple, Optional, Tuple
+
+
+class RespostaGuardada(NamedTuple):
+    status_code: int
+    corpo: dict
+    headers: Optional[dict] = None
+
+
+class ArmazemIdempotencia:
+    """
+    Guarda até `capacidade` respostas (LRU) por `ttl` segundos. Uma repetição
+    que chega enquanto a original ainda está em andamento espera por ela em
+    vez de executar de novo. Respostas de erro transitório (5xx e 429) não
+    são guardadas, para que a repetição tente outra vez.
+
+    O armazém é por processo: com vários workers, uma repetição atendida por
+    outro worker executaria de novo. Nesse caso, use ArmazemIdempotenciaRedis.
+    """
+
+    def __init__(self, capacidade: int = 10000, ttl: float = 86400.0):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._concluidas: "OrderedDict[tuple, Tuple[float, RespostaGuardada]]" = OrderedDict()
+        self._em_andamento: dict = {}
+
+        self.execucoes = 0
+        self.repeticoes = 0
+
+    @classmethod
+    def do_ambiente(cls) -> "ArmazemIdempotencia":
+        return cls(
+            capacidade=int(os.environ.get("IDEMPOTENCIA_CAPACIDADE", "10000")),
+            ttl=float(os.environ.get("IDEMPOTENCIA_TTL", "86400")),
+        )
+
+    @staticmethod
+    def _guardavel(resposta: RespostaGuardada) -> bool:
+        return resposta.status_code < 500 and resposta.status_code != 429
+
+    async def executar(
+        self, chave: tuple, operacao: Callable[[], Awaitable[RespostaGuardada]]
+    ) -> Tuple[RespostaGuardada, bool]:
+        """(resposta, é repetição?)"""
+        guardada = self._concluidas.get(chave)
+        if guardada is not None:
+            expira_em, resposta = guardada
+            if expira_em > time.monotonic():
+                self._concluidas.move_to_end(chave)
+                self.repeticoes += 1
+                return resposta, True
+            del self._concluidas[chave]
+
+        futuro = self._em_andamento.get(chave)
+        while futuro is not None:
+            try:
+                resposta = await asyncio.shield(futuro)
+            except asyncio.CancelledError:
+                if not futuro.cancelled():
+                    raise
+                # A requisição original foi cancelada: esta assume a execução.
+                futuro = self._em_andamento.get(chave)
+                continue
+            self.repeticoes += 1
+            return resposta, True
+
+        futuro = asyncio.get_running_loop().create_future()
+        # Evita o aviso de exceção nunca lida quando ninguém estava esperando.
+        futuro.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._em_andamento[chave] = futuro
+        self.execucoes += 1
+        try:
+            resposta = await operacao()
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except BaseException as exc:
+            futuro.set_exception(exc)
+            raise
+        finally:
+            del self._em_andamento[chave]
+
+        if self._guardavel(resposta):
+            self._concluidas[chave] = (time.monotonic() + self.ttl, resposta)
+            while len(self._concluidas) > self.capacidade:
+                self._concluidas.popitem(last=False)
+        futuro.set_result(resposta)
+        return resposta, False
+
+    async def fechar(self):
+        """Nada a liberar: tudo fica na memória do processo."""
+
+    def estatisticas(self) -> dict:
+        return {
+            "capacidade": self.capacidade,
+            "guardadas": len(self._concluidas),
+            "em_andamento": len(self._em_andamento),
+            "execucoes": self.execucoes,
+            "repeticoes": self.repeticoes,
+        }
+
+
+class ArmazemIdempotenciaRedis:
+    """
+    O mesmo contrato de ArmazemIdempotencia, num Redis compartilhado entre
+    os workers. A execução é reservada com SET NX (valor vazio, que expira
+    em `reserva` segundos se o worker morrer no meio); uma repetição em
+    qualquer worker consulta a chave a cada `intervalo` segundos até a
+    resposta aparecer. Se a reserva sumir sem resposta (erro transitório ou
+    requisição cancelada), quem estiver esperando assume a execução.
+
+    Recebe qualquer cliente com a interface assíncrona do redis-py (`get`,
+    `set(..., nx=, ex=)`, `delete`), como o cache de sessões.
+    """
+
+    def __init__(self, cliente, ttl: float = 86400.0, reserva: float = 60.0, intervalo: float = 0.05,
+                 prefixo: str = "idempotencia:"):
+        self._cliente = cliente
+        self.ttl = ttl
+        self.reserva = reserva
+        self.intervalo = intervalo
+        self._prefixo = prefixo
+
+        self.execucoes = 0
+        self.repeticoes = 0
+
+    def _nome(self, chave: tuple) -> str:
+        return self._prefixo + json.dumps(list(chave), separators=(",", ":"))
+
+    async def executar(
+        self, chave: tuple, operacao: Callable[[], Awaitable[RespostaGuardada]]
+    ) -> Tuple[RespostaGuardada, bool]:
+        """(resposta, é repetição?)"""
+        nome = self._nome(chave)
+        while True:
+            bruto = await self._cliente.get(nome)
+            if bruto:
+                self.repeticoes += 1
+                return RespostaGuardada(*json.loads(bruto)), True
+            if bruto is None and await self._cliente.set(nome, b"", nx=True, ex=math.ceil(self.reserva)):
+                break
+            # Em andamento em algum worker.
+            await asyncio.sleep(self.intervalo)
+
+        self.execucoes += 1
+        try:
+            resposta = await operacao()
+        except BaseException:
+            await self._cliente.delete(nome)
+            raise
+        if ArmazemIdempotencia._guardavel(resposta):
+            await self._cliente.set(nome, json.dumps(list(resposta)), ex=math.ceil(self.ttl))
+        else:
+            await self._cliente.delete(nome)
+        return resposta, False
+
+    async def fechar(self):
+        await self._cliente.aclose()
+
+    def estatisticas(self) -> dict:
+        return {
+            "backend": "redis",
+            "execucoes": self.execucoes,
+            "repeticoes": self.repeticoes,
+        }
+
+
+def criar_armazem_do_ambiente():
+    """
+    Em memória por padrão (IDEMPOTENCIA_CAPACIDADE, IDEMPOTENCIA_TTL). Com
+    IDEMPOTENCIA_REDIS_URL definido, usa um Redis compartilhado.
+    """
+    url_redis = os.environ.get("IDEMPOTENCIA_REDIS_URL")
+    if not url_redis:
+        return ArmazemIdempotencia.do_ambiente()
+    try:
+        import redis.asyncio as redis
+    except ImportError:
+        raise RuntimeError("IDEMPOTENCIA_REDIS_URL definido, mas o pacote 'redis' não está instalado.")
+    return ArmazemIdempotenciaRedis(
+        redis.from_url(url_redis),
+        ttl=float(os.environ.get("IDEMPOTENCIA_TTL", "86400")),
+    )
@@ -0,0 +1,367 @@
+# journal.py - JOURNAL LOCAL DE PAGAMENTOS (WRITE-BEHIND)
+#
+# Com PAGAMENTOS_JOURNAL_DIR definido, POST /pagamentos/ grava o pagamento
+# num arquivo local (com fsync) e responde na hora; uma tarefa em segundo
+# plano insere os pagamentos no banco em lotes e apaga os segmentos já
+# gravados. Na inicialização, segmentos que sobraram de uma queda são
+# reaplicados: os ids são gerados aqui, e um id que já está no banco é
+# reconhecido como reaplicação (ver gravar_pagamentos em main.py).
+#
+# Os ids gerados aqui são negativos: ficam fora da faixa do AUTO_INCREMENT
+# de pagamentos.id, cujo contador só avança com ids explícitos maiores que
+# ele. Assim o id devolvido ao cliente não muda quando o pagamento chega ao
+# banco, e instâncias com e sem journal podem usar o mesmo banco.
+#
+# Um pagamento que o banco recusa (erro de dados, não de conexão) vai para
+# rejeitados.log, um objeto JSON por linha, para não travar a descarga dos
+# demais.
+#
+# Formato de um segmento (segmento-NNNNNNNN.log): registros seguidos de
+#   [tamanho: uint32 big-endian][crc32 do conteúdo: uint32 big-endian][conteúdo JSON UTF-8]
+# Um registro incompleto ou com CRC inválido (escrita interrompida pela
+# queda) encerra a leitura do segmento.
+#
+# Cada worker trava (flock) um diretório slot-NN próprio, cujo número entra
+# nos ids gerados. Slots sem dono, de workers que deixaram de existir, são
+# adotados na inicialização. Requer um sistema POSIX.
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("estacionamento.journal")
+
+_CABECALHO = struct.Struct(">II")
+SLOTS = 32
+
+
+class GeradorIds:
+    """
+    Ids negativos de 63 bits, decrescentes no tempo: o valor absoluto tem os
+    milissegundos desde 2024-01-01 (41 bits), nó (5), slot do worker (5) e
+    sequência dentro do milissegundo (12).
+    """
+
+    EPOCA_MS = 1704067200000
+
+    def __init__(self, no: int, slot: int):
+        if not (0 <= no < 32 and 0 <= slot < 32):
+            raise ValueError("Nó e slot precisam estar entre 0 e 31.")
+        self._prefixo = (no << 17) | (slot << 12)
+        self._ultimo_ms = 0
+        self._sequencia = 0
+        self._trava = threading.Lock()
+
+    def proximo(self) -> int:
+        with self._trava:
+            agora = max(int(time.time() * 1000) - self.EPOCA_MS, self._ultimo_ms)
+            if agora == self._ultimo_ms:
+                self._sequencia = (self._sequencia + 1) & 0xFFF
+                if self._sequencia == 0:
+                    # 4096 ids no mesmo milissegundo: avança para o próximo.
+                    agora += 1
+            else:
+                self._sequencia = 0
+            self._ultimo_ms = agora
+            return -((agora << 22) | self._prefixo | self._sequencia)
+
+
+def _para_json(registro: dict) -> dict:
+    return {
+        **registro,
+        "horario_entrada": registro["horario_entrada"].isoformat(),
+        "horario_saida": registro["horario_saida"].isoformat(),
+        "valor_pago": str(registro["valor_pago"]),
+    }
+
+
+def codificar(registro: dict) -> bytes:
+    conteudo = json.dumps(_para_json(registro)).encode()
+    return _CABECALHO.pack(len(conteudo), zlib.crc32(conteudo)) + conteudo
+
+
+def ler_segmento(caminho: str) -> List[dict]:
+    with open(caminho, "rb") as f:
+        dados = f.read()
+    registros = []
+    posicao = 0
+    while posicao + _CABECALHO.size <= len(dados):
+        tamanho, crc = _CABECALHO.unpack_from(dados, posicao)
+        conteudo = dados[posicao + _CABECALHO.size:posicao + _CABECALHO.size + tamanho]
+        if len(conteudo) < tamanho or zlib.crc32(conteudo) != crc:
+            break
+        registro = json.loads(conteudo)
+        registro["horario_entrada"] = datetime.fromisoformat(registro["horario_entrada"])
+        registro["horario_saida"] = datetime.fromisoformat(registro["horario_saida"])
+        registro["valor_pago"] = Decimal(registro["valor_pago"])
+        registros.append(registro)
+        posicao += _CABECALHO.size + tamanho
+    if posicao < len(dados):
+        logger.warning("Segmento %s: %d bytes finais inválidos descartados.", caminho, len(dados) - posicao)
+    return registros
+
+
+def _fsync_diretorio(diretorio: str):
+    fd = os.open(diretorio, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class JournalPagamentos:
+    """
+    Journal de pagamentos ainda não gravados no banco. `registrar` só
+    retorna depois do fsync; chamadas simultâneas compartilham a mesma
+    escrita e o mesmo fsync.
+    """
+
+    def __init__(self, diretorio: str, no: int = 0, intervalo: float = 0.5,
+                 segmento_max: int = 4 * 1024 * 1024, lote: int = 500):
+        self.diretorio = diretorio
+        self.no = no
+        self.intervalo = intervalo
+        self.segmento_max = segmento_max
+        self.lote = lote
+
+        self.slot: Optional[int] = None
+        self._ids: Optional[GeradorIds] = None
+        self._trava_slot = None  # arquivo com flock
+        self._segmentos: Dict[int, List[dict]] = {}  # número -> registros
+        self._atual = 0
+        self._fd: Optional[int] = None
+        self._tamanho_atual = 0
+        self._pendentes: Dict[int, Dict[int, dict]] = {}  # usuario_id -> {id: registro}
+
+        self._fila: list = []
+        self._escrita: Optional[asyncio.Task] = None
+        self._trava_escrita = asyncio.Lock()
+        self._trava_descarga = asyncio.Lock()
+        self._tarefa: Optional[asyncio.Task] = None
+
+        self.registrados = 0
+        self.gravados = 0
+        self.rejeitados = 0
+        self.falhas_descarga = 0
+        self.fsyncs = 0
+        self._tempo_fsync = 0.0
+
+    @classmethod
+    def do_ambiente(cls) -> Optional["JournalPagamentos"]:
+        diretorio = os.environ.get("PAGAMENTOS_JOURNAL_DIR")
+        if not diretorio:
+            return None
+        return cls(
+            diretorio,
+            no=int(os.environ.get("PAGAMENTOS_JOURNAL_NO", "0")),
+            intervalo=float(os.environ.get("PAGAMENTOS_JOURNAL_INTERVALO", "0.5")),
+        )
+
+    # --- Slots e segmentos ---
+
+    def _caminho(self, numero: int, diretorio: Optional[str] = None) -> str:
+        return os.path.join(diretorio or self._diretorio_slot, f"segmento-{numero:08d}.log")
+
+    @staticmethod
+    def _numeros(diretorio: str) -> List[int]:
+        return sorted(int(os.path.basename(c)[9:17]) for c in glob.glob(os.path.join(diretorio, "segmento-*.log")))
+
+    @staticmethod
+    def _travar(diretorio: str):
+        import fcntl
+
+        os.makedirs(diretorio, exist_ok=True)
+        arquivo = open(os.path.join(diretorio, ".lock"), "a")
+        try:
+            fcntl.flock(arquivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            arquivo.close()
+            return None
+        return arquivo
+
+    def abrir(self):
+        """Trava um slot, adota slots órfãos e carrega o que não foi gravado no banco."""
+        for slot in range(SLOTS):
+            trava = self._travar(os.path.join(self.diretorio, f"slot-{slot:02d}"))
+            if trava is not None:
+                self.slot, self._trava_slot = slot, trava
+                break
+        else:
+            raise RuntimeError(f"Todos os {SLOTS} slots do journal em {self.diretorio} estão em uso.")
+        self._diretorio_slot = os.path.join(self.diretorio, f"slot-{self.slot:02d}")
+        self._ids = GeradorIds(self.no, self.slot)
+
+        proximo = max(self._numeros(self._diretorio_slot), default=0) + 1
+        for outro in sorted(glob.glob(os.path.join(self.diretorio, "slot-*"))):
+            if outro == self._diretorio_slot:
+                continue
+            trava = self._travar(outro)
+            if trava is None:
+                continue  # em uso por outro worker
+            try:
+                for numero in self._numeros(outro):
+                    os.rename(self._caminho(numero, outro), self._caminho(proximo))
+                    proximo += 1
+                _fsync_diretorio(self._diretorio_slot)
+            finally:
+                trava.close()
+
+        for numero in self._numeros(self._diretorio_slot):
+            registros = ler_segmento(self._caminho(numero))
+            self._segmentos[numero] = registros
+            for registro in registros:
+                self._pendentes.setdefault(registro["usuario_id"], {})[registro["id"]] = registro
+        if self._segmentos:
+            logger.warning("Journal: %d pagamentos de uma execução anterior serão reaplicados.",
+                           sum(len(r) for r in self._segmentos.values()))
+        self._novo_segmento(max(self._segmentos, default=0) + 1)
+
+    def _novo_segmento(self, numero: int):
+        if self._fd is not None:
+            os.close(self._fd)
+        self._atual = numero
+        self._segmentos[numero] = []
+        self._fd = os.open(self._caminho(numero), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        self._tamanho_atual = 0
+        _fsync_diretorio(self._diretorio_slot)
+
+    # --- Escrita (group commit) ---
+
+    def _escrever(self, dados: bytes):
+        inicio = time.monotonic()
+        try:
+            os.write(self._fd, dados)
+            os.fsync(self._fd)
+        except OSError:
+            # Não deixa um registro pela metade no meio do segmento.
+            os.ftruncate(self._fd, self._tamanho_atual)
+            raise
+        self._tamanho_atual += len(dados)
+        self.fsyncs += 1
+        self._tempo_fsync += time.monotonic() - inicio
+
+    async def registrar(self, dados: dict) -> dict:
+        """Grava o pagamento no journal com um id novo e devolve o registro."""
+        registro = {"id": self._ids.proximo(), **dados}
+        futuro = asyncio.get_running_loop().create_future()
+        self._fila.append((registro, futuro))
+        if self._escrita is None or self._escrita.done():
+            self._escrita = asyncio.create_task(self._esvaziar_fila())
+        await futuro
+        return registro
+
+    async def _esvaziar_fila(self):
+        async with self._trava_escrita:
+            while self._fila:
+                lote, self._fila = self._fila, []
+                try:
+                    await asyncio.to_thread(self._escrever, b"".join(codificar(r) for r, _ in lote))
+                except OSError as err:
+                    for _, futuro in lote:
+                        futuro.set_exception(err)
+                    continue
+                self._segmentos[self._atual].extend(r for r, _ in lote)
+                for registro, futuro in lote:
+                    self._pendentes.setdefault(registro["usuario_id"], {})[registro["id"]] = registro
+                    futuro.set_result(None)
+                self.registrados += len(lote)
+                if self._tamanho_atual >= self.segmento_max:
+                    self._novo_segmento(self._atual + 1)
+
+    # --- Descarga para o banco ---
+
+    async def descarregar(self, gravar_lote: Callable[[List[dict]], Awaitable[None]]):
+        """Grava no banco os segmentos fechados e os apaga do disco."""
+        async with self._trava_descarga:
+            async with self._trava_escrita:
+                if self._segmentos[self._atual]:
+                    self._novo_segmento(self._atual + 1)
+            for numero in sorted(self._segmentos):
+                if numero == self._atual:
+                    continue
+                registros = self._segmentos[numero]
+                for inicio in range(0, len(registros), self.lote):
+                    await gravar_lote(registros[inicio:inicio + self.lote])
+                os.remove(self._caminho(numero))
+                del self._segmentos[numero]
+                for registro in registros:
+                    do_usuario = self._pendentes.get(registro["usuario_id"], {})
+                    do_usuario.pop(registro["id"], None)
+                    if not do_usuario:
+                        self._pendentes.pop(registro["usuario_id"], None)
+                self.gravados += len(registros)
+
+    def rejeitar(self, registro: dict, motivo: str):
+        """
+        Guarda em rejeitados.log um pagamento que o banco recusou. Depois do
+        fsync, o segmento que o contém pode ser apagado normalmente.
+        """
+        linha = json.dumps({**_para_json(registro), "motivo": motivo}, ensure_ascii=False) + "\n"
+        with open(os.path.join(self.diretorio, "rejeitados.log"), "a", encoding="utf-8") as f:
+            f.write(linha)
+            f.flush()
+            os.fsync(f.fileno())
+        self.rejeitados += 1
+        logger.error("Journal: pagamento %s recusado pelo banco (guardado em rejeitados.log): %s", registro["id"], motivo)
+
+    def iniciar(self, gravar_lote: Callable[[List[dict]], Awaitable[None]]):
+        async def laco():
+            espera = self.intervalo
+            while True:
+                await asyncio.sleep(espera)
+                try:
+                    await self.descarregar(gravar_lote)
+                    espera = self.intervalo
+                except Exception as err:
+                    # Banco fora do ar: os pagamentos continuam seguros no disco.
+                    self.falhas_descarga += 1
+                    espera = min(espera * 2, 30.0)
+                    logger.warning("Journal: falha ao gravar pagamentos no banco (nova tentativa em %.1fs): %s", espera, err)
+
+        self._tarefa = asyncio.create_task(laco())
+
+    async def fechar(self, gravar_lote: Optional[Callable[[List[dict]], Awaitable[None]]] = None):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            self._tarefa = None
+        if gravar_lote is not None:
+            try:
+                await self.descarregar(gravar_lote)
+            except Exception as err:
+                logger.warning("Journal: pagamentos ficam no disco para a próxima inicialização: %s", err)
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._trava_slot is not None:
+            self._trava_slot.close()
+            self._trava_slot = None
+
+    # --- Leitura ---
+
+    def pendentes_do_usuario(self, usuario_id: int) -> List[dict]:
+        return list(self._pendentes.get(usuario_id, {}).values())
+
+    def pendente(self, pagamento_id: int, usuario_id: int) -> Optional[dict]:
+        return self._pendentes.get(usuario_id, {}).get(pagamento_id)
+
+    def estatisticas(self) -> dict:
+        return {
+            "slot": self.slot,
+            "pendentes": sum(len(r) for r in self._segmentos.values()),
+            "segmentos": len(self._segmentos),
+            "registrados": self.registrados,
+            "gravados": self.gravados,
+            "rejeitados": self.rejeitados,
+            "falhas_descarga": self.falhas_descarga,
+            "fsyncs": self.fsyncs,
+            "fsync_medio_ms": round(1000 * self._tempo_fsync / self.fsyncs, 3) if self.fsyncs else 0.0,
+        }
@@ -0,0 +1,191 @@
+# limitador.py - LIMITE DE REQUISIÇÕES POR USUÁRIO E LEITURAS COMPARTILHADAS
+#
+# LimitadorRequisicoes: balde de fichas por usuário. Cada requisição gasta
+# uma ficha; o balde enche `taxa` fichas por segundo até `rajada`. Sem ficha,
+# a rota responde 429 com Retry-After. O estado fica em memória (por worker)
+# ou, com LIMITADOR_REDIS_URL, num Redis compartilhado entre os workers.
+#
+# LeiturasCompartilhadas (single-flight): leituras iguais e simultâneas do
+# mesmo usuário esperam pela mesma consulta ao banco em vez de repeti-la.
+
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+
+class LimiteExcedidoError(Exception):
+    """O usuário esgotou as fichas; pode tentar de novo em `retry_after` segundos."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Muitas requisições. Tente novamente em instantes.")
+        self.retry_after = retry_after
+
+
+class BackendMemoria:
+    """Baldes locais ao processo, limitados em quantidade (LRU)."""
+
+    def __init__(self, capacidade: int = 100000):
+        self.capacidade = capacidade
+        self._baldes: "OrderedDict[Hashable, list]" = OrderedDict()  # chave -> [fichas, atualizado_em]
+
+    async def consumir(self, chave, taxa: float, rajada: float) -> float:
+        agora = time.monotonic()
+        balde = self._baldes.get(chave)
+        if balde is None:
+            balde = self._baldes[chave] = [rajada, agora]
+            while len(self._baldes) > self.capacidade:
+                # Esquecer um balde só devolve a rajada a quem estava parado.
+                self._baldes.popitem(last=False)
+        else:
+            self._baldes.move_to_end(chave)
+            balde[0] = min(rajada, balde[0] + (agora - balde[1]) * taxa)
+            balde[1] = agora
+        if balde[0] >= 1:
+            balde[0] -= 1
+            return 0.0
+        return (1 - balde[0]) / taxa
+
+    def __len__(self):
+        return len(self._baldes)
+
+
+# Lê, recarrega e consome numa única ida ao Redis (atômico no servidor).
+_SCRIPT_REDIS = """
+local fichas = tonumber(redis.call('HGET', KEYS[1], 'f'))
+local antes = tonumber(redis.call('HGET', KEYS[1], 't'))
+local agora = tonumber(ARGV[1])
+local taxa = tonumber(ARGV[2])
+local rajada = tonumber(ARGV[3])
+if fichas == nil then
+    fichas = rajada
+else
+    fichas = math.min(rajada, fichas + math.max(0, agora - antes) * taxa)
+end
+local espera = 0
+if fichas >= 1 then
+    fichas = fichas - 1
+else
+    espera = (1 - fichas) / taxa
+end
+redis.call('HSET', KEYS[1], 'f', tostring(fichas), 't', ARGV[1])
+redis.call('EXPIRE', KEYS[1], math.ceil(rajada / taxa) + 1)
+return tostring(espera)
+"""
+
+
+class BackendRedis:
+    """
+    Baldes compartilhados entre processos. Recebe qualquer cliente com a
+    interface assíncrona do redis-py (`eval`), como o cache de sessões.
+    """
+
+    def __init__(self, cliente, prefixo: str = "limite:"):
+        self._cliente = cliente
+        self._prefixo = prefixo
+
+    async def consumir(self, chave, taxa: float, rajada: float) -> float:
+        # Relógio da aplicação: os workers de uma máquina compartilham o mesmo.
+        espera = await self._cliente.eval(_SCRIPT_REDIS, 1, f"{self._prefixo}{chave}", repr(time.time()), taxa, rajada)
+        return float(espera)
+
+    async def fechar(self):
+        await self._cliente.aclose()
+
+    def __len__(self):
+        return 0
+
+
+class LimitadorRequisicoes:
+    def __init__(self, backend, taxa: float = 5.0, rajada: float = 20.0):
+        self.backend = backend
+        self.taxa = taxa
+        self.rajada = rajada
+
+        self.permitidas = 0
+        self.limitadas = 0
+
+    async def verificar(self, usuario_id: int, grupo: str = "leituras"):
+        """Gasta uma ficha do usuário no grupo ou levanta LimiteExcedidoError."""
+        espera = await self.backend.consumir(f"{grupo}:{usuario_id}", self.taxa, self.rajada)
+        if espera > 0:
+            self.limitadas += 1
+            raise LimiteExcedidoError(max(1, math.ceil(espera)))
+        self.permitidas += 1
+
+    async def fechar(self):
+        if hasattr(self.backend, "fechar"):
+            await self.backend.fechar()
+
+    def estatisticas(self) -> dict:
+        return {
+            "taxa_por_segundo": self.taxa,
+            "rajada": self.rajada,
+            "baldes": len(self.backend),
+            "permitidas": self.permitidas,
+            "limitadas": self.limitadas,
+        }
+
+
+def criar_limitador_do_ambiente() -> Optional[LimitadorRequisicoes]:
+    """
+    LIMITE_LEITURAS_POR_SEGUNDO (0 desliga) e LIMITE_LEITURAS_RAJADA. Em
+    memória por padrão; com LIMITADOR_REDIS_URL, o limite vale para a soma
+    dos workers.
+    """
+    taxa = float(os.environ.get("LIMITE_LEITURAS_POR_SEGUNDO", "5"))
+    if taxa <= 0:
+        return None
+    url_redis = os.environ.get("LIMITADOR_REDIS_URL")
+    if url_redis:
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("LIMITADOR_REDIS_URL definido, mas o pacote 'redis' não está instalado.")
+        backend = BackendRedis(redis.from_url(url_redis))
+    else:
+        backend = BackendMemoria()
+    return LimitadorRequisicoes(backend, taxa=taxa, rajada=float(os.environ.get("LIMITE_LEITURAS_RAJADA", "20")))
+
+
+class LeiturasCompartilhadas:
+    """
+    Single-flight: enquanto uma leitura com a mesma chave está em andamento,
+    as demais esperam o resultado dela. A consulta roda numa tarefa própria,
+    então o cancelamento de quem a iniciou (cliente desconectou) não derruba
+    quem está esperando. Só vale para leituras: nada é guardado depois que a
+    consulta termina.
+    """
+
+    def __init__(self):
+        self._em_andamento: Dict[Hashable, asyncio.Task] = {}
+
+        self.execucoes = 0
+        self.compartilhadas = 0
+
+    async def executar(self, chave: Hashable, operacao: Callable[[], Awaitable]):
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            tarefa = asyncio.ensure_future(operacao())
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda t: self._concluir(chave, t))
+            self.execucoes += 1
+        else:
+            self.compartilhadas += 1
+        return await asyncio.shield(tarefa)
+
+    def _concluir(self, chave: Hashable, tarefa: asyncio.Task):
+        if self._em_andamento.get(chave) is tarefa:
+            del self._em_andamento[chave]
+        if not tarefa.cancelled():
+            # Evita o aviso de exceção nunca lida quando ninguém mais esperava.
+            tarefa.exception()
+
+    def estatisticas(self) -> dict:
+        return {
+            "em_andamento": len(self._em_andamento),
+            "execucoes": self.execucoes,
+            "compartilhadas": self.compartilhadas,
+        }
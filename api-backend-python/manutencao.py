@@ -0,0 +1,210 @@
+# manutencao.py - SESSÕES ABANDONADAS E ARQUIVAMENTO DAS TABELAS QUENTES
+#
+# Tarefa em segundo plano, desligada por padrão, que a cada
+# MANUTENCAO_INTERVALO segundos:
+#
+#   1. se SESSAO_ABANDONADA_HORAS estiver definido, fecha as sessões ativas
+#      há mais tempo que isso com o status 'ABANDONADA', gravando em
+#      valor_pago o valor devido pela tarifa até o fechamento (não há
+#      pagamento: a cobrança fica registrada na sessão), e libera o usuário
+#      para um novo check-in;
+#   2. move para sessoes_arquivo as sessões encerradas há mais de
+#      ARQUIVAR_SESSOES_DIAS e para pagamentos_arquivo os pagamentos com mais
+#      de ARQUIVAR_PAGAMENTOS_DIAS.
+#
+# Tudo em lotes pequenos (MANUTENCAO_LOTE linhas, uma transação cada) com
+# uma pausa entre eles, para não segurar travas nem disputar o banco com as
+# rotas. Com vários workers, só quem obtém o GET_LOCK do ciclo trabalha.
+# As leituras de histórico e os relatórios juntam as tabelas quentes e as
+# de arquivo (ver consultas.py), então o arquivamento não muda respostas.
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import AsyncContextManager, Awaitable, Callable, List, Optional
+
+import consultas
+from tarifas import Tarifa
+
+logger = logging.getLogger("estacionamento.manutencao")
+
+NOME_TRAVA = "estacionamento_manutencao"
+
+# Sessões fechadas por abandono ({"id", "usuario_id", "horario_entrada", "valor_devido"}), após o commit.
+AoFechar = Callable[[List[dict]], Awaitable[None]]
+
+
+class ManutencaoBanco:
+    def __init__(
+        self,
+        tarifa: Tarifa,
+        intervalo: float = 300.0,
+        abandonada_apos: Optional[timedelta] = None,
+        arquivar_sessoes_apos: Optional[timedelta] = timedelta(days=30),
+        arquivar_pagamentos_apos: Optional[timedelta] = timedelta(days=365),
+        lote: int = 500,
+        pausa: float = 0.2,
+        lotes_por_ciclo: int = 20,
+    ):
+        self.tarifa = tarifa
+        self.intervalo = intervalo
+        self.abandonada_apos = abandonada_apos
+        self.arquivar_sessoes_apos = arquivar_sessoes_apos
+        self.arquivar_pagamentos_apos = arquivar_pagamentos_apos
+        self.lote = lote
+        self.pausa = pausa
+        self.lotes_por_ciclo = lotes_por_ciclo
+
+        self._tarefa: Optional[asyncio.Task] = None
+
+        self.ciclos = 0
+        self.ciclos_ignorados = 0
+        self.falhas = 0
+        self.sessoes_abandonadas = 0
+        self.sessoes_arquivadas = 0
+        self.pagamentos_arquivados = 0
+        self.ultima_execucao: Optional[datetime] = None
+
+    @classmethod
+    def do_ambiente(cls, tarifa: Tarifa) -> Optional["ManutencaoBanco"]:
+        """
+        MANUTENCAO_INTERVALO (0, o padrão, desliga a tarefa),
+        SESSAO_ABANDONADA_HORAS (desligado por padrão), ARQUIVAR_SESSOES_DIAS e
+        ARQUIVAR_PAGAMENTOS_DIAS (0 desliga cada etapa), MANUTENCAO_LOTE,
+        MANUTENCAO_PAUSA e MANUTENCAO_LOTES_POR_CICLO.
+        """
+        intervalo = float(os.environ.get("MANUTENCAO_INTERVALO", "0"))
+        if intervalo <= 0:
+            return None
+
+        def periodo(variavel: str, padrao: str, unidade: str) -> Optional[timedelta]:
+            valor = float(os.environ.get(variavel, padrao))
+            return timedelta(**{unidade: valor}) if valor > 0 else None
+
+        return cls(
+            tarifa,
+            intervalo=intervalo,
+            abandonada_apos=periodo("SESSAO_ABANDONADA_HORAS", "0", "hours"),
+            arquivar_sessoes_apos=periodo("ARQUIVAR_SESSOES_DIAS", "30", "days"),
+            arquivar_pagamentos_apos=periodo("ARQUIVAR_PAGAMENTOS_DIAS", "365", "days"),
+            lote=int(os.environ.get("MANUTENCAO_LOTE", "500")),
+            pausa=float(os.environ.get("MANUTENCAO_PAUSA", "0.2")),
+            lotes_por_ciclo=int(os.environ.get("MANUTENCAO_LOTES_POR_CICLO", "20")),
+        )
+
+    # --- Um ciclo ---
+
+    async def executar(self, conexao: Callable[[], AsyncContextManager], ao_fechar: Optional[AoFechar] = None):
+        """
+        Um ciclo completo numa conexão do pool. Cada etapa para depois de
+        `lotes_por_ciclo` lotes; o que sobrar fica para o próximo ciclo.
+        """
+        async with conexao() as db:
+            async with db.cursor() as cursor:
+                await cursor.execute("SELECT GET_LOCK(%s, 0) AS obtida", (NOME_TRAVA,))
+                obtida = (await cursor.fetchone())["obtida"]
+            await db.commit()
+            if obtida != 1:
+                # Outro worker está com o ciclo.
+                self.ciclos_ignorados += 1
+                return
+            try:
+                agora = datetime.now()
+                if self.abandonada_apos is not None:
+                    await self._fechar_abandonadas(db, agora - self.abandonada_apos, agora, ao_fechar)
+                if self.arquivar_sessoes_apos is not None:
+                    self.sessoes_arquivadas += await self._arquivar(
+                        db, "sessoes", consultas.COLUNAS_SESSAO, consultas.SESSOES_PARA_ARQUIVAR,
+                        agora - self.arquivar_sessoes_apos,
+                    )
+                if self.arquivar_pagamentos_apos is not None:
+                    self.pagamentos_arquivados += await self._arquivar(
+                        db, "pagamentos", consultas.COLUNAS_PAGAMENTO, consultas.PAGAMENTOS_PARA_ARQUIVAR,
+                        agora - self.arquivar_pagamentos_apos,
+                    )
+            finally:
+                try:
+                    await db.rollback()
+                    async with db.cursor() as cursor:
+                        await cursor.execute("SELECT RELEASE_LOCK(%s)", (NOME_TRAVA,))
+                except Exception as err:
+                    # A trava é da conexão: some quando ela for fechada.
+                    logger.warning("Manutenção: falha ao liberar a trava: %s", err)
+        self.ciclos += 1
+        self.ultima_execucao = datetime.now()
+
+    async def _fechar_abandonadas(self, db, limite: datetime, agora: datetime, ao_fechar: Optional[AoFechar]):
+        for _ in range(self.lotes_por_ciclo):
+            async with db.cursor() as cursor:
+                await cursor.execute(consultas.SESSOES_ABANDONADAS, (limite, self.lote))
+                sessoes = [dict(sessao) for sessao in await cursor.fetchall()]
+                if sessoes:
+                    # Cobra o tempo até o fechamento, como um checkout nesse horário.
+                    for sessao in sessoes:
+                        sessao["valor_devido"] = self.tarifa.calcular(sessao["horario_entrada"], agora)
+                    await cursor.execute(
+                        consultas.fechar_sessoes_abandonadas(len(sessoes)),
+                        [agora, *(v for s in sessoes for v in (s["id"], s["valor_devido"])), *(s["id"] for s in sessoes)],
+                    )
+            await db.commit()
+            if not sessoes:
+                return
+            self.sessoes_abandonadas += len(sessoes)
+            logger.info("Manutenção: %d sessões fechadas por abandono.", len(sessoes))
+            if ao_fechar is not None:
+                await ao_fechar(sessoes)
+            if len(sessoes) < self.lote:
+                return
+            await asyncio.sleep(self.pausa)
+
+    async def _arquivar(self, db, tabela: str, colunas: str, selecionar: str, corte: datetime) -> int:
+        """Copia e apaga, lote a lote, as linhas de `tabela` anteriores ao corte."""
+        total = 0
+        for _ in range(self.lotes_por_ciclo):
+            async with db.cursor() as cursor:
+                await cursor.execute(selecionar, (corte, self.lote))
+                ids = [linha["id"] for linha in await cursor.fetchall()]
+                if ids:
+                    await cursor.execute(consultas.arquivar(tabela, colunas, len(ids)), ids)
+                    await cursor.execute(consultas.excluir(tabela, len(ids)), ids)
+            await db.commit()
+            total += len(ids)
+            if len(ids) < self.lote:
+                break
+            await asyncio.sleep(self.pausa)
+        if total:
+            logger.info("Manutenção: %d linhas de %s arquivadas.", total, tabela)
+        return total
+
+    # --- Tarefa em segundo plano ---
+
+    def iniciar(self, conexao: Callable[[], AsyncContextManager], ao_fechar: Optional[AoFechar] = None):
+        async def laco():
+            while True:
+                await asyncio.sleep(self.intervalo)
+                try:
+                    await self.executar(conexao, ao_fechar)
+                except Exception as err:
+                    # Os lotes já confirmados ficam; o próximo ciclo continua do resto.
+                    self.falhas += 1
+                    logger.warning("Manutenção: falha no ciclo (nova tentativa em %.1fs): %s", self.intervalo, err)
+
+        self._tarefa = asyncio.create_task(laco())
+
+    async def parar(self):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            self._tarefa = None
+
+    def estatisticas(self) -> dict:
+        return {
+            "intervalo": self.intervalo,
+            "ciclos": self.ciclos,
+            "ciclos_ignorados": self.ciclos_ignorados,
+            "falhas": self.falhas,
+            "sessoes_abandonadas": self.sessoes_abandonadas,
+            "sessoes_arquivadas": self.sessoes_arquivadas,
+            "pagamentos_arquivados": self.pagamentos_arquivados,
+            "ultima_execucao": self.ultima_execucao.isoformat() if self.ultima_execucao else None,
+        }
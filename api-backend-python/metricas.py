@@ -0,0 +1,212 @@
+# metricas.py - HISTOGRAMAS POR ROTA E ENDPOINT /metrics (FORMATO PROMETHEUS)
+#
+# Com METRICAS=1, cada requisição registra, com o template da rota como
+# rótulo: a latência total, o tempo para obter uma conexão do pool, o tempo
+# de JWT e de bcrypt, e a duração e as linhas de cada comando SQL. Os
+# histogramas têm baldes fixos (uma busca binária e três somas por
+# observação) e ficam em memória, por worker.
+#
+# Com METRICAS_CONSULTA_LENTA_MS, comandos SQL mais lentos que o limite são
+# registrados no log (com ou sem METRICAS=1).
+
+import logging
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("estacionamento.metricas")
+
+BALDES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BALDES_LINHAS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+SEM_ROTA = "(sem rota)"
+SEGUNDO_PLANO = "(segundo plano)"
+
+# Scope ASGI da requisição atual (o roteador grava nele a rota encontrada).
+_requisicao: ContextVar[Optional[dict]] = ContextVar("metricas_requisicao", default=None)
+
+
+class Histograma:
+    __slots__ = ("limites", "contagens", "soma", "total")
+
+    def __init__(self, limites: Sequence[float]):
+        self.limites = limites
+        self.contagens = [0] * (len(limites) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        # Os baldes do Prometheus incluem o limite (le = "menor ou igual").
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class FamiliaHistogramas:
+    """Um histograma por combinação de valores dos rótulos."""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Tuple[str, ...], limites: Sequence[float]):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self.limites = limites
+        self.series: Dict[tuple, Histograma] = {}
+
+    def observar(self, valores: tuple, valor: float):
+        histograma = self.series.get(valores)
+        if histograma is None:
+            histograma = self.series[valores] = Histograma(self.limites)
+        histograma.observar(valor)
+
+    def exportar(self, linhas: List[str]):
+        linhas.append(f"# HELP {self.nome} {self.ajuda}")
+        linhas.append(f"# TYPE {self.nome} histogram")
+        for valores, histograma in sorted(self.series.items()):
+            rotulos = ",".join(f'{rotulo}="{_escapar(str(valor))}"' for rotulo, valor in zip(self.rotulos, valores))
+            acumulado = 0
+            for limite, contagem in zip(self.limites, histograma.contagens):
+                acumulado += contagem
+                linhas.append(f'{self.nome}_bucket{{{rotulos},le="{_numero(limite)}"}} {acumulado}')
+            linhas.append(f'{self.nome}_bucket{{{rotulos},le="+Inf"}} {histograma.total}')
+            linhas.append(f"{self.nome}_sum{{{rotulos}}} {_numero(histograma.soma)}")
+            linhas.append(f"{self.nome}_count{{{rotulos}}} {histograma.total}")
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self.requisicoes = FamiliaHistogramas(
+            "estacionamento_http_requisicao_segundos", "Latência total da requisição.",
+            ("metodo", "rota", "status"), BALDES_SEGUNDOS,
+        )
+        self.etapas = FamiliaHistogramas(
+            "estacionamento_etapa_segundos", "Tempo em cada etapa (conexao_db, jwt, senha).",
+            ("rota", "etapa"), BALDES_SEGUNDOS,
+        )
+        self.consultas = FamiliaHistogramas(
+            "estacionamento_db_consulta_segundos", "Duração de cada comando SQL.",
+            ("rota", "comando"), BALDES_SEGUNDOS,
+        )
+        self.linhas = FamiliaHistogramas(
+            "estacionamento_db_linhas", "Linhas devolvidas ou afetadas por comando SQL.",
+            ("rota", "comando"), BALDES_LINHAS,
+        )
+
+    def exportar(self) -> str:
+        linhas: List[str] = []
+        for familia in (self.requisicoes, self.etapas, self.consultas, self.linhas):
+            familia.exportar(linhas)
+        return "\n".join(linhas) + "\n"
+
+
+registro: Optional[RegistroMetricas] = None
+limiar_consulta_lenta: Optional[float] = None
+# Atalho para o cursor: há algo a fazer com a duração das consultas?
+medir_consultas = False
+
+
+def configurar(ativas: bool, consulta_lenta_ms: Optional[float] = None):
+    global registro, limiar_consulta_lenta, medir_consultas
+    registro = RegistroMetricas() if ativas else None
+    limiar_consulta_lenta = consulta_lenta_ms / 1000 if consulta_lenta_ms else None
+    medir_consultas = registro is not None or limiar_consulta_lenta is not None
+
+
+def configurar_do_ambiente():
+    lenta = os.environ.get("METRICAS_CONSULTA_LENTA_MS")
+    configurar(os.environ.get("METRICAS") == "1", float(lenta) if lenta else None)
+
+
+def rota_atual() -> str:
+    scope = _requisicao.get()
+    if scope is None:
+        return SEGUNDO_PLANO
+    rota = scope.get("route")
+    return getattr(rota, "path", SEM_ROTA) if rota is not None else SEM_ROTA
+
+
+def registrar_etapa(etapa: str, duracao: float):
+    if registro is not None:
+        registro.etapas.observar((rota_atual(), etapa), duracao)
+
+
+@contextmanager
+def etapa(nome: str):
+    if registro is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro.etapas.observar((rota_atual(), nome), time.perf_counter() - inicio)
+
+
+_comandos: Dict[str, str] = {}
+
+
+def _comando(sql: str) -> str:
+    comando = _comandos.get(sql)
+    if comando is None:
+        partes = sql.split(None, 1)
+        comando = partes[0].upper() if partes else "?"
+        if len(_comandos) < 1000:  # SQL montado com n marcadores varia; o cache não cresce sem limite
+            _comandos[sql] = comando
+    return comando
+
+
+def registrar_consulta(sql: str, duracao: float, linhas: Optional[int]):
+    rota = rota_atual()
+    if registro is not None:
+        comando = _comando(sql)
+        registro.consultas.observar((rota, comando), duracao)
+        if linhas is not None and linhas >= 0:
+            registro.linhas.observar((rota, comando), linhas)
+    if limiar_consulta_lenta is not None and duracao >= limiar_consulta_lenta:
+        logger.warning(
+            "Consulta lenta: %.1f ms, %s linhas, rota %s: %s",
+            1000 * duracao, linhas if linhas is not None else "?", rota, " ".join(sql.split())[:500],
+        )
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI: latência total por método, rota e status, e a rota
+    atual para as observações feitas durante a requisição.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _requisicao.set(scope)
+        status_code = 500
+        inicio = time.perf_counter()
+
+        async def send_com_status(mensagem):
+            nonlocal status_code
+            if mensagem["type"] == "http.response.start":
+                status_code = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, send_com_status)
+        finally:
+            # Streams (SSE, exportação) contam até o fim do corpo.
+            if registro is not None:
+                registro.requisicoes.observar((scope["method"], rota_atual(), status_code), time.perf_counter() - inicio)
+            _requisicao.reset(token)
@@ -0,0 +1,45 @@
+-- Tabelas usadas pela API. Em bancos que já existiam antes das migrações
+-- (produção na TiDB) esta versão não altera nada: só registra o ponto de partida.
+
+-- migrate:up
+CREATE TABLE IF NOT EXISTS usuarios (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL,
+    email VARCHAR(255) NOT NULL,
+    senha VARCHAR(255) NOT NULL,
+    UNIQUE KEY uq_usuarios_email (email)
+);
+
+CREATE TABLE IF NOT EXISTS cartoes (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    usuario_id BIGINT NOT NULL,
+    numero VARCHAR(25) NOT NULL,
+    nome VARCHAR(255) NOT NULL,
+    validade VARCHAR(7) NOT NULL,
+    cvv VARCHAR(4) NOT NULL,
+    is_default BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+CREATE TABLE IF NOT EXISTS sessoes (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    usuario_id BIGINT NOT NULL,
+    horario_entrada DATETIME NOT NULL,
+    horario_saida DATETIME NULL,
+    valor_pago DECIMAL(10, 2) NULL,
+    status VARCHAR(20) NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS pagamentos (
+    id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+    usuario_id BIGINT NOT NULL,
+    horario_entrada DATETIME NOT NULL,
+    horario_saida DATETIME NOT NULL,
+    valor_pago DECIMAL(10, 2) NOT NULL,
+    numero_cartao BIGINT NOT NULL
+);
+
+-- migrate:down
+DROP TABLE IF EXISTS pagamentos;
+DROP TABLE IF EXISTS sessoes;
+DROP TABLE IF EXISTS cartoes;
+DROP TABLE IF EXISTS usuarios;
@@ -0,0 +1,36 @@
+-- Índices para as consultas de consultas.py e a garantia de no máximo uma
+-- sessão 'ATIVA' por usuário.
+
+-- migrate:up
+-- Sessões ativas duplicadas de antes desta restrição: mantém a mais recente.
+UPDATE sessoes s
+JOIN (
+    SELECT usuario_id, MAX(id) AS manter
+    FROM sessoes
+    WHERE status = 'ATIVA'
+    GROUP BY usuario_id
+    HAVING COUNT(*) > 1
+) duplicadas ON duplicadas.usuario_id = s.usuario_id
+SET s.status = 'CANCELADA'
+WHERE s.status = 'ATIVA' AND s.id <> duplicadas.manter;
+
+-- MySQL/TiDB não têm índice parcial: a coluna gerada só tem valor para
+-- sessões ativas, e o índice único ignora os NULLs das demais.
+ALTER TABLE sessoes ADD COLUMN usuario_ativo BIGINT AS (CASE WHEN status = 'ATIVA' THEN usuario_id END) VIRTUAL;
+CREATE UNIQUE INDEX uq_sessoes_usuario_ativa ON sessoes (usuario_ativo);
+
+-- Sessão ativa do usuário (status, preview, checkin, checkout, login): cobre id e horario_entrada.
+CREATE INDEX idx_sessoes_usuario_status ON sessoes (usuario_id, status, horario_entrada);
+
+-- Contagem, cartão padrão e listagem dos cartões do usuário.
+CREATE INDEX idx_cartoes_usuario_padrao ON cartoes (usuario_id, is_default);
+
+-- Histórico de pagamentos do usuário em ordem de saída.
+CREATE INDEX idx_pagamentos_usuario_saida ON pagamentos (usuario_id, horario_saida, id);
+
+-- migrate:down
+DROP INDEX idx_pagamentos_usuario_saida ON pagamentos;
+DROP INDEX idx_cartoes_usuario_padrao ON cartoes;
+DROP INDEX idx_sessoes_usuario_status ON sessoes;
+DROP INDEX uq_sessoes_usuario_ativa ON sessoes;
+ALTER TABLE sessoes DROP COLUMN usuario_ativo;
@@ -0,0 +1,14 @@
+-- Histogramas de ocupação por faixa da semana (dia da semana × hora), usados
+-- por /estabelecimento/horarios-pico. faixa = dia_da_semana * 24 + hora, com
+-- segunda-feira = 0. Preenchida pelos workers (ver ocupacao.py); para
+-- construir a partir das sessões existentes: python ocupacao.py reconstruir
+
+-- migrate:up
+CREATE TABLE IF NOT EXISTS ocupacao_faixas (
+    faixa SMALLINT NOT NULL PRIMARY KEY,
+    entradas BIGINT NOT NULL DEFAULT 0,
+    segundos_ocupados BIGINT NOT NULL DEFAULT 0
+);
+
+-- migrate:down
+DROP TABLE ocupacao_faixas;
@@ -0,0 +1,10 @@
+-- Relatórios administrativos (relatorios.py): sessões e pagamentos de um
+-- intervalo de datas, filtrados pelo horário de saída.
+
+-- migrate:up
+CREATE INDEX idx_sessoes_saida ON sessoes (horario_saida);
+CREATE INDEX idx_pagamentos_saida ON pagamentos (horario_saida);
+
+-- migrate:down
+DROP INDEX idx_pagamentos_saida ON pagamentos;
+DROP INDEX idx_sessoes_saida ON sessoes;
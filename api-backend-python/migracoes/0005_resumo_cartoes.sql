@@ -0,0 +1,68 @@
+-- Resumo do cartão gravado no cadastro (últimos quatro dígitos e bandeira),
+-- para que a listagem não leia o número completo, e garantia de no máximo um
+-- cartão padrão por usuário, com busca direta pelo índice único.
+
+-- migrate:up
+ALTER TABLE cartoes
+    ADD COLUMN ultimos_4 CHAR(4) NOT NULL DEFAULT '',
+    ADD COLUMN bandeira VARCHAR(20) NOT NULL DEFAULT 'Outra';
+
+-- Cartões existentes. A bandeira é a mesma busca de bandeiras.py sobre a
+-- tabela de intervalos já resolvida: INTERVAL() devolve quantos inícios de
+-- intervalo são menores ou iguais ao BIN, e ELT() escolhe a bandeira daquele
+-- intervalo. Números com menos de 12 dígitos ficam como 'Outra'.
+-- tests/test_bandeiras.py confere que a tabela é a de bandeiras.py.
+UPDATE cartoes
+SET ultimos_4 = RIGHT(REGEXP_REPLACE(numero, '[^0-9]', ''), 4),
+    bandeira = CASE
+        WHEN CHAR_LENGTH(REGEXP_REPLACE(numero, '[^0-9]', '')) < 12 THEN 'Outra'
+        ELSE ELT(
+            INTERVAL(
+                CAST(LEFT(REGEXP_REPLACE(numero, '[^0-9]', ''), 6) AS UNSIGNED),
+                222100, 272100, 300000, 306000, 340000, 350000, 352800, 359000, 360000, 370000,
+                380000, 384100, 384101, 384140, 384141, 384160, 384161, 390000, 400000, 401178,
+                401180, 431274, 431275, 438935, 438936, 451416, 451417, 457393, 457394, 457631,
+                457633, 500000, 504175, 504176, 506699, 506779, 509000, 510000, 560000, 601100,
+                601200, 606282, 606283, 627780, 627781, 636297, 636298, 636368, 636369, 644000,
+                650031, 650034, 650035, 650052, 650405, 650440, 650485, 650539, 650541, 650599,
+                650700, 650719, 650720, 650728, 650901, 650921, 651652, 651680, 655000, 655020,
+                655021, 655059, 660000
+            ) + 1,
+            'Outra', 'Mastercard', 'Outra', 'Diners', 'Outra', 'American Express',
+            'Outra', 'JCB', 'Outra', 'Diners', 'American Express', 'Diners',
+            'Hipercard', 'Diners', 'Hipercard', 'Diners', 'Hipercard', 'Diners',
+            'Outra', 'Visa', 'Elo', 'Visa', 'Elo', 'Visa',
+            'Elo', 'Visa', 'Elo', 'Visa', 'Elo', 'Visa',
+            'Elo', 'Visa', 'Outra', 'Elo', 'Outra', 'Elo',
+            'Outra', 'Elo', 'Mastercard', 'Outra', 'Discover', 'Outra',
+            'Hipercard', 'Outra', 'Elo', 'Outra', 'Elo', 'Outra',
+            'Elo', 'Outra', 'Discover', 'Elo', 'Discover', 'Elo',
+            'Discover', 'Elo', 'Discover', 'Elo', 'Discover', 'Elo',
+            'Discover', 'Elo', 'Discover', 'Elo', 'Discover', 'Elo',
+            'Discover', 'Elo', 'Discover', 'Elo', 'Discover', 'Elo',
+            'Discover', 'Outra'
+        )
+    END;
+
+-- Mais de um cartão padrão (possível antes desta restrição): mantém o mais recente.
+UPDATE cartoes c
+JOIN (
+    SELECT usuario_id, MAX(id) AS manter
+    FROM cartoes
+    WHERE is_default = TRUE
+    GROUP BY usuario_id
+    HAVING COUNT(*) > 1
+) duplicados ON duplicados.usuario_id = c.usuario_id
+SET c.is_default = FALSE
+WHERE c.is_default = TRUE AND c.id <> duplicados.manter;
+
+-- Mesmo recurso de uq_sessoes_usuario_ativa: a coluna só tem valor no cartão
+-- padrão, e o índice único leva direto a ele (trocar o padrão altera só a
+-- linha antiga e a nova).
+ALTER TABLE cartoes ADD COLUMN usuario_padrao BIGINT AS (CASE WHEN is_default THEN usuario_id END) VIRTUAL;
+CREATE UNIQUE INDEX uq_cartoes_usuario_padrao ON cartoes (usuario_padrao);
+
+-- migrate:down
+DROP INDEX uq_cartoes_usuario_padrao ON cartoes;
+ALTER TABLE cartoes DROP COLUMN usuario_padrao;
+ALTER TABLE cartoes DROP COLUMN bandeira, DROP COLUMN ultimos_4;
@@ -0,0 +1,34 @@
+-- Tabelas de arquivo para sessões encerradas e pagamentos antigos
+-- (manutencao.py move as linhas em lotes). O histórico e os relatórios
+-- leem as duas tabelas; as rotas de sessão ativa, só a quente.
+
+-- migrate:up
+CREATE TABLE IF NOT EXISTS sessoes_arquivo (
+    id BIGINT NOT NULL PRIMARY KEY,
+    usuario_id BIGINT NOT NULL,
+    horario_entrada DATETIME NOT NULL,
+    horario_saida DATETIME NULL,
+    valor_pago DECIMAL(10, 2) NULL,
+    status VARCHAR(20) NOT NULL,
+    KEY idx_sessoes_arquivo_saida (horario_saida)
+);
+
+CREATE TABLE IF NOT EXISTS pagamentos_arquivo (
+    id BIGINT NOT NULL PRIMARY KEY,
+    usuario_id BIGINT NOT NULL,
+    horario_entrada DATETIME NOT NULL,
+    horario_saida DATETIME NOT NULL,
+    valor_pago DECIMAL(10, 2) NOT NULL,
+    numero_cartao BIGINT NOT NULL,
+    KEY idx_pagamentos_arquivo_usuario_saida (usuario_id, horario_saida, id),
+    KEY idx_pagamentos_arquivo_saida (horario_saida)
+);
+
+-- migrate:down
+-- Devolve as linhas arquivadas antes de apagar as tabelas.
+INSERT IGNORE INTO pagamentos (id, usuario_id, horario_entrada, horario_saida, valor_pago, numero_cartao)
+SELECT id, usuario_id, horario_entrada, horario_saida, valor_pago, numero_cartao FROM pagamentos_arquivo;
+INSERT IGNORE INTO sessoes (id, usuario_id, horario_entrada, horario_saida, valor_pago, status)
+SELECT id, usuario_id, horario_entrada, horario_saida, valor_pago, status FROM sessoes_arquivo;
+DROP TABLE IF EXISTS pagamentos_arquivo;
+DROP TABLE IF EXISTS sessoes_arquivo;
@@ -0,0 +1,10 @@
+-- pagamentos.id como BIGINT com sinal: os pagamentos do journal
+-- (journal.py) chegam com ids negativos de 63 bits. A 0001 já cria a
+-- coluna assim, mas não altera uma tabela pagamentos que já existia com
+-- INT ou UNSIGNED. Reconstrói a tabela: aplique fora do horário de pico.
+
+-- migrate:up
+ALTER TABLE pagamentos MODIFY id BIGINT NOT NULL AUTO_INCREMENT;
+
+-- migrate:down
+-- Sem volta: um tipo menor não comportaria os ids já gravados pelo journal.
@@ -0,0 +1,180 @@
+# migrar.py - MIGRAÇÕES VERSIONADAS DO BANCO
+#
+# Cada arquivo de migracoes/ se chama NNNN_descricao.sql e tem duas seções,
+# "-- migrate:up" e "-- migrate:down". As versões aplicadas ficam registradas
+# na tabela schema_migracoes. Usa as mesmas variáveis DB_* da API
+# (DB_SSL_CA= vazio para um MySQL local sem TLS):
+#
+#   python migrar.py status
+#   python migrar.py aplicar [--ate 0002]
+#   python migrar.py reverter [--ate 0001]
+#   python migrar.py verificar-consultas
+
+import argparse
+import os
+import re
+import sys
+from typing import List, NamedTuple, Optional
+
+import pymysql
+import pymysql.cursors
+
+import consultas
+from db import ConfiguracaoBancoAusenteError, parametros_do_ambiente
+
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migracoes")
+
+CRIAR_TABELA_CONTROLE = """
+CREATE TABLE IF NOT EXISTS schema_migracoes (
+    versao VARCHAR(20) NOT NULL PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL,
+    aplicada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+
+class Migracao(NamedTuple):
+    versao: str
+    nome: str
+    up: List[str]
+    down: List[str]
+
+
+def _comandos(sql: str) -> List[str]:
+    """Separa uma seção em comandos (um ';' no fim da linha encerra o comando)."""
+    linhas = [linha for linha in sql.splitlines() if not linha.strip().startswith("--")]
+    return [comando.strip() for comando in re.split(r";\s*$", "\n".join(linhas), flags=re.M) if comando.strip()]
+
+
+def carregar_migracoes(pasta: str = PASTA_MIGRACOES) -> List[Migracao]:
+    migracoes = []
+    for arquivo in sorted(os.listdir(pasta)):
+        encontrado = re.match(r"^(\d+)_(.+)\.sql$", arquivo)
+        if not encontrado:
+            continue
+        with open(os.path.join(pasta, arquivo), encoding="utf-8") as f:
+            conteudo = f.read()
+        partes = re.split(r"^--\s*migrate:(up|down)\s*$", conteudo, flags=re.M)
+        secoes = dict(zip(partes[1::2], partes[2::2]))
+        if "up" not in secoes or "down" not in secoes:
+            raise ValueError(f"{arquivo}: faltam as seções '-- migrate:up' e '-- migrate:down'.")
+        migracoes.append(Migracao(encontrado.group(1), encontrado.group(2), _comandos(secoes["up"]), _comandos(secoes["down"])))
+    return migracoes
+
+
+def conectar():
+    parametros = parametros_do_ambiente()
+    parametros["database"] = parametros.pop("db")
+    return pymysql.connect(autocommit=True, cursorclass=pymysql.cursors.DictCursor, **parametros)
+
+
+def versoes_aplicadas(conexao) -> List[str]:
+    with conexao.cursor() as cursor:
+        cursor.execute(CRIAR_TABELA_CONTROLE)
+        cursor.execute("SELECT versao FROM schema_migracoes ORDER BY versao")
+        return [linha["versao"] for linha in cursor.fetchall()]
+
+
+def aplicar(conexao, ate: Optional[str] = None):
+    aplicadas = set(versoes_aplicadas(conexao))
+    for migracao in carregar_migracoes():
+        if ate is not None and migracao.versao > ate:
+            break
+        if migracao.versao in aplicadas:
+            continue
+        # DDL faz commit implícito no MySQL: uma migração que falha no meio
+        # não é registrada e precisa ser corrigida à mão antes de reaplicar.
+        print(f"aplicando {migracao.versao}_{migracao.nome}")
+        with conexao.cursor() as cursor:
+            for comando in migracao.up:
+                cursor.execute(comando)
+            cursor.execute("INSERT INTO schema_migracoes (versao, nome) VALUES (%s, %s)", (migracao.versao, migracao.nome))
+
+
+def reverter(conexao, ate: Optional[str] = None):
+    """Reverte as migrações posteriores a `ate` (sem `ate`, só a última)."""
+    aplicadas = versoes_aplicadas(conexao)
+    if not aplicadas:
+        return
+    alvo = ate if ate is not None else (aplicadas[-2] if len(aplicadas) > 1 else "")
+    for migracao in reversed(carregar_migracoes()):
+        if migracao.versao <= alvo or migracao.versao not in aplicadas:
+            continue
+        print(f"revertendo {migracao.versao}_{migracao.nome}")
+        with conexao.cursor() as cursor:
+            for comando in migracao.down:
+                cursor.execute(comando)
+            cursor.execute("DELETE FROM schema_migracoes WHERE versao = %s", (migracao.versao,))
+
+
+def varreduras_completas(plano: List[dict]) -> List[str]:
+    """Tabelas lidas por inteiro num plano de EXPLAIN (formato MySQL ou TiDB)."""
+    problemas = []
+    for linha in plano:
+        tabela = linha.get("table") or "?"
+        if tabela.startswith("<"):
+            # Resultado intermediário (<union1,2>, <derived2>): as leituras
+            # das tabelas de verdade aparecem nas próprias linhas do plano.
+            continue
+        if linha.get("type") == "ALL":  # MySQL / MariaDB
+            problemas.append(tabela)
+        elif "TableFullScan" in str(linha.get("id", "")):  # TiDB
+            problemas.append(linha.get("access object") or linha["id"])
+    return problemas
+
+
+def verificar_consultas(conexao) -> bool:
+    """
+    Roda EXPLAIN em cada consulta de consultas.CONSULTAS_DAS_ROTAS. Em
+    tabelas quase vazias o otimizador pode preferir a varredura mesmo com
+    índice: rode contra um banco com volume representativo.
+    """
+    tudo_certo = True
+    with conexao.cursor() as cursor:
+        for nome, (sql, parametros) in consultas.CONSULTAS_DAS_ROTAS.items():
+            cursor.execute("EXPLAIN " + sql, parametros)
+            problemas = varreduras_completas(cursor.fetchall())
+            if problemas:
+                tudo_certo = False
+                print(f"FALHA {nome}: varredura completa em {', '.join(problemas)}")
+            else:
+                print(f"ok    {nome}")
+    return tudo_certo
+
+
+def principal(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Migrações do banco da API")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comandos.add_parser("status", help="Lista as migrações e se já foram aplicadas")
+    p_aplicar = comandos.add_parser("aplicar", help="Aplica as migrações pendentes")
+    p_aplicar.add_argument("--ate", help="Última versão a aplicar")
+    p_reverter = comandos.add_parser("reverter", help="Reverte migrações aplicadas")
+    p_reverter.add_argument("--ate", help="Versão que deve continuar aplicada (0 reverte tudo)")
+    comandos.add_parser("verificar-consultas", help="Falha se alguma consulta das rotas varrer a tabela inteira")
+    args = parser.parse_args(argv)
+
+    try:
+        conexao = conectar()
+    except ConfiguracaoBancoAusenteError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    try:
+        if args.comando == "status":
+            aplicadas = set(versoes_aplicadas(conexao))
+            for migracao in carregar_migracoes():
+                marca = "x" if migracao.versao in aplicadas else " "
+                print(f"[{marca}] {migracao.versao}_{migracao.nome}")
+        elif args.comando == "aplicar":
+            aplicar(conexao, args.ate)
+        elif args.comando == "reverter":
+            reverter(conexao, args.ate)
+        elif args.comando == "verificar-consultas":
+            return 0 if verificar_consultas(conexao) else 1
+    finally:
+        conexao.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(principal())
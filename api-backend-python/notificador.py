@@ -0,0 +1,51 @@
+# notificador.py - PUB/SUB EM PROCESSO PARA MUDANÇAS DE SESSÃO
+
+import asyncio
+from contextlib import contextmanager
+
+
+class Notificador:
+    """
+    Entrega eventos por usuário aos clientes conectados ao stream de status.
+
+    Cada assinante é só uma fila de uma posição: um cliente parado custa
+    poucos bytes e nenhuma tarefa extra, e se ele demorar a ler recebe
+    apenas o estado mais recente (eventos intermediários são descartados).
+
+    Os eventos ficam restritos ao processo que os publicou; com vários
+    workers, o stream também reconsulta o estado a cada heartbeat.
+    """
+
+    def __init__(self):
+        self._assinantes = {}  # usuario_id -> set de filas
+        self.publicados = 0
+        self.entregues = 0
+
+    @contextmanager
+    def assinar(self, usuario_id: int):
+        fila = asyncio.Queue(maxsize=1)
+        self._assinantes.setdefault(usuario_id, set()).add(fila)
+        try:
+            yield fila
+        finally:
+            filas = self._assinantes.get(usuario_id)
+            if filas is not None:
+                filas.discard(fila)
+                if not filas:
+                    del self._assinantes[usuario_id]
+
+    def publicar(self, usuario_id: int, evento: dict):
+        self.publicados += 1
+        for fila in self._assinantes.get(usuario_id, ()):
+            if fila.full():
+                fila.get_nowait()
+            fila.put_nowait(evento)
+            self.entregues += 1
+
+    def estatisticas(self) -> dict:
+        return {
+            "usuarios": len(self._assinantes),
+            "assinantes": sum(len(filas) for filas in self._assinantes.values()),
+            "publicados": self.publicados,
+            "entregues": self.entregues,
+        }
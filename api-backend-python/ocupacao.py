@@ -0,0 +1,285 @@
+# ocupacao.py - OCUPAÇÃO ATUAL E HISTOGRAMAS POR DIA DA SEMANA/HORA
+#
+# Alimenta /estabelecimento/horarios-pico. Cada worker soma, a cada check-in
+# e checkout, as entradas e os segundos ocupados em 168 faixas (7 dias × 24
+# horas, segunda-feira = 0) guardadas em arrays. Uma tarefa em segundo plano
+# envia essas diferenças para a tabela ocupacao_faixas, lê de volta os totais
+# de todos os workers e a contagem de sessões ativas, e monta a resposta da
+# rota, que só devolve o dicionário pronto.
+#
+# Para construir os histogramas a partir das sessões já existentes (uma
+# passada, lendo as linhas em fluxo):
+#
+#   DB_SSL_CA= python ocupacao.py reconstruir
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from array import array
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger("estacionamento.ocupacao")
+
+FAIXAS = 7 * 24
+SEGUNDOS_FAIXA = 3600
+SEGUNDOS_SEMANA = FAIXAS * SEGUNDOS_FAIXA
+
+# Ordem de exibição (domingo primeiro) e a faixa inicial de cada dia.
+DIAS = (("Dom", 6), ("Seg", 0), ("Ter", 1), ("Qua", 2), ("Qui", 3), ("Sex", 4), ("Sáb", 5))
+
+# "dados_semana" mantém o formato que os clientes já conhecem, 7 pontos por
+# dia: blocos de duas horas das 8h às 22h. As 24 horas de cada dia vão em
+# "dados_semana_por_hora".
+BLOCOS_PICOS = tuple(range(8, 22, 2))
+HORAS_POR_BLOCO = 2
+
+# (faixa, entradas, segundos ocupados) -> linhas atuais da tabela e sessões ativas
+Sincronizar = Callable[[List[Tuple[int, int, int]]], Awaitable[Tuple[List[dict], int]]]
+
+
+def faixa_de(horario: datetime) -> int:
+    return horario.weekday() * 24 + horario.hour
+
+
+def somar_periodo(segundos: array, entrada: datetime, saida: datetime):
+    """Distribui os segundos entre entrada e saída pelas faixas que o período atravessa."""
+    restante = int((saida - entrada).total_seconds())
+    if restante <= 0:
+        return
+    semanas, restante = divmod(restante, SEGUNDOS_SEMANA)
+    if semanas:
+        for faixa in range(FAIXAS):
+            segundos[faixa] += semanas * SEGUNDOS_FAIXA
+    posicao = faixa_de(entrada) * SEGUNDOS_FAIXA + entrada.minute * 60 + entrada.second
+    while restante > 0:
+        faixa, decorrido = divmod(posicao, SEGUNDOS_FAIXA)
+        parte = min(SEGUNDOS_FAIXA - decorrido, restante)
+        segundos[faixa] += parte
+        restante -= parte
+        posicao = (posicao + parte) % SEGUNDOS_SEMANA
+
+
+def _zeros() -> array:
+    return array("q", bytes(8 * FAIXAS))
+
+
+def status_movimento(lotacao: int) -> str:
+    if lotacao >= 85:
+        return "Muito movimentado"
+    if lotacao >= 60:
+        return "Movimentado"
+    if lotacao < 30:
+        return "Pouco movimentado"
+    return "Normal"
+
+
+class MonitorOcupacao:
+    """
+    Ocupação do estacionamento vista por este worker. Os totais vêm da última
+    sincronização com o banco mais o que este worker registrou desde então;
+    entre sincronizações, mudanças feitas por outros workers não aparecem.
+    """
+
+    def __init__(self, capacidade: int = 100, intervalo: float = 5.0):
+        if capacidade <= 0:
+            raise ValueError("A capacidade do estacionamento deve ser positiva.")
+        self.capacidade = capacidade
+        self.intervalo = intervalo
+
+        self.entradas = _zeros()
+        self.segundos = _zeros()
+        self.ativas = 0
+        # Diferenças ainda não enviadas ao banco.
+        self._novas_entradas = _zeros()
+        self._novos_segundos = _zeros()
+
+        self._picos, self._picos_por_hora = self._calcular_picos()
+        self._resposta: Optional[dict] = None
+        self._tarefa: Optional[asyncio.Task] = None
+
+        self.sincronizacoes = 0
+        self.falhas_sincronizacao = 0
+        self.ultima_sincronizacao: Optional[datetime] = None
+
+    @classmethod
+    def do_ambiente(cls) -> "MonitorOcupacao":
+        return cls(
+            capacidade=int(os.environ.get("ESTACIONAMENTO_CAPACIDADE", "100")),
+            intervalo=float(os.environ.get("OCUPACAO_INTERVALO", "5")),
+        )
+
+    # --- Eventos das rotas de sessão ---
+
+    def registrar_entrada(self, horario: datetime):
+        faixa = faixa_de(horario)
+        self.entradas[faixa] += 1
+        self._novas_entradas[faixa] += 1
+        self.ativas += 1
+        self._resposta = None
+
+    def registrar_saida(self, entrada: datetime, saida: datetime):
+        somar_periodo(self.segundos, entrada, saida)
+        somar_periodo(self._novos_segundos, entrada, saida)
+        self.ativas = max(self.ativas - 1, 0)
+        self._resposta = None
+
+    # --- Sincronização com o banco ---
+
+    async def sincronizar(self, sincronizar: Sincronizar):
+        entradas, segundos = self._novas_entradas, self._novos_segundos
+        self._novas_entradas, self._novos_segundos = _zeros(), _zeros()
+        diferencas = [
+            (faixa, entradas[faixa], segundos[faixa]) for faixa in range(FAIXAS) if entradas[faixa] or segundos[faixa]
+        ]
+        try:
+            linhas, ativas = await sincronizar(diferencas)
+        except BaseException:
+            # Devolve as diferenças para a próxima tentativa.
+            for faixa, novas_entradas, novos_segundos in diferencas:
+                self._novas_entradas[faixa] += novas_entradas
+                self._novos_segundos[faixa] += novos_segundos
+            raise
+
+        totais_entradas, totais_segundos = _zeros(), _zeros()
+        for linha in linhas:
+            totais_entradas[linha["faixa"]] = linha["entradas"]
+            totais_segundos[linha["faixa"]] = linha["segundos_ocupados"]
+        # Eventos registrados durante a ida ao banco ainda não estão nos totais.
+        for faixa in range(FAIXAS):
+            totais_entradas[faixa] += self._novas_entradas[faixa]
+            totais_segundos[faixa] += self._novos_segundos[faixa]
+        self.entradas, self.segundos = totais_entradas, totais_segundos
+        self.ativas = int(ativas)
+        self._picos, self._picos_por_hora = self._calcular_picos()
+        self._resposta = None
+        self.sincronizacoes += 1
+        self.ultima_sincronizacao = datetime.now()
+
+    def iniciar(self, sincronizar: Sincronizar):
+        async def laco():
+            # Sem espera se ninguém sincronizou antes (o lifespan costuma fazer a primeira).
+            espera = self.intervalo if self.sincronizacoes else 0.0
+            while True:
+                await asyncio.sleep(espera)
+                try:
+                    await self.sincronizar(sincronizar)
+                    espera = self.intervalo
+                except Exception as err:
+                    self.falhas_sincronizacao += 1
+                    espera = min(max(espera, self.intervalo) * 2, 60.0)
+                    logger.warning("Ocupação: falha ao sincronizar com o banco (nova tentativa em %.1fs): %s", espera, err)
+
+        self._tarefa = asyncio.create_task(laco())
+
+    async def parar(self, sincronizar: Optional[Sincronizar] = None):
+        if self._tarefa is not None:
+            self._tarefa.cancel()
+            self._tarefa = None
+        if sincronizar is not None:
+            try:
+                await self.sincronizar(sincronizar)
+            except Exception as err:
+                logger.warning("Ocupação: diferenças não enviadas ao banco: %s", err)
+
+    # --- Leitura ---
+
+    def _calcular_picos(self) -> Tuple[List[dict], List[dict]]:
+        """
+        Por dia, a ocupação média de cada bloco de BLOCOS_PICOS e de cada
+        hora, em % da hora mais cheia da semana.
+        """
+        maior = max(self.segundos) or 1
+        blocos, horas = [], []
+        for dia, inicio in DIAS:
+            segundos = self.segundos[inicio * 24:inicio * 24 + 24]
+            blocos.append({"dia": dia, "picos": [
+                round(100 * sum(segundos[hora:hora + HORAS_POR_BLOCO]) / HORAS_POR_BLOCO / maior) for hora in BLOCOS_PICOS
+            ]})
+            horas.append({"dia": dia, "picos": [round(100 * valor / maior) for valor in segundos]})
+        return blocos, horas
+
+    def resposta(self) -> dict:
+        if self._resposta is None:
+            lotacao = min(100, round(100 * self.ativas / self.capacidade))
+            self._resposta = {
+                "place_id": "CH_ESTACIONAMENTO_TCC",
+                "status_movimento_atual": status_movimento(lotacao),
+                "lotacao_percentual_atual": lotacao,
+                "vagas_ocupadas": self.ativas,
+                "capacidade": self.capacidade,
+                "dados_semana": self._picos,
+                "dados_semana_por_hora": self._picos_por_hora,
+            }
+        return self._resposta
+
+    def estatisticas(self) -> dict:
+        return {
+            "capacidade": self.capacidade,
+            "ativas": self.ativas,
+            "entradas_registradas": sum(self.entradas),
+            "faixas_pendentes": sum(1 for faixa in range(FAIXAS) if self._novas_entradas[faixa] or self._novos_segundos[faixa]),
+            "sincronizacoes": self.sincronizacoes,
+            "falhas_sincronizacao": self.falhas_sincronizacao,
+            "ultima_sincronizacao": self.ultima_sincronizacao.isoformat() if self.ultima_sincronizacao else None,
+        }
+
+
+def reconstruir(conexao, lote: int = 5000) -> int:
+    """
+    Recalcula ocupacao_faixas a partir de todas as sessões não canceladas,
+    lendo em fluxo (SSCursor), e substitui a tabela. Sessões ativas contam a
+    entrada; o tempo ocupado entra no checkout. Diferenças que os workers
+    enviarem durante a reconstrução podem ser contadas duas vezes: rode com
+    pouco movimento ou com a API parada.
+    """
+    import pymysql.cursors
+
+    import consultas
+
+    entradas, segundos = _zeros(), _zeros()
+    total = 0
+    with conexao.cursor(pymysql.cursors.SSCursor) as cursor:
+        cursor.execute(consultas.SESSOES_PARA_OCUPACAO)
+        while True:
+            linhas = cursor.fetchmany(lote)
+            if not linhas:
+                break
+            for horario_entrada, horario_saida in linhas:
+                entradas[faixa_de(horario_entrada)] += 1
+                if horario_saida is not None:
+                    somar_periodo(segundos, horario_entrada, horario_saida)
+            total += len(linhas)
+
+    parametros = [valor for faixa in range(FAIXAS) for valor in (faixa, entradas[faixa], segundos[faixa])]
+    with conexao.cursor() as cursor:
+        cursor.execute(consultas.substituir_ocupacao(FAIXAS), parametros)
+    return total
+
+
+def principal(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Histogramas de ocupação do estacionamento")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+    comandos.add_parser("reconstruir", help="Recalcula ocupacao_faixas a partir das sessões existentes")
+    parser.parse_args(argv)
+
+    from db import ConfiguracaoBancoAusenteError
+    from migrar import conectar
+
+    try:
+        conexao = conectar()
+    except ConfiguracaoBancoAusenteError as e:
+        print(e, file=sys.stderr)
+        return 2
+    try:
+        total = reconstruir(conexao)
+    finally:
+        conexao.close()
+    print(f"{total} sessões processadas")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(principal())
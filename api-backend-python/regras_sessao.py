@@ -0,0 +1,112 @@
+# regras_sessao.py - REGRAS DE ENTRADA/SAÍDA COMPARTILHADAS PELAS ROTAS DE SESSÃO
+#
+# As rotas individuais (/sessoes/checkin, /sessoes/checkout) e a ingestão em
+# lote das cancelas (/sessoes/lote) usam as mesmas validações e a mesma
+# tarifa. O planejamento do lote roda em memória, sem banco: recebe as
+# sessões ativas já travadas e devolve o que gravar e o resultado de cada
+# evento.
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+from tarifas import Tarifa
+
+SESSAO_JA_ATIVA = "Usuário já possui uma sessão de estacionamento ativa."
+SEM_SESSAO_ATIVA = "Nenhuma sessão ativa encontrada."
+SAIDA_ANTES_DA_ENTRADA = "O horário de saída é anterior ao de entrada."
+HORARIO_NO_FUTURO = "O horário do evento está no futuro."
+USUARIO_NAO_ENCONTRADO = "Usuário não encontrado."
+
+# Diferença aceita entre o relógio das cancelas e o do servidor.
+TOLERANCIA_RELOGIO = timedelta(minutes=5)
+
+
+class RegraSessaoError(Exception):
+    """Evento recusado; `status_code` e `detail` seguem as rotas HTTP."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def conferir_entrada(sessao_ativa: Optional[dict]):
+    if sessao_ativa:
+        raise RegraSessaoError(409, SESSAO_JA_ATIVA)
+
+
+def valor_da_saida(tarifa: Tarifa, sessao_ativa: Optional[dict], horario_saida: datetime) -> Decimal:
+    if not sessao_ativa:
+        raise RegraSessaoError(404, SEM_SESSAO_ATIVA)
+    if horario_saida < sessao_ativa['horario_entrada']:
+        raise RegraSessaoError(422, SAIDA_ANTES_DA_ENTRADA)
+    return tarifa.calcular(sessao_ativa['horario_entrada'], horario_saida)
+
+
+class EventoLote(NamedTuple):
+    indice: int
+    tipo: str  # "checkin" ou "checkout"
+    usuario_id: int
+    horario: datetime
+
+
+class PlanoLote(NamedTuple):
+    # sessao_id -> (horario_saida, valor_pago) de sessões que já estavam ativas
+    finalizar: Dict[int, tuple]
+    # sessões novas, na ordem dos eventos: dicts com usuario_id, horario_entrada,
+    # horario_saida, valor_pago, status e os índices dos eventos que a citam
+    novas: List[dict]
+    # resultado por índice do evento (sessao_id das novas é preenchido após o INSERT)
+    resultados: Dict[int, dict]
+    # estado final por usuário tocado: (sessão ativa ou None, valor do último checkout)
+    estado_final: Dict[int, tuple]
+
+
+def planejar_lote(tarifa: Tarifa, eventos: List[EventoLote], sessoes_ativas: Dict[int, Optional[dict]]) -> PlanoLote:
+    """
+    Aplica os eventos em ordem de horário (empates na ordem recebida) sobre
+    as sessões ativas de cada usuário, com as mesmas regras das rotas
+    individuais. `sessoes_ativas` tem uma chave por usuário existente
+    (None se ele não tiver sessão ativa).
+    """
+    ativas: Dict[int, Optional[dict]] = dict(sessoes_ativas)
+    finalizar: Dict[int, tuple] = {}
+    novas: List[dict] = []
+    resultados: Dict[int, dict] = {}
+    ultimo_valor: Dict[int, Optional[Decimal]] = {}
+
+    for evento in sorted(eventos, key=lambda e: (e.horario, e.indice)):
+        sessao = ativas.get(evento.usuario_id)
+        try:
+            if evento.usuario_id not in ativas:
+                raise RegraSessaoError(404, USUARIO_NAO_ENCONTRADO)
+            if evento.tipo == "checkin":
+                conferir_entrada(sessao)
+                nova = {
+                    "usuario_id": evento.usuario_id, "horario_entrada": evento.horario,
+                    "horario_saida": None, "valor_pago": None, "status": "ATIVA", "eventos": [evento.indice],
+                }
+                novas.append(nova)
+                ativas[evento.usuario_id] = nova
+                ultimo_valor[evento.usuario_id] = None
+                resultados[evento.indice] = {"indice": evento.indice, "status_code": 201}
+            else:
+                valor = valor_da_saida(tarifa, sessao, evento.horario)
+                if "eventos" in sessao:  # criada neste mesmo lote
+                    sessao.update(horario_saida=evento.horario, valor_pago=valor, status="FINALIZADA")
+                    sessao["eventos"].append(evento.indice)
+                else:
+                    finalizar[sessao['id']] = (evento.horario, valor)
+                ativas[evento.usuario_id] = None
+                ultimo_valor[evento.usuario_id] = valor
+                resultados[evento.indice] = {
+                    "indice": evento.indice, "status_code": 200, "sessao_id": sessao.get('id'), "valor_pago": valor,
+                }
+        except RegraSessaoError as err:
+            resultados[evento.indice] = {"indice": evento.indice, "status_code": err.status_code, "detail": err.detail}
+
+    estado_final = {
+        usuario_id: (ativas.get(usuario_id), valor) for usuario_id, valor in ultimo_valor.items()
+    }
+    return PlanoLote(finalizar, novas, resultados, estado_final)
@@ -0,0 +1,297 @@
+# relatorios.py - RELATÓRIOS OPERACIONAIS (RECEITA, PERMANÊNCIA, GIRO, BANDEIRAS)
+#
+# Sessões e pagamentos de um período são lidos em fluxo (cursor do lado do
+# servidor), em blocos de `lote` linhas convertidos em arrays numpy, e cada
+# bloco é somado a acumuladores de tamanho fixo (um valor por dia, por hora,
+# por minuto de permanência ou por bandeira). A memória não depende do
+# tamanho das tabelas. Usado pelas rotas /admin/relatorios e pela linha de
+# comando:
+#
+#   DB_SSL_CA= python relatorios.py --inicio 2026-10-01 --fim 2026-10-31
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import chain
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+import bandeiras
+import consultas
+from tarifas import centavos_para_decimal
+
+if TYPE_CHECKING:
+    # O numpy só é importado quando um relatório é calculado: a API inteira
+    # depende deste módulo e não deve pagar o import na inicialização.
+    import numpy as np
+
+LOTE_PADRAO = 20000
+SEGUNDOS_DIA = 86400
+# Permanências são contadas por minuto até aqui; as mais longas caem no último.
+PERMANENCIA_MAX_MINUTOS = 48 * 60
+INDICADORES = ("receita", "permanencia", "giro", "bandeiras")
+
+
+class PeriodoInvalidoError(ValueError):
+    pass
+
+
+def dias_do_periodo(inicio: date, fim: date, max_dias: int = 366) -> int:
+    """Quantidade de dias de `inicio` a `fim`, inclusive."""
+    dias = (fim - inicio).days + 1
+    if dias < 1:
+        raise PeriodoInvalidoError("A data final é anterior à inicial.")
+    if dias > max_dias:
+        raise PeriodoInvalidoError(f"O período pode ter no máximo {max_dias} dias.")
+    return dias
+
+
+def _percentil(histograma: "np.ndarray", fracao: float) -> Optional[int]:
+    import numpy as np
+
+    total = int(histograma.sum())
+    if not total:
+        return None
+    return int(np.searchsorted(np.cumsum(histograma), fracao * total))
+
+
+def para_array(linhas: List[tuple]) -> "np.ndarray":
+    """Bloco de tuplas do cursor -> array int64 (n, colunas), sem passar por objetos intermediários."""
+    import numpy as np
+
+    colunas = len(linhas[0])
+    return np.fromiter(chain.from_iterable(linhas), dtype=np.int64, count=len(linhas) * colunas).reshape(-1, colunas)
+
+
+class AcumuladorRelatorio:
+    """Agregados de um período, alimentados bloco a bloco."""
+
+    def __init__(self, inicio: date, dias: int, capacidade: int):
+        import numpy as np
+
+        self.inicio = inicio
+        self.dias = dias
+        self.capacidade = capacidade
+
+        self.receita_dia = np.zeros(dias, dtype=np.int64)
+        self.pagamentos_dia = np.zeros(dias, dtype=np.int64)
+        self.bandeiras_quantidade = np.zeros(len(bandeiras.NOMES), dtype=np.int64)
+        self.bandeiras_receita = np.zeros(len(bandeiras.NOMES), dtype=np.int64)
+        self.saidas_hora = np.zeros(24, dtype=np.int64)
+        self.permanencia_minutos = np.zeros(PERMANENCIA_MAX_MINUTOS + 1, dtype=np.int64)
+        self.permanencia_soma = 0
+        self.linhas = 0
+
+    def consultas(self):
+        """(sql, parâmetros, função que recebe cada bloco) de cada leitura."""
+        inicio = datetime.combine(self.inicio, datetime.min.time())
+        fim = inicio + timedelta(days=self.dias)
+        return [
+            # Parâmetros repetidos: tabela quente e de arquivo.
+            (consultas.PAGAMENTOS_PARA_RELATORIO, (inicio, inicio, fim) * 2, self.adicionar_pagamentos),
+            (consultas.SESSOES_PARA_RELATORIO, (inicio, inicio, inicio, fim) * 2, self.adicionar_sessoes),
+        ]
+
+    def adicionar_pagamentos(self, bloco: "np.ndarray"):
+        """Colunas: segundos da saída desde o início, centavos, número do cartão."""
+        import numpy as np
+
+        dia = bloco[:, 0] // SEGUNDOS_DIA
+        centavos = bloco[:, 1]
+        self.receita_dia += np.bincount(dia, weights=centavos, minlength=self.dias).astype(np.int64)
+        self.pagamentos_dia += np.bincount(dia, minlength=self.dias)
+        codigos = bandeiras.codigos(bloco[:, 2])
+        self.bandeiras_quantidade += np.bincount(codigos, minlength=len(bandeiras.NOMES))
+        self.bandeiras_receita += np.bincount(codigos, weights=centavos, minlength=len(bandeiras.NOMES)).astype(np.int64)
+        self.linhas += len(bloco)
+
+    def adicionar_sessoes(self, bloco: "np.ndarray"):
+        """Colunas: segundos da entrada e da saída desde o início."""
+        import numpy as np
+
+        duracao = np.maximum(bloco[:, 1] - bloco[:, 0], 0)
+        self.permanencia_soma += int(duracao.sum())
+        self.permanencia_minutos += np.bincount(
+            np.minimum(duracao // 60, PERMANENCIA_MAX_MINUTOS), minlength=PERMANENCIA_MAX_MINUTOS + 1
+        )
+        self.saidas_hora += np.bincount((bloco[:, 1] // 3600) % 24, minlength=24)
+        self.linhas += len(bloco)
+
+    def resultado(self) -> dict:
+        sessoes = int(self.permanencia_minutos.sum())
+        vagas_dia = self.capacidade * self.dias
+        return {
+            "inicio": self.inicio.isoformat(),
+            "fim": (self.inicio + timedelta(days=self.dias - 1)).isoformat(),
+            "receita": {
+                "total": centavos_para_decimal(self.receita_dia.sum()),
+                "pagamentos": int(self.pagamentos_dia.sum()),
+                "por_dia": [
+                    {
+                        "data": (self.inicio + timedelta(days=dia)).isoformat(),
+                        "receita": centavos_para_decimal(self.receita_dia[dia]),
+                        "pagamentos": int(self.pagamentos_dia[dia]),
+                    }
+                    for dia in range(self.dias)
+                ],
+            },
+            "permanencia": {
+                "sessoes": sessoes,
+                "media_minutos": round(self.permanencia_soma / sessoes / 60, 1) if sessoes else None,
+                "mediana_minutos": _percentil(self.permanencia_minutos, 0.5),
+                "p90_minutos": _percentil(self.permanencia_minutos, 0.9),
+            },
+            "giro": {
+                # Veículos por vaga por dia, no período e em cada hora do dia.
+                "capacidade": self.capacidade,
+                "por_vaga_dia": round(sessoes / vagas_dia, 3),
+                "por_hora": [
+                    {"hora": hora, "saidas": int(self.saidas_hora[hora]), "por_vaga_dia": round(self.saidas_hora[hora] / vagas_dia, 4)}
+                    for hora in range(24)
+                ],
+            },
+            "bandeiras": [
+                {
+                    "bandeira": nome,
+                    "pagamentos": int(self.bandeiras_quantidade[codigo]),
+                    "receita": centavos_para_decimal(self.bandeiras_receita[codigo]),
+                }
+                for codigo, nome in sorted(enumerate(bandeiras.NOMES), key=lambda item: -self.bandeiras_quantidade[item[0]])
+                if self.bandeiras_quantidade[codigo]
+            ],
+        }
+
+
+async def calcular(db, cursor_stream, inicio: date, fim: date, capacidade: int, lote: int = LOTE_PADRAO) -> dict:
+    """Relatório lendo por uma conexão aiomysql; `cursor_stream` devolve tuplas (SSCursor)."""
+    acumulador = AcumuladorRelatorio(inicio, dias_do_periodo(inicio, fim), capacidade)
+    for sql, parametros, adicionar in acumulador.consultas():
+        cursor = await db.cursor(cursor_stream)
+        try:
+            await cursor.execute(sql, parametros)
+            while True:
+                linhas = await cursor.fetchmany(lote)
+                if not linhas:
+                    break
+                adicionar(para_array(linhas))
+        except BaseException:
+            # Leitura interrompida: fechar a conexão (o pool a descarta) sai
+            # mais barato que drenar as linhas restantes.
+            db.close()
+            raise
+        await cursor.close()
+    return acumulador.resultado()
+
+
+def calcular_sincrono(conexao, inicio: date, fim: date, capacidade: int, lote: int = LOTE_PADRAO) -> dict:
+    """O mesmo relatório por uma conexão pymysql (linha de comando)."""
+    import pymysql.cursors
+
+    acumulador = AcumuladorRelatorio(inicio, dias_do_periodo(inicio, fim), capacidade)
+    for sql, parametros, adicionar in acumulador.consultas():
+        with conexao.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(sql, parametros)
+            while True:
+                linhas = cursor.fetchmany(lote)
+                if not linhas:
+                    break
+                adicionar(para_array(linhas))
+    return acumulador.resultado()
+
+
+class CacheRelatorios:
+    """
+    Relatórios já calculados por período (LRU, por `ttl` segundos). Um
+    checkout ou pagamento gravado invalida os períodos que contêm a data de
+    saída; o TTL limita a defasagem em relação ao que outros workers gravam.
+    """
+
+    def __init__(self, capacidade: int = 64, ttl: float = 300.0):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._itens: "OrderedDict[Tuple[date, date], Tuple[float, dict]]" = OrderedDict()
+
+        self.acertos = 0
+        self.faltas = 0
+        self.invalidacoes = 0
+
+    @classmethod
+    def do_ambiente(cls) -> "CacheRelatorios":
+        return cls(
+            capacidade=int(os.environ.get("RELATORIOS_CACHE_CAPACIDADE", "64")),
+            ttl=float(os.environ.get("RELATORIOS_CACHE_TTL", "300")),
+        )
+
+    def obter(self, inicio: date, fim: date) -> Optional[dict]:
+        item = self._itens.get((inicio, fim))
+        if item is not None and item[0] > time.monotonic():
+            self._itens.move_to_end((inicio, fim))
+            self.acertos += 1
+            return item[1]
+        self._itens.pop((inicio, fim), None)
+        self.faltas += 1
+        return None
+
+    def guardar(self, inicio: date, fim: date, relatorio: dict):
+        self._itens[(inicio, fim)] = (time.monotonic() + self.ttl, relatorio)
+        self._itens.move_to_end((inicio, fim))
+        while len(self._itens) > self.capacidade:
+            self._itens.popitem(last=False)
+
+    def invalidar_data(self, dia: date):
+        for periodo in [periodo for periodo in self._itens if periodo[0] <= dia <= periodo[1]]:
+            del self._itens[periodo]
+            self.invalidacoes += 1
+
+    def estatisticas(self) -> dict:
+        return {
+            "capacidade": self.capacidade,
+            "periodos": len(self._itens),
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "invalidacoes": self.invalidacoes,
+        }
+
+
+def _json(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def principal(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Relatórios de receita, permanência, giro e bandeiras")
+    parser.add_argument("--inicio", type=date.fromisoformat, required=True, help="Primeiro dia (AAAA-MM-DD)")
+    parser.add_argument("--fim", type=date.fromisoformat, required=True, help="Último dia, inclusive")
+    parser.add_argument("--capacidade", type=int, default=int(os.environ.get("ESTACIONAMENTO_CAPACIDADE", "100")))
+    parser.add_argument("--lote", type=int, default=LOTE_PADRAO, help="Linhas lidas do banco por bloco")
+    parser.add_argument("--indicador", choices=INDICADORES, help="Só um dos indicadores")
+    args = parser.parse_args(argv)
+
+    from db import ConfiguracaoBancoAusenteError
+    from migrar import conectar
+
+    try:
+        conexao = conectar()
+    except ConfiguracaoBancoAusenteError as e:
+        print(e, file=sys.stderr)
+        return 2
+    try:
+        relatorio = calcular_sincrono(conexao, args.inicio, args.fim, args.capacidade, args.lote)
+    except PeriodoInvalidoError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        conexao.close()
+    if args.indicador:
+        relatorio = {chave: relatorio[chave] for chave in ("inicio", "fim", args.indicador)}
+    print(json.dumps(relatorio, default=_json, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(principal())
@@ -0,0 +1,168 @@
+# respostas.py - SERIALIZAÇÃO JSON RÁPIDA E COMPRESSÃO DAS RESPOSTAS
+#
+# RespostaJSON serializa com orjson (quando instalado) e aceita direto as
+# linhas do banco: datetime sai em ISO 8601 e Decimal como string, igual ao
+# que o Pydantic produz para os response_model (Pagamento.valor_pago).
+# Rotas que só repassam linhas do banco devolvem RespostaJSON(linhas) e
+# evitam validar e serializar cada item de novo.
+#
+# MiddlewareCompressao comprime respostas a partir de um tamanho mínimo:
+# brotli quando o cliente aceita e o pacote `brotli` está instalado, senão
+# gzip (o GZipMiddleware do Starlette). O brotli é um middleware ASGI
+# próprio: não depende de classes internas do Starlette.
+
+import json
+import os
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+
+import anyio.to_thread
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+
+try:
+    import orjson
+except ImportError:  # o json da biblioteca padrão, mais lento, com o mesmo resultado
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+NIVEL_GZIP = 6  # o padrão do Starlette (9) custa bem mais CPU por pouca diferença de tamanho
+QUALIDADE_BROTLI = 4
+LIMITE_THREAD = 128 * 1024
+
+
+def _padrao(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def serializar(conteudo) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(conteudo, default=_padrao, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(conteudo, default=_padrao, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RespostaJSON(JSONResponse):
+    def render(self, content) -> bytes:
+        return serializar(content)
+
+
+# Respostas que não passam pelo brotli: já comprimidas ou de fluxo contínuo (SSE).
+TIPOS_SEM_COMPRESSAO = ("text/event-stream", "application/gzip", "application/zip", "image/", "audio/", "video/", "font/woff")
+
+
+class _RespostaBrotli:
+    """
+    Envia uma resposta comprimida com brotli. Só usa a interface ASGI: as
+    mensagens de início ficam retidas até o primeiro corpo dizer se vale a
+    pena comprimir (tamanho mínimo ou resposta em partes).
+    """
+
+    def __init__(self, send, minimo: int, qualidade: int):
+        self.send = send
+        self.minimo = minimo
+        self.qualidade = qualidade
+        self.inicio: Optional[dict] = None
+        self.repassar = False
+        self._compressor = None
+
+    async def enviar(self, mensagem: dict):
+        tipo = mensagem["type"]
+        if tipo == "http.response.start":
+            headers = Headers(raw=mensagem["headers"])
+            tipo_conteudo = headers.get("content-type", "").lower()
+            self.repassar = (
+                "content-encoding" in headers
+                or mensagem["status"] == 206
+                or tipo_conteudo.startswith(TIPOS_SEM_COMPRESSAO)
+            )
+            if self.repassar:
+                await self.send(mensagem)
+            else:
+                self.inicio = mensagem
+            return
+        if self.repassar or tipo != "http.response.body":
+            # pathsend, trailers etc.: a resposta segue sem compressão.
+            if self.inicio is not None:
+                await self.send(self.inicio)
+                self.inicio = None
+            await self.send(mensagem)
+            return
+
+        corpo = mensagem.get("body", b"")
+        mais = mensagem.get("more_body", False)
+        if self.inicio is not None:
+            inicio, self.inicio = self.inicio, None
+            if len(corpo) < self.minimo and not mais:
+                self.repassar = True
+                await self.send(inicio)
+                await self.send(mensagem)
+                return
+            headers = MutableHeaders(raw=inicio["headers"])
+            headers["Content-Encoding"] = "br"
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            corpo = await self._comprimir(corpo, mais)
+            if not mais:
+                headers["Content-Length"] = str(len(corpo))
+            await self.send(inicio)
+        else:
+            corpo = await self._comprimir(corpo, mais)
+        await self.send({"type": "http.response.body", "body": corpo, "more_body": mais})
+
+    async def _comprimir(self, corpo: bytes, mais: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.qualidade)
+        if len(corpo) >= LIMITE_THREAD:
+            # Corpos grandes não bloqueiam o event loop.
+            return await anyio.to_thread.run_sync(self._processar, corpo, mais)
+        return self._processar(corpo, mais)
+
+    def _processar(self, corpo: bytes, mais: bool) -> bytes:
+        saida = self._compressor.process(corpo)
+        return saida + (self._compressor.flush() if mais else self._compressor.finish())
+
+
+def _aceita_brotli(accept_encoding: str) -> bool:
+    for item in accept_encoding.split(","):
+        nome, _, parametros = item.partition(";")
+        if nome.strip().lower() == "br":
+            return parametros.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class MiddlewareCompressao:
+    """
+    Comprime com brotli ou gzip as respostas de `minimo` bytes ou mais. O
+    gzip fica com o GZipMiddleware do Starlette, usado só pela interface
+    pública (o construtor e a chamada ASGI).
+    """
+
+    def __init__(self, app, minimo: int = 1024):
+        self.app = app
+        self.minimo = minimo
+        self._gzip = GZipMiddleware(app, minimum_size=minimo, compresslevel=NIVEL_GZIP)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and brotli is not None:
+            if _aceita_brotli(Headers(scope=scope).get("Accept-Encoding", "")):
+                resposta = _RespostaBrotli(send, self.minimo, QUALIDADE_BROTLI)
+                await self.app(scope, receive, resposta.enviar)
+                return
+        await self._gzip(scope, receive, send)
+
+
+def minimo_compressao_do_ambiente() -> Optional[int]:
+    """COMPRESSAO_MINIMO_BYTES (padrão 1024); vazio desliga a compressão."""
+    valor = os.environ.get("COMPRESSAO_MINIMO_BYTES", "1024")
+    return int(valor) if valor else None
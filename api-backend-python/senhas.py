@@ -0,0 +1,112 @@
+# senhas.py - HASH DE SENHAS (BCRYPT) EM UM POOL DE PROCESSOS LIMITADO
+
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+# Custo do bcrypt (log2 das iterações). Hashes com outro custo são
+# refeitos de forma transparente no próximo login bem-sucedido.
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+_pwd_context = None
+
+
+def _contexto():
+    # Criado sob demanda em cada processo do pool (e só lá o passlib é importado).
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _pwd_context
+
+
+def gerar_hash(senha: str) -> str:
+    return _contexto().hash(senha)
+
+
+def verificar_e_atualizar(senha_plana: str, senha_hashed: str) -> Tuple[bool, Optional[str]]:
+    """(senha confere?, novo hash se o atual estiver obsoleto)"""
+    return _contexto().verify_and_update(senha_plana, senha_hashed)
+
+
+class SobrecargaError(Exception):
+    """A fila do pool de senhas está cheia; o cliente deve tentar mais tarde."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Muitas requisições de autenticação simultâneas.")
+        self.retry_after = retry_after
+
+
+class ExecutorSenhas:
+    """
+    Executa o bcrypt em `processos` processos dedicados, fora do event loop
+    e do threadpool das rotas. No máximo `limite_fila` operações ficam
+    pendentes (em execução ou aguardando); acima disso a requisição é
+    recusada na hora, em vez de esperar e estourar a latência de todos.
+    """
+
+    def __init__(self, processos: int, limite_fila: int):
+        self.processos = processos
+        self.limite_fila = limite_fila
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pendentes = 0
+
+        self.concluidas = 0
+        self.rejeitadas = 0
+        self._tempo_total = 0.0
+
+    @classmethod
+    def do_ambiente(cls) -> "ExecutorSenhas":
+        processos = int(os.environ.get("SENHAS_PROCESSOS", str(max(1, (os.cpu_count() or 2) // 2))))
+        return cls(processos, int(os.environ.get("SENHAS_FILA_MAX", str(processos * 8))))
+
+    def iniciar(self):
+        if self._pool is None:
+            # "spawn": os filhos não herdam o event loop nem as conexões abertas.
+            self._pool = ProcessPoolExecutor(self.processos, mp_context=multiprocessing.get_context("spawn"))
+
+    def encerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _retry_after(self) -> int:
+        tempo_medio = self._tempo_total / self.concluidas if self.concluidas else 0.25
+        return max(1, math.ceil(self._pendentes / self.processos * tempo_medio))
+
+    async def _executar(self, funcao, *args):
+        if self._pendentes >= self.limite_fila:
+            self.rejeitadas += 1
+            raise SobrecargaError(self._retry_after())
+
+        self.iniciar()
+        self._pendentes += 1
+        inicio = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._pool, funcao, *args)
+        finally:
+            self._pendentes -= 1
+            self.concluidas += 1
+            self._tempo_total += time.monotonic() - inicio
+
+    async def gerar_hash(self, senha: str) -> str:
+        return await self._executar(gerar_hash, senha)
+
+    async def verificar(self, senha_plana: str, senha_hashed: str) -> Tuple[bool, Optional[str]]:
+        return await self._executar(verificar_e_atualizar, senha_plana, senha_hashed)
+
+    def estatisticas(self) -> dict:
+        return {
+            "processos": self.processos,
+            "limite_fila": self.limite_fila,
+            "pendentes": self._pendentes,
+            "concluidas": self.concluidas,
+            "rejeitadas": self.rejeitadas,
+            "tempo_medio_ms": round(1000 * self._tempo_total / self.concluidas, 2) if self.concluidas else 0.0,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+        }
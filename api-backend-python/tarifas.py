@@ -0,0 +1,230 @@
+# tarifas.py - MOTOR DE TARIFAS DO ESTACIONAMENTO
+#
+# Uma definição de tarifa (dict/JSON) é compilada uma vez em tabelas de
+# somas acumuladas sobre os 10080 minutos da semana. Depois disso, o valor
+# de qualquer sessão sai em tempo constante por janela de 24h (sem percorrer
+# as frações uma a uma), em centavos inteiros, e é entregue como Decimal.
+#
+# Definição (todos os campos são opcionais, exceto valor_fracao):
+#
+#   {
+#     "carencia_minutos": 10,          # sessões até aqui não pagam nada
+#     "primeira_hora_minutos": 60,     # duração do bloco inicial (cobrança mínima)
+#     "primeira_hora": "8.00",         # preço do bloco inicial (padrão: valor_fracao)
+#     "fracao_minutos": 15,            # granularidade depois do bloco inicial
+#     "valor_fracao": "2.00",          # preço de cada fração
+#     "teto_diario": "40.00",          # máximo cobrado a cada 24h de permanência
+#     "tabelas": [                     # preços por dia/horário (a última que cobrir vence)
+#       {"dias": [5, 6], "valor_fracao": "1.00"},
+#       {"dias": [0, 1, 2, 3, 4], "inicio": "22:00", "fim": "06:00", "valor_fracao": "1.50"}
+#     ]
+#   }
+#
+# Dias seguem datetime.weekday() (0 = segunda). Uma faixa com fim <= inicio
+# atravessa a meia-noite e pertence ao dia em que começa. Cada fração é
+# cobrada pela tabela vigente no minuto em que ela começa. Os horários são
+# os mesmos do relógio em que as sessões são gravadas.
+
+import json
+import math
+import os
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+MINUTOS_DIA = 24 * 60
+MINUTOS_SEMANA = 7 * MINUTOS_DIA
+
+# Mesma regra que estava fixa nas rotas: R$ 5,00 por hora iniciada, mínimo de uma hora.
+DEFINICAO_PADRAO = {
+    "carencia_minutos": 0,
+    "primeira_hora_minutos": 60,
+    "fracao_minutos": 60,
+    "valor_fracao": "5.00",
+}
+
+
+class TarifaInvalidaError(ValueError):
+    """A definição de tarifa não pode ser compilada."""
+
+
+def _centavos(valor) -> int:
+    centavos = Decimal(str(valor)) * 100
+    if centavos != centavos.to_integral_value() or centavos < 0:
+        raise TarifaInvalidaError(f"Valor monetário inválido: {valor!r}")
+    return int(centavos)
+
+
+def _minuto_do_dia(texto: str) -> int:
+    try:
+        horas, minutos = (int(parte) for parte in texto.split(":"))
+    except ValueError:
+        raise TarifaInvalidaError(f"Horário inválido: {texto!r} (use HH:MM)")
+    if not (0 <= horas <= 24 and 0 <= minutos < 60) or horas * 60 + minutos > MINUTOS_DIA:
+        raise TarifaInvalidaError(f"Horário inválido: {texto!r}")
+    return horas * 60 + minutos
+
+
+def centavos_para_decimal(centavos: int) -> Decimal:
+    return Decimal(int(centavos)).scaleb(-2)
+
+
+class Tarifa:
+    """Tarifa compilada. Instâncias são imutáveis e podem ser compartilhadas."""
+
+    def __init__(self, definicao: dict):
+        self.definicao = definicao
+        try:
+            self.carencia = int(definicao.get("carencia_minutos", 0))
+            self.primeira = int(definicao.get("primeira_hora_minutos", 60))
+            self.fracao = int(definicao.get("fracao_minutos", 60))
+            valor_fracao = _centavos(definicao["valor_fracao"])
+        except KeyError:
+            raise TarifaInvalidaError("A tarifa precisa de 'valor_fracao'.")
+        except (TypeError, ValueError) as err:
+            if isinstance(err, TarifaInvalidaError):
+                raise
+            raise TarifaInvalidaError(str(err))
+
+        if self.carencia < 0 or not (0 < self.primeira <= MINUTOS_DIA):
+            raise TarifaInvalidaError("carencia_minutos e primeira_hora_minutos fora dos limites.")
+        if self.fracao <= 0 or MINUTOS_SEMANA % self.fracao:
+            raise TarifaInvalidaError("fracao_minutos precisa dividir os 10080 minutos da semana.")
+
+        self.preco_primeira = _centavos(definicao.get("primeira_hora", definicao["valor_fracao"]))
+        teto = definicao.get("teto_diario")
+        self.teto_diario: Optional[int] = _centavos(teto) if teto is not None else None
+
+        # Preço (centavos) de uma fração que começa em cada minuto da semana.
+        precos = [valor_fracao] * MINUTOS_SEMANA
+        for tabela in definicao.get("tabelas", []):
+            if "valor_fracao" not in tabela:
+                raise TarifaInvalidaError("Toda tabela precisa de 'valor_fracao'.")
+            preco = _centavos(tabela["valor_fracao"])
+            inicio = _minuto_do_dia(tabela.get("inicio", "00:00"))
+            fim = _minuto_do_dia(tabela.get("fim", "24:00"))
+            duracao = (fim - inicio) % MINUTOS_DIA or MINUTOS_DIA
+            for dia in tabela.get("dias", range(7)):
+                if not 0 <= int(dia) <= 6:
+                    raise TarifaInvalidaError(f"Dia da semana inválido: {dia!r}")
+                primeiro = int(dia) * MINUTOS_DIA + inicio
+                for minuto in range(primeiro, primeiro + duracao):
+                    precos[minuto % MINUTOS_SEMANA] = preco
+        self._precos = precos
+
+        # As frações que começam num minuto com resto r (mod fracao) só passam
+        # por minutos com esse mesmo resto. Para cada r, guarda a soma acumulada
+        # dos preços ao longo da semana, duas voltas seguidas: qualquer
+        # sequência de frações vira uma subtração.
+        self._ciclo = MINUTOS_SEMANA // self.fracao
+        self._acumulado: List[List[int]] = []
+        for resto in range(self.fracao):
+            linha = [0]
+            for volta in range(2 * self._ciclo):
+                linha.append(linha[-1] + precos[(resto + volta * self.fracao) % MINUTOS_SEMANA])
+            self._acumulado.append(linha)
+        self._total_ciclo = [linha[self._ciclo] for linha in self._acumulado]
+        self._numpy = None
+
+    @classmethod
+    def do_arquivo(cls, caminho: str) -> "Tarifa":
+        with open(caminho, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def do_ambiente(cls) -> "Tarifa":
+        """Tarifa do JSON em TARIFA_ARQUIVO, ou a regra padrão."""
+        caminho = os.environ.get("TARIFA_ARQUIVO")
+        return cls.do_arquivo(caminho) if caminho else cls(DEFINICAO_PADRAO)
+
+    # --- Cálculo de uma sessão ---
+
+    def _soma(self, minuto_semana: int, quantidade: int) -> int:
+        """Soma de `quantidade` frações seguidas, a primeira começando em `minuto_semana`."""
+        resto, indice = minuto_semana % self.fracao, minuto_semana // self.fracao
+        voltas, sobra = divmod(quantidade, self._ciclo)
+        acumulado = self._acumulado[resto]
+        return voltas * self._total_ciclo[resto] + acumulado[indice + sobra] - acumulado[indice]
+
+    def calcular_centavos(self, minuto_semana: int, minutos: int) -> int:
+        """Valor de uma permanência de `minutos` iniciada no minuto da semana dado."""
+        if self.carencia and minutos <= self.carencia:
+            return 0
+        fracoes = max(0, -(-(minutos - self.primeira) // self.fracao))
+        inicio_fracoes = minuto_semana + self.primeira
+
+        if self.teto_diario is None:
+            return self.preco_primeira + self._soma(inicio_fracoes % MINUTOS_SEMANA, fracoes)
+
+        # Com teto: cada janela de 24h (contada da entrada) é limitada separadamente.
+        # Uma fração pertence à janela em que começa.
+        total = 0
+        feitas = 0
+        janela = 0
+        while feitas < fracoes or janela == 0:
+            fim_janela = (janela + 1) * MINUTOS_DIA - self.primeira
+            ate = min(fracoes, max(0, -(-fim_janela // self.fracao)))
+            valor = self._soma((inicio_fracoes + feitas * self.fracao) % MINUTOS_SEMANA, ate - feitas)
+            if janela == 0:
+                valor += self.preco_primeira
+            total += min(valor, self.teto_diario)
+            feitas = ate
+            janela += 1
+        return total
+
+    def calcular(self, horario_entrada: datetime, horario_saida: datetime) -> Decimal:
+        minutos = max(0, math.ceil((horario_saida - horario_entrada).total_seconds() / 60))
+        minuto_semana = horario_entrada.weekday() * MINUTOS_DIA + horario_entrada.hour * 60 + horario_entrada.minute
+        return centavos_para_decimal(self.calcular_centavos(minuto_semana, minutos))
+
+    # --- Cálculo em lote (numpy) ---
+
+    def _tabelas_numpy(self):
+        if self._numpy is None:
+            import numpy as np
+
+            self._numpy = (np.array(self._acumulado, dtype=np.int64), np.array(self._total_ciclo, dtype=np.int64))
+        return self._numpy
+
+    def _soma_lote(self, np, minuto_semana, quantidade):
+        acumulado, total_ciclo = self._tabelas_numpy()
+        indice, resto = np.divmod(minuto_semana, self.fracao)
+        voltas, sobra = np.divmod(quantidade, self._ciclo)
+        return voltas * total_ciclo[resto] + acumulado[resto, indice + sobra] - acumulado[resto, indice]
+
+    def calcular_lote(self, horarios_entrada: Sequence, horarios_saida: Sequence):
+        """
+        Valores em centavos (array int64) de muitas sessões de uma vez, para
+        recalcular o histórico quando a tarifa muda. Aceita arrays numpy
+        datetime64 ou listas de datetime (a conversão das listas custa mais
+        que o cálculo). O resultado é igual ao de `calcular`.
+        """
+        import numpy as np
+
+        entradas = np.asarray(horarios_entrada, dtype="datetime64[us]")
+        saidas = np.asarray(horarios_saida, dtype="datetime64[us]")
+        microssegundos = (saidas - entradas).astype(np.int64)
+        minutos = np.maximum(0, -(-microssegundos // 60_000_000))
+        # 01/01/1970 foi uma quinta-feira (weekday 3).
+        minuto_semana = (entradas.astype("datetime64[m]").astype(np.int64) + 3 * MINUTOS_DIA) % MINUTOS_SEMANA
+
+        fracoes = np.maximum(0, -(-(minutos - self.primeira) // self.fracao))
+        inicio_fracoes = minuto_semana + self.primeira
+
+        if self.teto_diario is None:
+            total = self.preco_primeira + self._soma_lote(np, inicio_fracoes % MINUTOS_SEMANA, fracoes)
+        else:
+            total = np.zeros(len(minutos), dtype=np.int64)
+            feitas = np.zeros(len(minutos), dtype=np.int64)
+            janelas = int(-(-(int(minutos.max(initial=0)) + 1) // MINUTOS_DIA)) if len(minutos) else 0
+            for janela in range(max(janelas, 1)):
+                fim_janela = (janela + 1) * MINUTOS_DIA - self.primeira
+                ate = np.minimum(fracoes, max(0, -(-fim_janela // self.fracao)))
+                valor = self._soma_lote(np, (inicio_fracoes + feitas * self.fracao) % MINUTOS_SEMANA, ate - feitas)
+                if janela == 0:
+                    valor = valor + self.preco_primeira
+                total += np.minimum(valor, self.teto_diario)
+                feitas = ate
+        if self.carencia:
+            total = np.where(minutos <= self.carencia, 0, total)
+        return total
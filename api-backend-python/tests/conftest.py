@@ -0,0 +1,26 @@
+# conftest.py - OS TESTES IMPORTAM OS MÓDULOS DO BACKEND PELO NOME (como main.py)
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+class Relogio:
+    """
+    Relógio que só anda quando o teste manda. Substitui o módulo `time` de
+    um único módulo (monkeypatch.setattr(modulo, "time", relogio)), sem
+    parar o relógio do event loop.
+    """
+
+    def __init__(self, agora: float = 1000.0):
+        self.agora = agora
+
+    def avancar(self, segundos: float):
+        self.agora += segundos
+
+    def monotonic(self) -> float:
+        return self.agora
+
+    def time(self) -> float:
+        return self.agora
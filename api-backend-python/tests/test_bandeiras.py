@@ -0,0 +1,35 @@
+import os
+import re
+
+import bandeiras
+import migrar
+
+MIGRACAO = os.path.join(migrar.PASTA_MIGRACOES, "0005_resumo_cartoes.sql")
+
+
+def _expressao_da_migracao():
+    """Inícios de intervalo do INTERVAL() e bandeiras do ELT() do backfill da 0005."""
+    with open(MIGRACAO, encoding="utf-8") as f:
+        sql = f.read()
+    encontrado = re.search(r"INTERVAL\(\s*CAST\(.*?\) AS UNSIGNED\),(.*?)\)\s*\+\s*1,(.*?)\n\s*\)\n", sql, re.S)
+    assert encontrado, "Expressão ELT/INTERVAL não encontrada na 0005."
+    inicios = [int(valor) for valor in re.findall(r"\d+", encontrado.group(1))]
+    nomes = re.findall(r"'([^']*)'", encontrado.group(2))
+    return inicios, nomes
+
+
+def test_backfill_da_0005_usa_a_mesma_tabela_de_bandeiras_py():
+    inicios, nomes = _expressao_da_migracao()
+    # INTERVAL() conta os inícios <= BIN; o primeiro intervalo (a partir de 0) é o ELT(1).
+    assert [0] + inicios == bandeiras._INICIOS
+    assert nomes == [bandeiras.NOMES[codigo] for codigo in bandeiras._CODIGOS]
+
+
+def test_bandeira():
+    assert bandeiras.bandeira("4111 1111 1111 1111") == "Visa"
+    assert bandeiras.bandeira("4011 7812 3456 7890") == "Elo"
+    assert bandeiras.bandeira("3841 0012 3456 7890") == "Hipercard"
+    assert bandeiras.bandeira("5500000000000004") == "Mastercard"
+    assert bandeiras.bandeira("411111") == bandeiras.OUTRA
+    numeros = [4111111111111111, 4011781234567890, 3841001234567890, 411111]
+    assert [bandeiras.NOMES[c] for c in bandeiras.codigos(numeros)] == ["Visa", "Elo", "Hipercard", "Outra"]
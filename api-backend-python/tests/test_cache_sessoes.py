@@ -0,0 +1,168 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import cache_sessoes
+from cache_sessoes import BackendMemoria, BackendRedis, CacheSessoesAtivas
+from conftest import Relogio
+
+SESSAO = {"id": 7, "horario_entrada": datetime(2026, 10, 1, 8, 0)}
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(cache_sessoes, "time", relogio)
+    return relogio
+
+
+def rodar(corrotina):
+    return asyncio.run(corrotina)
+
+
+def test_preencher_guarda_leitura_sem_gravacao_concorrente(relogio):
+    cache = CacheSessoesAtivas(BackendMemoria())
+
+    async def cenario():
+        versao = await cache.versao()
+        await cache.preencher(1, SESSAO, versao)
+        return await cache.obter(1)
+
+    assert rodar(cenario()) == (True, SESSAO)
+
+
+def test_gravacao_durante_a_leitura_vence_o_preenchimento(relogio):
+    cache = CacheSessoesAtivas(BackendMemoria())
+
+    async def cenario():
+        versao = await cache.versao()  # a leitura do banco começa aqui...
+        await cache.gravar(1, None)  # ...o checkout grava no meio...
+        await cache.preencher(1, SESSAO, versao)  # ...e a leitura antiga chega depois
+        return await cache.obter(1)
+
+    assert rodar(cenario()) == (True, None)
+
+
+def test_gravacao_de_outro_usuario_nao_bloqueia_o_preenchimento(relogio):
+    cache = CacheSessoesAtivas(BackendMemoria())
+
+    async def cenario():
+        versao = await cache.versao()
+        await cache.gravar(2, None)
+        await cache.preencher(1, SESSAO, versao)
+        return await cache.obter(1)
+
+    assert rodar(cenario()) == (True, SESSAO)
+
+
+def test_ttl_positivo_e_negativo(relogio):
+    cache = CacheSessoesAtivas(BackendMemoria(), ttl=30, ttl_negativo=10)
+
+    async def cenario():
+        await cache.gravar(1, SESSAO)
+        await cache.gravar(2, None)
+        relogio.avancar(10)
+        depois_de_10s = (await cache.obter(1), await cache.obter(2))
+        relogio.avancar(20)
+        depois_de_30s = await cache.obter(1)
+        return depois_de_10s, depois_de_30s
+
+    (sessao, sem_sessao), expirada = rodar(cenario())
+    assert sessao == (True, SESSAO)
+    assert sem_sessao == (False, None)
+    assert expirada == (False, None)
+
+
+def test_lru_descarta_o_menos_usado(relogio):
+    backend = BackendMemoria(capacidade=2)
+
+    async def cenario():
+        await backend.definir(1, "a", 60)
+        await backend.definir(2, "b", 60)
+        await backend.obter(1)  # 1 passa a ser o mais recente
+        await backend.definir(3, "c", 60)
+        return [await backend.obter(chave) for chave in (1, 2, 3)]
+
+    assert rodar(cenario()) == ["a", cache_sessoes.AUSENTE, "c"]
+    assert len(backend) == 2
+
+
+def test_invalidar_remove_a_entrada(relogio):
+    cache = CacheSessoesAtivas(BackendMemoria())
+
+    async def cenario():
+        await cache.gravar(1, SESSAO)
+        await cache.invalidar(1)
+        return await cache.obter(1)
+
+    assert rodar(cenario()) == (False, None)
+
+
+class RedisFalso:
+    """
+    O subconjunto do redis-py usado pelo BackendRedis (sem expiração). Os
+    dois scripts Lua são reproduzidos em Python, comando a comando.
+    """
+
+    def __init__(self):
+        self.dados = {}
+
+    async def get(self, nome):
+        return self.dados.get(nome)
+
+    async def eval(self, script, quantidade, *chaves_e_args):
+        chaves, args = chaves_e_args[:quantidade], chaves_e_args[quantidade:]
+        if script == cache_sessoes._SCRIPT_GRAVAR:
+            valor, marca, contador = chaves
+            versao = int(self.dados.get(contador, 0)) + 1
+            self.dados[contador] = str(versao).encode()
+            self.dados[marca] = str(versao).encode()
+            if args[0] == "":
+                self.dados.pop(valor, None)
+            else:
+                self.dados[valor] = args[0].encode()
+            return versao
+        if script == cache_sessoes._SCRIPT_PREENCHER:
+            valor, marca = chaves
+            if int(self.dados.get(marca, b"0")) > int(args[2]):
+                return 0
+            self.dados[valor] = args[0].encode()
+            return 1
+        raise AssertionError("Script inesperado")
+
+
+def test_redis_leitura_atrasada_de_outro_worker_nao_sobrescreve_a_gravacao():
+    redis = RedisFalso()
+    # Dois workers, cada um com o seu objeto de cache, no mesmo Redis.
+    worker_a = CacheSessoesAtivas(BackendRedis(redis))
+    worker_b = CacheSessoesAtivas(BackendRedis(redis))
+
+    async def cenario():
+        versao = await worker_a.versao()  # A começa a ler a sessão ativa...
+        await worker_b.gravar(1, None)  # ...B faz o checkout...
+        await worker_a.preencher(1, SESSAO, versao)  # ...e a leitura antiga de A chega depois.
+        depois_do_checkout = await worker_a.obter(1)
+
+        versao = await worker_a.versao()
+        await worker_a.preencher(1, SESSAO, versao)
+        await worker_a.preencher(2, SESSAO, versao)
+        return depois_do_checkout, await worker_b.obter(1), await worker_b.obter(2)
+
+    depois_do_checkout, leitura_nova, outro_usuario = rodar(cenario())
+    assert depois_do_checkout == (True, None)
+    assert leitura_nova == outro_usuario == (True, SESSAO)
+
+
+def test_redis_invalidar_tambem_barra_leituras_em_andamento():
+    redis = RedisFalso()
+    cache = CacheSessoesAtivas(BackendRedis(redis))
+
+    async def cenario():
+        await cache.gravar(1, SESSAO)
+        versao = await cache.versao()
+        await cache.invalidar(1)
+        await cache.preencher(1, SESSAO, versao)
+        return await cache.obter(1)
+
+    assert rodar(cenario()) == (False, None)
@@ -0,0 +1,91 @@
+import gzip
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import respostas
+from respostas import MiddlewareCompressao
+
+GRANDE = "estacionamento " * 500
+
+
+async def grande(request):
+    return PlainTextResponse(GRANDE)
+
+
+async def pequena(request):
+    return PlainTextResponse("ok")
+
+
+async def em_partes(request):
+    async def partes():
+        for _ in range(3):
+            yield GRANDE.encode()
+
+    return StreamingResponse(partes(), media_type="text/csv")
+
+
+async def eventos(request):
+    async def partes():
+        yield b"event: sessao\ndata: {}\n\n" * 100
+
+    return StreamingResponse(partes(), media_type="text/event-stream")
+
+
+async def ja_comprimida(request):
+    return Response(gzip.compress(GRANDE.encode()), headers={"Content-Encoding": "gzip"}, media_type="text/plain")
+
+
+@pytest.fixture
+def cliente():
+    app = Starlette(routes=[
+        Route("/grande", grande), Route("/pequena", pequena), Route("/partes", em_partes),
+        Route("/eventos", eventos), Route("/comprimida", ja_comprimida),
+    ])
+    app.add_middleware(MiddlewareCompressao, minimo=1024)
+    return TestClient(app)
+
+
+def test_gzip(cliente):
+    resposta = cliente.get("/grande", headers={"Accept-Encoding": "gzip"})
+    assert resposta.headers["content-encoding"] == "gzip"
+    assert resposta.text == GRANDE
+    assert "gzip" not in cliente.get("/pequena", headers={"Accept-Encoding": "gzip"}).headers.get("content-encoding", "")
+
+
+def test_sem_brotli_instalado_cai_no_gzip(cliente, monkeypatch):
+    monkeypatch.setattr(respostas, "brotli", None)
+    resposta = cliente.get("/grande", headers={"Accept-Encoding": "br, gzip"})
+    assert resposta.headers["content-encoding"] == "gzip"
+
+
+def _br(cliente, caminho: str):
+    # O TestClient (httpx) só decodifica br com o pacote instalado; lê o corpo cru.
+    with cliente.stream("GET", caminho, headers={"Accept-Encoding": "br"}) as resposta:
+        return resposta, b"".join(resposta.iter_raw())
+
+
+def test_brotli(cliente):
+    brotli = pytest.importorskip("brotli")
+    resposta, corpo = _br(cliente, "/grande")
+    assert resposta.headers["content-encoding"] == "br"
+    assert "accept-encoding" in resposta.headers["vary"].lower()
+    assert int(resposta.headers["content-length"]) == len(corpo) < len(GRANDE)
+    assert brotli.decompress(corpo).decode() == GRANDE
+
+    resposta, corpo = _br(cliente, "/partes")
+    assert resposta.headers["content-encoding"] == "br" and "content-length" not in resposta.headers
+    assert brotli.decompress(corpo).decode() == GRANDE * 3
+
+
+def test_brotli_deixa_passar_pequenas_sse_e_ja_comprimidas(cliente):
+    pytest.importorskip("brotli")
+    resposta, corpo = _br(cliente, "/pequena")
+    assert "content-encoding" not in resposta.headers and corpo == b"ok"
+    resposta, corpo = _br(cliente, "/eventos")
+    assert "content-encoding" not in resposta.headers and corpo.startswith(b"event: sessao")
+    resposta, corpo = _br(cliente, "/comprimida")
+    assert resposta.headers["content-encoding"] == "gzip" and gzip.decompress(corpo).decode() == GRANDE
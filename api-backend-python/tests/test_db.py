@@ -0,0 +1,100 @@
+import asyncio
+
+import aiomysql
+import pytest
+
+from db import PoolConexoes
+
+
+class ConexaoFalsa:
+    def __init__(self, ping=None, rollback=None):
+        self._ping = ping
+        self._rollback = rollback
+        self.closed = False
+
+    async def ping(self, reconnect=False):
+        if self._ping is not None:
+            await self._ping()
+
+    def get_transaction_status(self):
+        return True
+
+    async def rollback(self):
+        if self._rollback is not None:
+            await self._rollback()
+
+    def close(self):
+        self.closed = True
+
+
+class PoolFalso(PoolConexoes):
+    def __init__(self, conectar=None, **kwargs):
+        super().__init__({}, tamanho=2, timeout_aquisicao=0.1, **kwargs)
+        self._ao_conectar = conectar
+
+    async def _conectar(self):
+        if self._ao_conectar is not None:
+            await self._ao_conectar()
+        return ConexaoFalsa()
+
+
+async def travar():
+    await asyncio.sleep(3600)
+
+
+async def falhar_oserror():
+    raise OSError("Connection refused")
+
+
+def vagas_livres(pool: PoolConexoes) -> int:
+    return pool._vagas._value
+
+
+@pytest.mark.parametrize("conectar", [travar, falhar_oserror])
+def test_falha_ou_cancelamento_ao_conectar_devolve_a_vaga(conectar):
+    async def cenario():
+        pool = PoolFalso(conectar)
+        for _ in range(3):
+            with pytest.raises((asyncio.TimeoutError, OSError)):
+                await asyncio.wait_for(pool.adquirir(), 0.01)
+        return pool
+
+    pool = asyncio.run(cenario())
+    assert pool.estatisticas()["em_uso"] == 0 and vagas_livres(pool) == 2
+
+
+def test_ping_cancelado_fecha_a_conexao_e_devolve_a_vaga():
+    async def cenario():
+        pool = PoolFalso(ping_apos=0)
+        conexao = ConexaoFalsa(ping=travar)
+        pool._ociosas.append((conexao, 0.0))
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.adquirir(), 0.01)
+        return pool, conexao
+
+    pool, conexao = asyncio.run(cenario())
+    assert conexao.closed
+    assert pool.estatisticas()["em_uso"] == 0 and vagas_livres(pool) == 2
+
+
+def test_rollback_cancelado_ou_com_erro_descarta_a_conexao():
+    async def erro_mysql():
+        raise aiomysql.OperationalError(2013, "Lost connection to MySQL server during query")
+
+    async def cenario():
+        pool = PoolFalso()
+        falhas = []
+        for rollback in (travar, erro_mysql, falhar_oserror):
+            conexao = await pool.adquirir()
+            conexao._rollback = rollback
+            try:
+                await asyncio.wait_for(pool.devolver(conexao), 0.01)
+            except asyncio.TimeoutError:
+                falhas.append("cancelado")
+            assert conexao.closed
+        return pool, falhas
+
+    pool, falhas = asyncio.run(cenario())
+    assert falhas == ["cancelado"]
+    assert pool.estatisticas()["em_uso"] == 0 and vagas_livres(pool) == 2
+    assert pool.estatisticas()["ociosas"] == 0
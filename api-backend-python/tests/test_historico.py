@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import historico
+import main
+from journal import JournalPagamentos, ler_segmento
+
+# Horário de Brasília, como o app Android envia.
+BRT = timezone(timedelta(hours=-3))
+
+
+def linha(pagamento_id: int, saida: datetime) -> dict:
+    return {
+        "id": pagamento_id, "usuario_id": 1, "horario_entrada": saida - timedelta(hours=1),
+        "horario_saida": saida, "valor_pago": Decimal("5.00"), "numero_cartao": 4111,
+    }
+
+
+def test_horario_local():
+    assert historico.horario_local(datetime(2026, 10, 18, 9, 0)) == datetime(2026, 10, 18, 9, 0)
+    convertido = historico.horario_local(datetime(2026, 10, 18, 9, 0, tzinfo=BRT))
+    assert convertido.tzinfo is None
+    assert convertido == datetime(2026, 10, 18, 12, 0, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+
+
+def test_cursor_com_fuso_vira_horario_local():
+    cursor = historico.codificar_cursor(datetime(2026, 10, 18, 9, 0, tzinfo=BRT), 5)
+    horario_saida, pagamento_id = historico.decodificar_cursor(cursor)
+    assert horario_saida.tzinfo is None and pagamento_id == 5
+
+
+def test_mesclar_pendentes_ordena_e_respeita_o_cursor():
+    base = datetime(2026, 10, 18, 12, 0)
+    linhas = [linha(3, base), linha(1, base - timedelta(hours=2))]
+    pendentes = [linha(9, base - timedelta(hours=1)), linha(3, base), linha(8, base + timedelta(hours=1))]
+    assert [p["id"] for p in historico.mesclar_pendentes(linhas, pendentes, None, 10)] == [8, 3, 9, 1]
+    assert [p["id"] for p in historico.mesclar_pendentes(linhas, pendentes, None, 2)] == [8, 3]
+    # Depois do cursor só entram os pendentes mais antigos que ele.
+    assert [p["id"] for p in historico.mesclar_pendentes(linhas[1:], pendentes, (base, 3), 10)] == [9, 1]
+
+
+def test_pagamento_com_fuso_passa_pelo_journal_e_mescla_com_o_banco(tmp_path, monkeypatch):
+    journal = JournalPagamentos(str(tmp_path))
+    journal.abrir()
+    monkeypatch.setattr(main, "journal_pagamentos", journal)
+    saida = datetime(2026, 10, 18, 9, 0, tzinfo=BRT)
+    pagamento = main.PagamentoCreate(
+        horario_entrada=saida - timedelta(hours=2), horario_saida=saida, valor_pago=Decimal("10.00"), numero_cartao=4111,
+    )
+
+    async def cenario():
+        try:
+            return await main.create_pagamento(pagamento, current_user_id=1)
+        finally:
+            await journal.fechar()
+
+    criado = asyncio.run(cenario())
+    local = historico.horario_local(saida)
+    assert criado.horario_saida == local and criado.horario_saida.tzinfo is None
+
+    # O que volta do disco (reaplicação após uma queda) também vem sem fuso.
+    relidos = [r for caminho in sorted(tmp_path.glob("slot-*/segmento-*.log")) for r in ler_segmento(str(caminho))]
+    assert [r["horario_saida"] for r in relidos] == [local]
+
+    linhas = [linha(1, local + timedelta(minutes=1)), linha(2, local - timedelta(minutes=1))]
+    mesclados = historico.mesclar_pendentes(linhas, relidos, (local + timedelta(hours=1), 10), 10)
+    # O cliente recebe o id positivo; o banco e o journal guardam o negativo.
+    assert criado.id > 0 and [r["id"] for r in relidos] == [-criado.id]
+    assert [p["id"] for p in mesclados] == [1, -criado.id, 2]
+    assert [p["id"] for p in historico.com_ids_publicos(mesclados)] == [1, criado.id, 2]
+    assert historico.ids_internos(criado.id) == (criado.id, -criado.id)
@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+import idempotencia
+from conftest import Relogio
+from idempotencia import ArmazemIdempotencia, RespostaGuardada
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    relogio = Relogio()
+    monkeypatch.setattr(idempotencia, "time", relogio)
+    return relogio
+
+
+class Operacao:
+    """Conta as execuções e devolve as respostas dadas, em ordem."""
+
+    def __init__(self, *respostas, espera: float = 0.0):
+        self.respostas = list(respostas)
+        self.espera = espera
+        self.execucoes = 0
+
+    async def __call__(self):
+        self.execucoes += 1
+        if self.espera:
+            await asyncio.sleep(self.espera)
+        return self.respostas.pop(0)
+
+
+CRIADA = RespostaGuardada(201, {"id": 1})
+
+
+def test_repeticao_devolve_a_resposta_guardada(relogio):
+    armazem = ArmazemIdempotencia()
+    operacao = Operacao(CRIADA)
+
+    async def cenario():
+        return [await armazem.executar((1, "checkin", "k"), operacao) for _ in range(2)]
+
+    assert asyncio.run(cenario()) == [(CRIADA, False), (CRIADA, True)]
+    assert operacao.execucoes == 1
+
+
+@pytest.mark.parametrize("status_code", [500, 503, 429])
+def test_erros_transitorios_nao_sao_guardados(relogio, status_code):
+    armazem = ArmazemIdempotencia()
+    operacao = Operacao(RespostaGuardada(status_code, {"detail": "x"}), CRIADA)
+
+    async def cenario():
+        return [await armazem.executar((1, "checkin", "k"), operacao) for _ in range(2)]
+
+    primeira, segunda = asyncio.run(cenario())
+    assert primeira[0].status_code == status_code
+    assert segunda == (CRIADA, False)
+    assert operacao.execucoes == 2
+
+
+def test_erro_do_cliente_e_guardado(relogio):
+    armazem = ArmazemIdempotencia()
+    conflito = RespostaGuardada(409, {"detail": "Já existe uma sessão ativa."})
+    operacao = Operacao(conflito)
+
+    async def cenario():
+        return [await armazem.executar((1, "checkin", "k"), operacao) for _ in range(2)]
+
+    assert asyncio.run(cenario())[1] == (conflito, True)
+
+
+def test_repeticao_simultanea_espera_a_original(relogio):
+    armazem = ArmazemIdempotencia()
+    operacao = Operacao(CRIADA, espera=0.01)
+
+    async def cenario():
+        return await asyncio.gather(*(armazem.executar((1, "checkin", "k"), operacao) for _ in range(3)))
+
+    resultados = asyncio.run(cenario())
+    assert operacao.execucoes == 1
+    assert sorted(repetida for _, repetida in resultados) == [False, True, True]
+    assert all(resposta == CRIADA for resposta, _ in resultados)
+
+
+def test_original_cancelada_passa_a_execucao_para_a_repeticao(relogio):
+    armazem = ArmazemIdempotencia()
+    operacao = Operacao(CRIADA, CRIADA, espera=0.01)
+
+    async def cenario():
+        original = asyncio.ensure_future(armazem.executar((1, "checkin", "k"), operacao))
+        await asyncio.sleep(0)
+        repeticao = asyncio.ensure_future(armazem.executar((1, "checkin", "k"), operacao))
+        await asyncio.sleep(0)
+        original.cancel()
+        return await repeticao
+
+    assert asyncio.run(cenario()) == (CRIADA, False)
+    assert operacao.execucoes == 2
+
+
+def test_resposta_expira_apos_o_ttl(relogio):
+    armazem = ArmazemIdempotencia(ttl=60)
+    operacao = Operacao(CRIADA, CRIADA)
+
+    async def cenario():
+        await armazem.executar((1, "checkin", "k"), operacao)
+        relogio.avancar(61)
+        return await armazem.executar((1, "checkin", "k"), operacao)
+
+    assert asyncio.run(cenario()) == (CRIADA, False)
+    assert operacao.execucoes == 2
+
+
+def test_lru_descarta_a_chave_mais_antiga(relogio):
+    armazem = ArmazemIdempotencia(capacidade=2)
+    operacao = Operacao(*[CRIADA] * 4)
+
+    async def cenario():
+        for chave in ("a", "b", "c"):
+            await armazem.executar((1, "checkin", chave), operacao)
+        return await armazem.executar((1, "checkin", "a"), operacao)
+
+    assert asyncio.run(cenario()) == (CRIADA, False)
+    assert operacao.execucoes == 4
+
+
+# --- Armazém em Redis, compartilhado entre workers ---
+
+class RedisFalso:
+    """O subconjunto do redis-py usado pelo armazém (sem expiração)."""
+
+    def __init__(self):
+        self.dados = {}
+
+    async def get(self, nome):
+        return self.dados.get(nome)
+
+    async def set(self, nome, valor, nx=False, ex=None):
+        if nx and nome in self.dados:
+            return None
+        self.dados[nome] = valor.encode() if isinstance(valor, str) else valor
+        return True
+
+    async def delete(self, nome):
+        self.dados.pop(nome, None)
+
+
+def workers_redis(quantidade: int = 2):
+    redis = RedisFalso()
+    return redis, [idempotencia.ArmazemIdempotenciaRedis(redis, intervalo=0.001) for _ in range(quantidade)]
+
+
+def test_redis_repeticao_em_outro_worker():
+    _, (primeiro, segundo) = workers_redis()
+    operacao = Operacao(CRIADA)
+
+    async def cenario():
+        return [await primeiro.executar((1, "checkin", "k"), operacao), await segundo.executar((1, "checkin", "k"), operacao)]
+
+    assert asyncio.run(cenario()) == [(CRIADA, False), (CRIADA, True)]
+    assert operacao.execucoes == 1
+
+
+def test_redis_repeticao_simultanea_espera_a_original():
+    _, armazens = workers_redis(4)
+    operacao = Operacao(CRIADA, espera=0.05)
+
+    async def cenario():
+        return await asyncio.gather(*(armazem.executar((1, "checkin", "k"), operacao) for armazem in armazens))
+
+    resultados = asyncio.run(cenario())
+    assert operacao.execucoes == 1
+    assert sorted(repetida for _, repetida in resultados) == [False, True, True, True]
+    assert all(resposta == CRIADA for resposta, _ in resultados)
+
+
+def test_redis_erro_transitorio_libera_a_chave():
+    redis, (primeiro, segundo) = workers_redis()
+    operacao = Operacao(RespostaGuardada(503, {"detail": "x"}), CRIADA)
+
+    async def cenario():
+        return [await primeiro.executar((1, "checkin", "k"), operacao), await segundo.executar((1, "checkin", "k"), operacao)]
+
+    transitoria, segunda = asyncio.run(cenario())
+    assert transitoria[0].status_code == 503 and segunda == (CRIADA, False)
+    assert operacao.execucoes == 2
+
+
+def test_redis_excecao_libera_a_reserva():
+    redis, (armazem, _) = workers_redis()
+
+    async def falhar():
+        raise RuntimeError("banco fora do ar")
+
+    async def cenario():
+        with pytest.raises(RuntimeError):
+            await armazem.executar((1, "checkin", "k"), falhar)
+        return await armazem.executar((1, "checkin", "k"), Operacao(CRIADA))
+
+    assert asyncio.run(cenario()) == (CRIADA, False)
+    assert len(redis.dados) == 1
@@ -0,0 +1,166 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import aiomysql
+import pytest
+
+import consultas
+import main
+from journal import GeradorIds, JournalPagamentos
+
+SAIDA = datetime(2026, 10, 18, 12, 0)
+
+
+class CursorFalso:
+    def __init__(self, banco: "BancoFalso"):
+        self.banco = banco
+        self._linhas = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, parametros=()):
+        if sql == consultas.TIPO_ID_PAGAMENTOS:
+            self.banco.verificacoes += 1
+            self._linhas = [{"tipo": self.banco.tipo_id}]
+            return
+        linhas = [parametros[i:i + 6] for i in range(0, len(parametros), 6)]
+        if sql == consultas.inserir_pagamentos(len(linhas)):
+            self.banco.insercoes += 1
+            ids = [linha[0] for linha in linhas]
+            if len(set(ids)) < len(ids) or any(i in self.banco.linhas or i in self.banco.transacao for i in ids):
+                raise aiomysql.IntegrityError(1062, "Duplicate entry for key 'PRIMARY'")
+            for linha in linhas:
+                if linha[4] >= Decimal("100000000"):
+                    raise aiomysql.DataError(1264, "Out of range value for column 'valor_pago'")
+            self.banco.transacao.update({linha[0]: linha for linha in linhas})
+        elif sql == consultas.pagamentos_existentes(len(parametros)):
+            self._linhas = [{"id": i} for i in parametros if i in self.banco.linhas]
+        else:
+            raise AssertionError(f"Comando inesperado: {sql}")
+
+    async def fetchall(self):
+        return self._linhas
+
+    async def fetchone(self):
+        return self._linhas[0] if self._linhas else None
+
+
+class BancoFalso:
+    """Tabela pagamentos em memória, com transação e as recusas do MySQL."""
+
+    def __init__(self, tipo_id: str = "bigint"):
+        self.tipo_id = tipo_id
+        self.linhas = {}
+        self.transacao = {}
+        self.insercoes = 0
+        self.verificacoes = 0
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    async def commit(self):
+        self.linhas.update(self.transacao)
+        self.transacao = {}
+
+    async def rollback(self):
+        self.transacao = {}
+
+    @asynccontextmanager
+    async def conexao(self):
+        yield self
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    banco = BancoFalso()
+    journal = JournalPagamentos(str(tmp_path))
+    journal.abrir()
+    monkeypatch.setattr(main, "pool_db", banco)
+    monkeypatch.setattr(main, "journal_pagamentos", journal)
+    monkeypatch.setattr(main, "id_pagamentos_verificado", False)
+    yield banco, journal, tmp_path
+    asyncio.run(journal.fechar())
+
+
+def registro(pagamento_id: int, valor: str = "5.00") -> dict:
+    return {
+        "id": pagamento_id, "usuario_id": 1, "horario_entrada": SAIDA - timedelta(hours=1),
+        "horario_saida": SAIDA, "valor_pago": Decimal(valor), "numero_cartao": 4111,
+    }
+
+
+def test_ids_negativos_e_unicos():
+    gerador = GeradorIds(no=3, slot=7)
+    ids = [gerador.proximo() for _ in range(10000)]
+    assert all(i < 0 for i in ids)
+    assert len(set(ids)) == len(ids)
+    # Decrescentes no tempo (o valor absoluto cresce).
+    assert ids == sorted(ids, reverse=True)
+    assert all(-i < 2 ** 63 for i in ids)
+
+
+def test_lote_inteiro_num_insert(ambiente):
+    banco, journal, _ = ambiente
+    asyncio.run(main.gravar_pagamentos([registro(-1), registro(-2), registro(-3)]))
+    assert set(banco.linhas) == {-1, -2, -3}
+    assert banco.insercoes == 1 and journal.rejeitados == 0
+    # O tipo da coluna é verificado uma vez, antes do primeiro lote.
+    asyncio.run(main.gravar_pagamentos([registro(-4)]))
+    assert banco.verificacoes == 1
+
+
+@pytest.mark.parametrize("tipo", ["int", "int(11)", "bigint unsigned", "bigint(20) unsigned"])
+def test_coluna_id_sem_bigint_com_sinal_nao_grava_nem_rejeita(ambiente, tipo):
+    banco, journal, _ = ambiente
+    banco.tipo_id = tipo
+    with pytest.raises(RuntimeError, match="BIGINT com sinal"):
+        asyncio.run(main.gravar_pagamentos([registro(-1)]))
+    assert banco.linhas == {} and banco.insercoes == 0 and journal.rejeitados == 0
+    banco.tipo_id = "bigint(20)"
+    asyncio.run(main.gravar_pagamentos([registro(-1)]))
+    assert set(banco.linhas) == {-1}
+
+
+def test_reaplicacao_ignora_so_os_ids_ja_gravados(ambiente):
+    banco, journal, _ = ambiente
+    asyncio.run(main.gravar_pagamentos([registro(-1), registro(-2)]))
+    # Queda antes de apagar o segmento: o lote volta com pagamentos novos.
+    asyncio.run(main.gravar_pagamentos([registro(-1), registro(-2), registro(-3)]))
+    assert set(banco.linhas) == {-1, -2, -3}
+    assert journal.rejeitados == 0
+
+
+def test_registro_recusado_vai_para_rejeitados_e_o_resto_e_gravado(ambiente):
+    banco, journal, pasta = ambiente
+    asyncio.run(main.gravar_pagamentos([registro(-1), registro(-2, "123456789.00"), registro(-3)]))
+    assert set(banco.linhas) == {-1, -3}
+    assert journal.rejeitados == 1
+    rejeitados = [json.loads(linha) for linha in (pasta / "rejeitados.log").read_text(encoding="utf-8").splitlines()]
+    assert [(r["id"], r["valor_pago"]) for r in rejeitados] == [(-2, "123456789.00")]
+    assert "Out of range" in rejeitados[0]["motivo"]
+
+
+def test_erro_de_conexao_sobe_e_o_lote_fica_no_journal(ambiente, monkeypatch):
+    banco, journal, _ = ambiente
+
+    async def cair(*args):
+        raise aiomysql.OperationalError(2013, "Lost connection to MySQL server during query")
+
+    monkeypatch.setattr(CursorFalso, "execute", cair)
+
+    async def cenario():
+        dados = registro(0)
+        del dados["id"]
+        await journal.registrar(dados)
+        with pytest.raises(aiomysql.OperationalError):
+            await journal.descarregar(main.gravar_pagamentos)
+
+    asyncio.run(cenario())
+    assert len(journal.pendentes_do_usuario(1)) == 1 and journal.rejeitados == 0
@@ -0,0 +1,187 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import consultas
+import main
+from regras_sessao import EventoLote
+
+T0 = datetime(2026, 10, 18, 8, 0)
+
+
+def horas(n: float) -> datetime:
+    return T0 + timedelta(hours=n)
+
+
+class CursorSqlite:
+    """
+    Executa no SQLite os comandos de várias linhas de consultas.py com os
+    parâmetros montados por main.py: um parâmetro fora do lugar no CASE
+    grava a saída ou o valor na sessão errada.
+    """
+
+    def __init__(self, banco: "BancoSqlite"):
+        self.banco = banco
+        self.rowcount = 0
+        self._linhas = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, parametros=()):
+        assert sql.count("%s") == len(parametros), sql
+        self.banco.comandos.append((sql, list(parametros)))
+        sql = sql.replace("%s", "?").replace(" FOR UPDATE", "")
+        valores = [
+            v.isoformat(" ") if isinstance(v, datetime) else str(v) if isinstance(v, Decimal) else v
+            for v in parametros
+        ]
+        cursor = self.banco.sqlite.execute(sql, valores)
+        self.rowcount = cursor.rowcount
+        colunas = [c[0] for c in cursor.description or ()]
+        self._linhas = [
+            {
+                coluna: datetime.fromisoformat(valor) if coluna.startswith("horario") and valor else valor
+                for coluna, valor in zip(colunas, linha)
+            }
+            for linha in cursor.fetchall()
+        ]
+
+    async def fetchall(self):
+        return self._linhas
+
+
+class BancoSqlite:
+    def __init__(self, saltos: bool = False):
+        self.comandos = []
+        self.sqlite = sqlite3.connect(":memory:")
+        self.sqlite.executescript("""
+            CREATE TABLE usuarios (id INTEGER PRIMARY KEY);
+            CREATE TABLE sessoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, usuario_id INTEGER NOT NULL,
+                horario_entrada TEXT NOT NULL, horario_saida TEXT, valor_pago TEXT, status TEXT NOT NULL
+            );
+            INSERT INTO usuarios (id) VALUES (1), (2), (3), (4);
+        """)
+        if saltos:
+            # Ids não consecutivos dentro do mesmo INSERT, como com
+            # innodb_autoinc_lock_mode=2: uma inserção concorrente (do
+            # usuário 3) recebe um id entre cada linha.
+            self.sqlite.executescript("""
+                CREATE TRIGGER saltar_ids AFTER INSERT ON sessoes WHEN NEW.usuario_id <> 3 BEGIN
+                    INSERT INTO sessoes (usuario_id, horario_entrada, status) VALUES (3, NEW.horario_entrada, 'CANCELADA');
+                END;
+            """)
+
+    def sessao(self, usuario_id: int, entrada: datetime) -> int:
+        return self.sqlite.execute(
+            "INSERT INTO sessoes (usuario_id, horario_entrada, status) VALUES (?, ?, 'ATIVA')",
+            (usuario_id, entrada.isoformat(" ")),
+        ).lastrowid
+
+    def linhas(self) -> dict:
+        return {
+            linha[0]: linha[1:]
+            for linha in self.sqlite.execute("SELECT id, usuario_id, horario_saida, valor_pago, status FROM sessoes")
+        }
+
+    def cursor(self):
+        return CursorSqlite(self)
+
+    async def commit(self):
+        self.sqlite.commit()
+
+    async def rollback(self):
+        self.sqlite.rollback()
+
+
+def test_parametros_do_case_gravam_cada_saida_na_sua_sessao():
+    banco = BancoSqlite()
+    sessao_1 = banco.sessao(1, horas(-3))
+    sessao_2 = banco.sessao(2, horas(-1))
+    sessao_3 = banco.sessao(3, horas(-2))
+    eventos = [
+        EventoLote(0, "checkout", 3, horas(0)),
+        EventoLote(1, "checkout", 1, horas(0.5)),
+        EventoLote(2, "checkout", 2, horas(1)),
+    ]
+
+    plano = asyncio.run(main._aplicar_parte_do_lote(banco, eventos))
+
+    sql, parametros = next(c for c in banco.comandos if c[0].startswith("UPDATE"))
+    assert sql == consultas.finalizar_sessoes(3)
+    # (id, saída) * n, (id, valor) * n, ids — na mesma ordem de ids.
+    ids = list(plano.finalizar)
+    assert parametros == (
+        [v for i in ids for v in (i, plano.finalizar[i][0])]
+        + [v for i in ids for v in (i, plano.finalizar[i][1])]
+        + ids
+    )
+    assert banco.linhas() == {
+        sessao_1: (1, horas(0.5).isoformat(" "), "20.00", "FINALIZADA"),
+        sessao_2: (2, horas(1).isoformat(" "), "10.00", "FINALIZADA"),
+        sessao_3: (3, horas(0).isoformat(" "), "10.00", "FINALIZADA"),
+    }
+
+
+def test_insercao_de_varias_linhas_e_dono_de_cada_id():
+    banco = BancoSqlite()
+    antiga = banco.sessao(4, horas(-1))
+    eventos = [
+        EventoLote(0, "checkin", 2, horas(0)),
+        EventoLote(1, "checkout", 4, horas(0)),
+        EventoLote(2, "checkin", 4, horas(0.5)),
+        EventoLote(3, "checkin", 1, horas(1)),
+        EventoLote(4, "checkout", 2, horas(2)),
+    ]
+
+    plano = asyncio.run(main._aplicar_parte_do_lote(banco, eventos))
+
+    # A finalização vem antes das inserções (índice único de sessão ativa).
+    tipos = [sql.split()[0] for sql, _ in banco.comandos]
+    assert tipos == ["SELECT", "UPDATE", "SELECT", "INSERT", "SELECT"]
+    _, parametros = banco.comandos[3]
+    assert len(parametros) == 5 * len(plano.novas)
+    linhas = banco.linhas()
+    assert linhas[antiga] == (4, horas(0).isoformat(" "), "5.00", "FINALIZADA")
+    por_usuario = {nova["usuario_id"]: nova for nova in plano.novas}
+    assert linhas[por_usuario[2]["id"]] == (2, horas(2).isoformat(" "), "10.00", "FINALIZADA")
+    assert linhas[por_usuario[4]["id"]] == (4, None, None, "ATIVA")
+    assert linhas[por_usuario[1]["id"]] == (1, None, None, "ATIVA")
+    assert plano.resultados[0]["sessao_id"] == plano.resultados[4]["sessao_id"] == por_usuario[2]["id"]
+    assert plano.resultados[2]["sessao_id"] == por_usuario[4]["id"]
+
+
+def test_ids_nao_consecutivos_sao_resolvidos_pelo_conteudo():
+    banco = BancoSqlite(saltos=True)
+    # Sessão antiga igual a uma das novas (lote reenviado): não é confundida.
+    repetida = banco.sessao(1, horas(0))
+    banco.sqlite.execute(
+        "UPDATE sessoes SET horario_saida = ?, valor_pago = '5.00', status = 'FINALIZADA' WHERE id = ?",
+        (horas(0.5).isoformat(" "), repetida),
+    )
+    eventos = [
+        EventoLote(0, "checkin", 1, horas(0)),
+        EventoLote(1, "checkin", 2, horas(0)),
+        EventoLote(2, "checkout", 1, horas(0.5)),
+        EventoLote(3, "checkin", 1, horas(1)),
+    ]
+
+    plano = asyncio.run(main._aplicar_parte_do_lote(banco, eventos))
+
+    linhas = banco.linhas()
+    ids = [nova["id"] for nova in plano.novas]
+    assert repetida not in ids and len(set(ids)) == 3
+    # Com os saltos, lastrowid + 1 e + 2 não são as outras linhas do INSERT.
+    assert ids[1] - ids[0] > 1 and ids[2] - ids[1] > 1
+    assert [linhas[i] for i in ids] == [
+        (1, horas(0.5).isoformat(" "), "5.00", "FINALIZADA"),
+        (2, None, None, "ATIVA"),
+        (1, None, None, "ATIVA"),
+    ]
+    assert plano.resultados[0]["sessao_id"] == plano.resultados[2]["sessao_id"] == ids[0]
+    assert plano.resultados[1]["sessao_id"] == ids[1] and plano.resultados[3]["sessao_id"] == ids[2]
@@ -0,0 +1,79 @@
+import asyncio
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import consultas
+from manutencao import ManutencaoBanco
+from tarifas import Tarifa
+
+ENTRADA = datetime(2026, 10, 12, 8, 0)
+
+
+class CursorFalso:
+    def __init__(self, banco: "BancoFalso"):
+        self.banco = banco
+        self._linhas = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, parametros=()):
+        self.banco.comandos.append((sql, list(parametros)))
+        self._linhas = []
+        if sql == consultas.SESSOES_ABANDONADAS:
+            limite, _ = parametros
+            self._linhas = [s for s in self.banco.ativas if s["horario_entrada"] < limite]
+
+    async def fetchall(self):
+        return self._linhas
+
+
+class BancoFalso:
+    def __init__(self, ativas):
+        self.ativas = ativas
+        self.comandos = []
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    async def commit(self):
+        pass
+
+
+def test_desligada_por_padrao(monkeypatch):
+    for variavel in ("MANUTENCAO_INTERVALO", "SESSAO_ABANDONADA_HORAS"):
+        monkeypatch.delenv(variavel, raising=False)
+    tarifa = Tarifa.do_ambiente()
+    assert ManutencaoBanco.do_ambiente(tarifa) is None
+
+    # Ligar a manutenção não liga o fechamento de abandonadas.
+    monkeypatch.setenv("MANUTENCAO_INTERVALO", "300")
+    assert ManutencaoBanco.do_ambiente(tarifa).abandonada_apos is None
+    monkeypatch.setenv("SESSAO_ABANDONADA_HORAS", "72")
+    assert ManutencaoBanco.do_ambiente(tarifa).abandonada_apos == timedelta(hours=72)
+
+
+def test_abandonada_e_fechada_com_o_valor_devido():
+    agora = ENTRADA + timedelta(hours=72, minutes=30)
+    banco = BancoFalso([
+        {"id": 7, "usuario_id": 1, "horario_entrada": ENTRADA},
+        {"id": 9, "usuario_id": 2, "horario_entrada": agora - timedelta(hours=1)},
+    ])
+    manutencao = ManutencaoBanco(Tarifa.do_ambiente(), abandonada_apos=timedelta(hours=48))
+    fechadas = []
+
+    async def ao_fechar(sessoes):
+        fechadas.extend(sessoes)
+
+    asyncio.run(manutencao._fechar_abandonadas(banco, agora - manutencao.abandonada_apos, agora, ao_fechar))
+
+    # R$ 5,00 por hora iniciada: 73 horas.
+    devido = Decimal("365.00")
+    sql, parametros = banco.comandos[1]
+    assert sql == consultas.fechar_sessoes_abandonadas(1)
+    assert parametros == [agora, 7, devido, 7]
+    assert [(s["id"], s["valor_devido"]) for s in fechadas] == [(7, devido)]
+    assert manutencao.sessoes_abandonadas == 1
@@ -0,0 +1,28 @@
+import pytest
+from fastapi import HTTPException
+
+import main
+
+
+@pytest.fixture
+def tokens(monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "admin")
+    monkeypatch.setattr(main, "METRICAS_TOKEN", "coletor")
+
+
+def test_coletor_aceita_bearer_ou_o_token_de_admin(tokens):
+    main.verificar_coletor(None, "Bearer coletor")
+    main.verificar_coletor(None, "bearer  coletor")
+    main.verificar_coletor("admin", None)
+
+
+@pytest.mark.parametrize("x_admin_token, authorization", [
+    (None, None),
+    (None, "Bearer admin"),
+    (None, "Basic coletor"),
+    ("coletor", None),
+])
+def test_coletor_recusa_o_resto(tokens, x_admin_token, authorization):
+    with pytest.raises(HTTPException) as erro:
+        main.verificar_coletor(x_admin_token, authorization)
+    assert erro.value.status_code == 403
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from ocupacao import BLOCOS_PICOS, MonitorOcupacao
+
+# Segunda-feira.
+SEGUNDA = datetime(2026, 10, 12)
+
+
+def test_dados_semana_mantem_sete_pontos_por_dia():
+    monitor = MonitorOcupacao(capacidade=10)
+    # Segunda, das 10h às 12h: ocupa por inteiro o bloco das 10h.
+    monitor.registrar_entrada(SEGUNDA.replace(hour=10))
+    monitor.registrar_saida(SEGUNDA.replace(hour=10), SEGUNDA.replace(hour=12))
+    # Segunda, das 13h às 14h: metade do bloco das 12h.
+    monitor.registrar_entrada(SEGUNDA.replace(hour=13))
+    monitor.registrar_saida(SEGUNDA.replace(hour=13), SEGUNDA.replace(hour=14))
+    monitor._picos, monitor._picos_por_hora = monitor._calcular_picos()
+
+    resposta = monitor.resposta()
+    assert [d["dia"] for d in resposta["dados_semana"]] == ["Dom", "Seg", "Ter", "Qua", "Qui", "Sex", "Sáb"]
+    assert all(len(d["picos"]) == len(BLOCOS_PICOS) == 7 for d in resposta["dados_semana"])
+    segunda = resposta["dados_semana"][1]["picos"]
+    assert segunda == [0, 100, 50, 0, 0, 0, 0]
+    assert resposta["dados_semana"][0]["picos"] == [0] * 7
+
+    assert all(len(d["picos"]) == 24 for d in resposta["dados_semana_por_hora"])
+    por_hora = resposta["dados_semana_por_hora"][1]["picos"]
+    assert [hora for hora, valor in enumerate(por_hora) if valor] == [10, 11, 13]
+    assert resposta["lotacao_percentual_atual"] == 0
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+import regras_sessao
+from regras_sessao import EventoLote, RegraSessaoError, planejar_lote
+from tarifas import DEFINICAO_PADRAO, Tarifa
+
+TARIFA = Tarifa(DEFINICAO_PADRAO)
+T0 = datetime(2026, 10, 18, 8, 0)
+
+
+def horas(n: float) -> datetime:
+    return T0 + timedelta(hours=n)
+
+
+def recusa(plano, indice: int) -> tuple:
+    resultado = plano.resultados[indice]
+    return resultado["status_code"], resultado.get("detail")
+
+
+def test_entrada_e_saida_no_mesmo_lote():
+    plano = planejar_lote(TARIFA, [
+        EventoLote(0, "checkin", 1, horas(0)),
+        EventoLote(1, "checkout", 1, horas(2.5)),
+    ], {1: None})
+    assert plano.finalizar == {}
+    assert len(plano.novas) == 1
+    nova = plano.novas[0]
+    assert (nova["status"], nova["horario_saida"], nova["valor_pago"], nova["eventos"]) == ("FINALIZADA", horas(2.5), Decimal("15.00"), [0, 1])
+    assert plano.resultados[0]["status_code"] == 201
+    assert plano.resultados[1]["status_code"] == 200 and plano.resultados[1]["valor_pago"] == Decimal("15.00")
+    assert plano.estado_final == {1: (None, Decimal("15.00"))}
+
+
+def test_entrada_duplicada_recusa_a_segunda():
+    plano = planejar_lote(TARIFA, [
+        EventoLote(0, "checkin", 1, horas(0)),
+        EventoLote(1, "checkin", 1, horas(1)),
+    ], {1: None})
+    assert len(plano.novas) == 1 and plano.novas[0]["eventos"] == [0]
+    assert recusa(plano, 1) == (409, regras_sessao.SESSAO_JA_ATIVA)
+
+
+def test_entrada_com_sessao_ja_ativa_no_banco():
+    plano = planejar_lote(TARIFA, [EventoLote(0, "checkin", 1, horas(1))], {1: {"id": 10, "horario_entrada": horas(0)}})
+    assert plano.novas == [] and plano.finalizar == {}
+    assert recusa(plano, 0) == (409, regras_sessao.SESSAO_JA_ATIVA)
+    assert plano.estado_final == {}
+
+
+def test_saida_sem_entrada():
+    plano = planejar_lote(TARIFA, [
+        EventoLote(0, "checkout", 1, horas(1)),
+        EventoLote(1, "checkin", 1, horas(2)),
+        EventoLote(2, "checkout", 1, horas(3)),
+        EventoLote(3, "checkout", 1, horas(4)),
+    ], {1: None})
+    assert recusa(plano, 0) == (404, regras_sessao.SEM_SESSAO_ATIVA)
+    assert plano.resultados[2]["status_code"] == 200
+    assert recusa(plano, 3) == (404, regras_sessao.SEM_SESSAO_ATIVA)
+
+
+def test_saida_antes_da_entrada():
+    plano = planejar_lote(TARIFA, [EventoLote(0, "checkout", 1, horas(-1))], {1: {"id": 10, "horario_entrada": horas(0)}})
+    assert recusa(plano, 0) == (422, regras_sessao.SAIDA_ANTES_DA_ENTRADA)
+    assert plano.finalizar == {}
+
+
+def test_usuario_inexistente():
+    # Sem chave em sessoes_ativas: o usuário não existe (nem com None).
+    plano = planejar_lote(TARIFA, [
+        EventoLote(0, "checkin", 99, horas(0)),
+        EventoLote(1, "checkout", 99, horas(1)),
+    ], {1: None})
+    assert recusa(plano, 0) == (404, regras_sessao.USUARIO_NAO_ENCONTRADO)
+    assert recusa(plano, 1) == (404, regras_sessao.USUARIO_NAO_ENCONTRADO)
+    assert plano.novas == [] and plano.estado_final == {}
+
+
+def test_usuarios_intercalados_e_fora_de_ordem():
+    ativas = {1: {"id": 10, "horario_entrada": horas(-3)}, 2: None, 3: {"id": 30, "horario_entrada": horas(-1)}}
+    # Chegam fora de ordem; valem o horário e, nos empates, a ordem recebida.
+    plano = planejar_lote(TARIFA, [
+        EventoLote(0, "checkout", 2, horas(2)),
+        EventoLote(1, "checkin", 1, horas(1)),
+        EventoLote(2, "checkout", 1, horas(0)),
+        EventoLote(3, "checkin", 2, horas(0)),
+        EventoLote(4, "checkout", 3, horas(0)),
+        EventoLote(5, "checkin", 3, horas(0)),
+    ], ativas)
+
+    # A sessão antiga de cada usuário termina com o valor dela, sem misturar os donos.
+    assert plano.finalizar == {10: (horas(0), Decimal("15.00")), 30: (horas(0), Decimal("5.00"))}
+    assert plano.resultados[2]["sessao_id"] == 10 and plano.resultados[4]["sessao_id"] == 30
+    assert [(nova["usuario_id"], nova["eventos"]) for nova in plano.novas] == [(2, [3, 0]), (3, [5]), (1, [1])]
+    assert [nova["status"] for nova in plano.novas] == ["FINALIZADA", "ATIVA", "ATIVA"]
+    assert plano.novas[0]["valor_pago"] == Decimal("10.00")
+    assert all(r["status_code"] in (200, 201) for r in plano.resultados.values())
+
+    sessao_1, valor_1 = plano.estado_final[1]
+    assert sessao_1["horario_entrada"] == horas(1) and valor_1 is None
+    assert plano.estado_final[2] == (None, Decimal("10.00"))
+    assert plano.estado_final[3][0]["usuario_id"] == 3
+
+    # O planejamento não altera o dicionário recebido.
+    assert ativas[2] is None and ativas[1]["id"] == 10
+
+
+def test_regra_sessao_error_segue_as_rotas():
+    with pytest.raises(RegraSessaoError) as erro:
+        regras_sessao.conferir_entrada({"id": 1})
+    assert (erro.value.status_code, erro.value.detail) == (409, regras_sessao.SESSAO_JA_ATIVA)
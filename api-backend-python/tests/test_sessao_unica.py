@@ -0,0 +1,164 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+import aiomysql
+import pytest
+from fastapi import HTTPException
+
+import consultas
+import main
+import regras_sessao
+
+USUARIO = 42
+
+
+class CursorFalso:
+    def __init__(self, banco: "BancoFalso"):
+        self.banco = banco
+        self.rowcount = 0
+        self.lastrowid = None
+        self._linha = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, parametros=()):
+        # Deixa os outros check-ins avançarem entre os comandos, como no banco.
+        await asyncio.sleep(0)
+        if sql == consultas.ABRIR_SESSAO_SE_NAO_HOUVER_ATIVA:
+            self.rowcount, self.lastrowid = self.banco.inserir()
+        elif sql == consultas.SESSAO_ATIVA_DO_USUARIO:
+            self._linha = self.banco.ativa
+        else:
+            raise AssertionError(f"Comando inesperado: {sql}")
+
+    async def fetchone(self):
+        return self._linha
+
+
+class BancoFalso:
+    """
+    Um vencedor e, para quem chega depois, os três desfechos possíveis no
+    MySQL: o NOT EXISTS já vê a sessão (rowcount 0), o índice único recusa
+    (1062) ou o InnoDB escolhe a transação como vítima de impasse (1213).
+    """
+
+    def __init__(self, perdedores=("vazio", 1062, 1213)):
+        self.perdedores = list(perdedores)
+        self.ativa = None
+        self.tentativas = 0
+        self.rollbacks = 0
+
+    def inserir(self):
+        self.tentativas += 1
+        if self.ativa is None:
+            self.ativa = {"id": 7, "horario_entrada": datetime(2026, 10, 18, 8, 0)}
+            return 1, 7
+        desfecho = self.perdedores[self.tentativas % len(self.perdedores)]
+        if desfecho == "vazio":
+            return 0, None
+        if desfecho == 1213:
+            raise aiomysql.OperationalError(1213, "Deadlock found when trying to get lock")
+        raise aiomysql.IntegrityError(desfecho, "Duplicate entry for key 'uq_sessoes_usuario_ativa'")
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    async def commit(self):
+        await asyncio.sleep(0)
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+
+def usar_banco(monkeypatch, banco: BancoFalso):
+    @asynccontextmanager
+    async def abrir_conexao():
+        yield banco
+
+    monkeypatch.setattr(main, "abrir_conexao", abrir_conexao)
+
+
+async def _tentar(usuario_id: int):
+    try:
+        return await main.abrir_sessao(usuario_id)
+    except HTTPException as err:
+        return err
+
+
+def test_check_ins_simultaneos_um_201_e_o_resto_409(monkeypatch):
+    banco = BancoFalso()
+    usar_banco(monkeypatch, banco)
+
+    async def cenario():
+        return await asyncio.gather(*(_tentar(USUARIO) for _ in range(12)))
+
+    resultados = asyncio.run(cenario())
+    sucessos = [r for r in resultados if isinstance(r, dict)]
+    conflitos = [r for r in resultados if isinstance(r, HTTPException)]
+    assert len(sucessos) == 1 and sucessos[0]["sessao_id"] == 7
+    assert len(conflitos) == 11
+    assert {(err.status_code, err.detail) for err in conflitos} == {(409, regras_sessao.SESSAO_JA_ATIVA)}
+    assert banco.tentativas == 12
+
+
+@pytest.mark.parametrize("codigo", [1062, 1213])
+def test_erro_de_concorrencia_vira_409(monkeypatch, codigo):
+    banco = BancoFalso(perdedores=(codigo,))
+    banco.ativa = {"id": 3, "horario_entrada": datetime(2026, 10, 18, 7, 0)}
+    usar_banco(monkeypatch, banco)
+
+    resultado = asyncio.run(_tentar(USUARIO))
+    assert isinstance(resultado, HTTPException) and resultado.status_code == 409
+    assert banco.rollbacks >= 1
+
+
+def test_outro_erro_do_banco_vira_500(monkeypatch):
+    banco = BancoFalso(perdedores=(1048,))
+    banco.ativa = {"id": 3, "horario_entrada": datetime(2026, 10, 18, 7, 0)}
+    usar_banco(monkeypatch, banco)
+
+    resultado = asyncio.run(_tentar(USUARIO))
+    assert isinstance(resultado, HTTPException) and resultado.status_code == 500
+
+
+# --- Índice único da migração 0002 (só com um MySQL de teste configurado) ---
+
+@pytest.fixture
+def conexao_mysql():
+    if not os.environ.get("DB_HOST"):
+        pytest.skip("Sem banco de teste (DB_HOST e demais variáveis DB_*).")
+    import migrar
+
+    conexao = migrar.conectar()
+    migrar.aplicar(conexao)
+    conexao.begin()
+    try:
+        yield conexao
+    finally:
+        # Nada do teste fica no banco.
+        conexao.rollback()
+        conexao.close()
+
+
+def test_indice_unico_recusa_segunda_sessao_ativa(conexao_mysql):
+    import pymysql
+
+    inserir = "INSERT INTO sessoes (usuario_id, horario_entrada, status) VALUES (%s, NOW(), %s)"
+    with conexao_mysql.cursor() as cursor:
+        cursor.execute("SELECT COALESCE(MAX(usuario_id), 0) + 1000000 AS livre FROM sessoes")
+        usuario_id = cursor.fetchone()["livre"]
+        # Sessões encerradas não contam (usuario_ativo fica NULL).
+        cursor.execute(inserir, (usuario_id, "FINALIZADA"))
+        cursor.execute(inserir, (usuario_id, "FINALIZADA"))
+        cursor.execute(inserir, (usuario_id, "ATIVA"))
+        with pytest.raises(pymysql.IntegrityError) as erro:
+            cursor.execute(inserir, (usuario_id, "ATIVA"))
+        assert erro.value.args[0] == 1062
+        cursor.execute("SELECT usuario_ativo FROM sessoes WHERE usuario_id = %s ORDER BY id", (usuario_id,))
+        assert [linha["usuario_ativo"] for linha in cursor.fetchall()] == [None, None, usuario_id]
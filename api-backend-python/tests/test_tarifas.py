@@ -0,0 +1,151 @@
+import math
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+from tarifas import DEFINICAO_PADRAO, MINUTOS_DIA, MINUTOS_SEMANA, Tarifa, TarifaInvalidaError, _centavos, _minuto_do_dia
+
+# Segunda-feira.
+SEGUNDA = datetime(2026, 10, 12, 0, 0)
+
+COMPLETA = {
+    "carencia_minutos": 10,
+    "primeira_hora_minutos": 60,
+    "primeira_hora": "8.00",
+    "fracao_minutos": 15,
+    "valor_fracao": "2.00",
+    "teto_diario": "40.00",
+    "tabelas": [
+        {"dias": [5, 6], "valor_fracao": "1.00"},
+        {"dias": [0, 1, 2, 3, 4], "inicio": "22:00", "fim": "06:00", "valor_fracao": "1.50"},
+    ],
+}
+
+SEM_TETO = {k: v for k, v in COMPLETA.items() if k != "teto_diario"}
+
+
+def referencia(definicao: dict, entrada: datetime, saida: datetime) -> int:
+    """Cálculo ingênuo, fração por fração, para conferir o motor (centavos)."""
+    minutos = max(0, math.ceil((saida - entrada).total_seconds() / 60))
+    carencia = definicao.get("carencia_minutos", 0)
+    if carencia and minutos <= carencia:
+        return 0
+    primeira = definicao.get("primeira_hora_minutos", 60)
+    fracao = definicao.get("fracao_minutos", 60)
+    teto = definicao.get("teto_diario")
+
+    def preco(minuto_semana: int) -> int:
+        valor = definicao["valor_fracao"]
+        for tabela in definicao.get("tabelas", []):
+            inicio = _minuto_do_dia(tabela.get("inicio", "00:00"))
+            fim = _minuto_do_dia(tabela.get("fim", "24:00"))
+            duracao = (fim - inicio) % MINUTOS_DIA or MINUTOS_DIA
+            for dia in tabela.get("dias", range(7)):
+                if (minuto_semana - (dia * MINUTOS_DIA + inicio)) % MINUTOS_SEMANA < duracao:
+                    valor = tabela["valor_fracao"]
+        return _centavos(valor)
+
+    minuto_entrada = entrada.weekday() * MINUTOS_DIA + entrada.hour * 60 + entrada.minute
+    por_janela = {0: _centavos(definicao.get("primeira_hora", definicao["valor_fracao"]))}
+    deslocamento = primeira
+    while deslocamento < minutos:
+        janela = deslocamento // MINUTOS_DIA
+        por_janela[janela] = por_janela.get(janela, 0) + preco((minuto_entrada + deslocamento) % MINUTOS_SEMANA)
+        deslocamento += fracao
+    if teto is not None:
+        return sum(min(valor, _centavos(teto)) for valor in por_janela.values())
+    return sum(por_janela.values())
+
+
+def centavos(tarifa: Tarifa, entrada: datetime, saida: datetime) -> int:
+    return int(tarifa.calcular(entrada, saida) * 100)
+
+
+@pytest.mark.parametrize("segundos", [0, 1, 59, 60, 61, 3599, 3600, 3601, 7199, 7200, 7201, 86400, 86401, 3 * 86400 + 5])
+def test_padrao_igual_a_regra_antiga(segundos):
+    tarifa = Tarifa(DEFINICAO_PADRAO)
+    antiga = max(1, (segundos + 3599) // 3600) * Decimal("5.00")
+    assert tarifa.calcular(SEGUNDA, SEGUNDA + timedelta(seconds=segundos)) == antiga
+
+
+@pytest.mark.parametrize("segundos, esperado", [
+    (0, 0),
+    (599, 0),
+    (600, 0),  # exatamente a carência
+    (601, 800),  # 11 minutos: passa da carência, paga a primeira hora
+    (3600, 800),
+    (3601, 1000),  # um segundo depois da primeira hora: uma fração
+    (3600 + 15 * 60, 1000),
+    (3600 + 15 * 60 + 1, 1200),
+])
+def test_carencia_e_fronteiras_em_segundos(segundos, esperado):
+    tarifa = Tarifa(COMPLETA)
+    entrada = SEGUNDA + timedelta(hours=10)  # dia útil, fora da faixa noturna
+    assert centavos(tarifa, entrada, entrada + timedelta(seconds=segundos)) == esperado
+
+
+def test_teto_diario_por_janela_de_24h():
+    tarifa = Tarifa(COMPLETA)
+    entrada = SEGUNDA + timedelta(hours=10)
+    # 23h59 sem teto passaria de R$ 40,00; com teto, uma janela só.
+    assert centavos(tarifa, entrada, entrada + timedelta(hours=23, minutes=59)) == 4000
+    # A fração que começa na 24ª hora abre a segunda janela.
+    assert centavos(tarifa, entrada, entrada + timedelta(hours=24)) == 4000
+    assert centavos(tarifa, entrada, entrada + timedelta(hours=24, seconds=1)) == 4000 + 200
+    assert centavos(tarifa, entrada, entrada + timedelta(days=3)) == 3 * 4000
+
+
+def test_tabelas_por_dia_e_faixa_que_atravessa_a_meia_noite():
+    tarifa = Tarifa(SEM_TETO)
+    # Sexta 21:00 -> sábado 01:00: primeira hora, 4 frações a R$ 1,50 (22h-23h de sexta,
+    # faixa noturna) e 4 a R$ 1,00 (sábado: a faixa de sexta termina às 06:00, mas a
+    # tabela de fim de semana vem antes na lista e perde para ela).
+    entrada = SEGUNDA + timedelta(days=4, hours=21)
+    assert centavos(tarifa, entrada, entrada + timedelta(hours=4)) == referencia(SEM_TETO, entrada, entrada + timedelta(hours=4))
+    # Domingo 22:00 é fim de semana (a faixa noturna não inclui o domingo).
+    entrada = SEGUNDA + timedelta(days=6, hours=22)
+    assert centavos(tarifa, entrada, entrada + timedelta(hours=2)) == 800 + 4 * 100
+
+
+@pytest.mark.parametrize("definicao", [DEFINICAO_PADRAO, COMPLETA, SEM_TETO], ids=["padrao", "completa", "sem_teto"])
+def test_estadias_de_varios_dias_conferem_com_a_referencia(definicao):
+    tarifa = Tarifa(definicao)
+    gerador = random.Random(20261018)
+    for _ in range(500):
+        entrada = SEGUNDA + timedelta(minutes=gerador.randrange(MINUTOS_SEMANA), seconds=gerador.randrange(60))
+        saida = entrada + timedelta(seconds=gerador.choice([gerador.randrange(7200), gerador.randrange(8 * 86400)]))
+        assert centavos(tarifa, entrada, saida) == referencia(definicao, entrada, saida), (entrada, saida)
+
+
+@pytest.mark.parametrize("definicao", [DEFINICAO_PADRAO, COMPLETA, SEM_TETO], ids=["padrao", "completa", "sem_teto"])
+def test_calcular_lote_igual_a_calcular(definicao):
+    pytest.importorskip("numpy")
+    tarifa = Tarifa(definicao)
+    gerador = random.Random(7)
+    entradas, saidas = [], []
+    for _ in range(2000):
+        entrada = SEGUNDA + timedelta(minutes=gerador.randrange(4 * MINUTOS_SEMANA), seconds=gerador.randrange(60))
+        entradas.append(entrada)
+        saidas.append(entrada + timedelta(seconds=gerador.choice([0, 1, 600, 601, 3600, 3601, gerador.randrange(5 * 86400)])))
+    lote = tarifa.calcular_lote(entradas, saidas)
+    assert lote.tolist() == [centavos(tarifa, e, s) for e, s in zip(entradas, saidas)]
+
+
+def test_calcular_lote_vazio():
+    pytest.importorskip("numpy")
+    assert Tarifa(COMPLETA).calcular_lote([], []).tolist() == []
+
+
+@pytest.mark.parametrize("definicao", [
+    {},
+    {"valor_fracao": "1.234"},
+    {"valor_fracao": "-1"},
+    {"valor_fracao": "1", "fracao_minutos": 11},
+    {"valor_fracao": "1", "tabelas": [{"dias": [7], "valor_fracao": "1"}]},
+    {"valor_fracao": "1", "tabelas": [{"inicio": "25:00", "valor_fracao": "1"}]},
+])
+def test_definicoes_invalidas(definicao):
+    with pytest.raises(TarifaInvalidaError):
+        Tarifa(definicao)
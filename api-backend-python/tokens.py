@@ -0,0 +1,138 @@
+# tokens.py - CODIFICAÇÃO, VERIFICAÇÃO E CACHE DE TOKENS JWT
+
+import importlib.util
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+
+class TokenInvalidoError(Exception):
+    """Token com assinatura inválida, malformado ou expirado."""
+
+
+class _BackendJWT(ABC):
+    """
+    O pacote de JWT só é importado na primeira codificação ou verificação
+    (o python-jose e a cryptography pesam na inicialização de cada worker).
+    """
+
+    def __init__(self, chave: str, algoritmo: str):
+        self._chave = chave
+        self._algoritmo = algoritmo
+        self._jwt = None
+        self._erros = ()
+
+    @abstractmethod
+    def _importar(self):
+        """(módulo com encode/decode, exceções de token inválido)."""
+
+    def _carregar(self):
+        if self._jwt is None:
+            self._jwt, self._erros = self._importar()
+        return self._jwt
+
+    def codificar(self, dados: dict) -> str:
+        return self._carregar().encode(dados, self._chave, algorithm=self._algoritmo)
+
+    def decodificar(self, token: str) -> dict:
+        jwt = self._carregar()
+        try:
+            return jwt.decode(token, self._chave, algorithms=[self._algoritmo])
+        except self._erros as err:
+            raise TokenInvalidoError(str(err))
+
+
+class BackendJose(_BackendJWT):
+    """Implementação com python-jose (padrão, já está no requirements.txt)."""
+
+    def _importar(self):
+        from jose import JWTError, jwt
+
+        return jwt, (JWTError, ValueError)
+
+
+class BackendPyJWT(_BackendJWT):
+    """Implementação com PyJWT (`pip install pyjwt`); compare com bench_auth.py."""
+
+    def __init__(self, chave: str, algoritmo: str):
+        # Sem importar: só confere, já na inicialização, que o pacote existe.
+        if importlib.util.find_spec("jwt") is None:
+            raise RuntimeError("JWT_BACKEND=pyjwt, mas o pacote 'pyjwt' não está instalado.")
+        super().__init__(chave, algoritmo)
+
+    def _importar(self):
+        import jwt
+
+        return jwt, (jwt.PyJWTError, ValueError)
+
+
+BACKENDS = {
+    "jose": BackendJose,
+    "pyjwt": BackendPyJWT,
+}
+
+
+class CacheTokens:
+    """
+    Guarda as claims já verificadas de cada token, para que o mesmo token
+    não precise ser decodificado e ter a assinatura conferida a cada
+    requisição.
+
+    Limitado a `capacidade` tokens (LRU). Uma entrada nunca é usada depois
+    do `exp` do próprio token. Tokens inválidos não são guardados.
+    """
+
+    def __init__(self, backend, capacidade: int = 10000):
+        self.backend = backend
+        self.capacidade = capacidade
+        self._itens = OrderedDict()  # token -> (claims, exp)
+
+        self.acertos = 0
+        self.faltas = 0
+        self.expirados = 0
+
+    def codificar(self, dados: dict) -> str:
+        return self.backend.codificar(dados)
+
+    def decodificar(self, token: str) -> dict:
+        item = self._itens.get(token)
+        if item is not None:
+            claims, exp = item
+            if exp is not None and exp <= time.time():
+                del self._itens[token]
+                self.expirados += 1
+                raise TokenInvalidoError("Token expirado.")
+            self._itens.move_to_end(token)
+            self.acertos += 1
+            return claims
+
+        self.faltas += 1
+        claims = self.backend.decodificar(token)
+        if self.capacidade > 0:
+            self._itens[token] = (claims, claims.get("exp"))
+            if len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+        return claims
+
+    def estatisticas(self) -> dict:
+        consultas = self.acertos + self.faltas
+        return {
+            "backend": type(self.backend).__name__,
+            "itens": len(self._itens),
+            "acertos": self.acertos,
+            "faltas": self.faltas,
+            "expirados": self.expirados,
+            "taxa_acerto": round(self.acertos / consultas, 4) if consultas else 0.0,
+        }
+
+
+def criar_cache_tokens(chave: str, algoritmo: str) -> CacheTokens:
+    """Backend escolhido por JWT_BACKEND (jose ou pyjwt)."""
+    nome_backend = os.environ.get("JWT_BACKEND", "jose")
+    if nome_backend not in BACKENDS:
+        raise RuntimeError(f"JWT_BACKEND inválido: {nome_backend!r}. Opções: {', '.join(BACKENDS)}.")
+    return CacheTokens(
+        BACKENDS[nome_backend](chave, algoritmo),
+        capacidade=int(os.environ.get("JWT_CACHE_CAPACIDADE", "10000")),
+    )